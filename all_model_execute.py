@@ -13,113 +13,640 @@
 #   Date		        Remarks
 #	-----------	   ---------------------------------------------------------------
 #	 05/12/2024    Created script                                   JThompson (JT)
+#	 18/10/2026    m1 x m2 loop replaced by model3_batch            JThompson (JT)
+#	 18/10/2026    model3 results streamed to ResultSink            JThompson (JT)
+#	 18/10/2026    model3 chunks run on a process pool              JThompson (JT)
+#	 18/10/2026    Inputs read through the feather cache            JThompson (JT)
+#	 18/10/2026    Compact model3 output with a scenario table      JThompson (JT)
+#	 18/10/2026    Stage timers, progress/ETA and run report        JThompson (JT)
+#	 18/10/2026    CLI runner driven by a TOML/YAML run config      JThompson (JT)
+#	 18/10/2026    Summary mode: model3 reducers and detail rows    JThompson (JT)
+#	 18/10/2026    ONS series and workbooks loaded concurrently     JThompson (JT)
+#	 18/10/2026    Models index an array backed deflation table     JThompson (JT)
+#	 18/10/2026    --sensitivity: partials and cap breakpoints      JThompson (JT)
+#	 18/10/2026    run.store: indexed sqlite store of model3 rows   JThompson (JT)
+#	 18/10/2026    Sink resumes only the same run, --overwrite      JThompson (JT)
+#	 18/10/2026    Scenario table checked, not rewritten, on resume JThompson (JT)
+#	 18/10/2026    run.store refused or rebuilt for another run     JThompson (JT)
+#	 18/10/2026    run.incremental_cache for models 1 and 2         JThompson (JT)
+#	 18/10/2026    --search: scenarios meeting [search] targets     JThompson (JT)
+#	 18/10/2026    run.sample_memory and --sample-memory            JThompson (JT)
+#	 18/10/2026    Output, store and cache relative to the config   JThompson (JT)
+#	 18/10/2026    deflation.refresh and --refresh-deflation        JThompson (JT)
+#	 18/10/2026    Incremental model 3 partitions per company       JThompson (JT)
+#	 18/10/2026    ONS and Excel load times as their own stages     JThompson (JT)
+#	 18/10/2026    Summary mode runs summarise_model3               JThompson (JT)
 #===============================  Environment Setup  ===========================
 #==========================================================================================
+import argparse
+import copy
+import hashlib
+import json
+import os
+import tomllib
 import pandas as pd
 import numpy as np
-import sys
 
-# set file path for inflation function
-sys.path.append(r"C:\Users\Joshua.Thompson\OneDrive - OFWAT\Documents\Python Scripts")
-from inflation_data_ONS import get_deflation
+from concurrent_loader import load_model_inputs
+from cost_limit_model import COST_LINES, input_fingerprint
+from fiscal_years import deflation_table
+from grid_search import constrained_search
+from incremental_cache import incremental_cost_limit_model, iter_incremental_model3, model3_keys, model3_todo
+from input_loader import load_input_data
 from model1_function import model1
 from model2_function import model2
-from model3_function import model3
-
-# model 1 
-# read in model data (need to change this eventually to work with fabric)
-data_file_path_model1 = r"C:\Users\Joshua.Thompson\OneDrive - OFWAT\Platform Modelling\models\models\model1.xlsx"
-deflation = get_deflation()
-inputData_model1 = pd.read_excel(data_file_path_model1, sheet_name="input Data", header=1).drop(columns=['Unnamed: 0'])
-
-model1_result = model1(
-    data=inputData_model1, 
-    efficiency_seq=np.arange(0.970, 0.991, 0.001), # trim now for desktop testing: original - arange(0.985, 0.99, 0.001),
-    limit_lineincrease_seq=np.arange(1.190, 1.211, 0.001), # trim now for desktop testing: original - arange(1.120, 1.205, 0.001)
-    inflation_year='2022-23', 
-    deflation=deflation,
-    year_exclude = '2017-18'
-)
-
-# model 2
-# read in model data (need to change this eventually to work with fabric)
-data_file_path_model2 = r"C:\Users\Joshua.Thompson\OneDrive - OFWAT\Platform Modelling\models\models\model2.xlsx"
-inputData_model2 = pd.read_excel(data_file_path_model2, sheet_name="input Data", header=1).drop(columns=['Unnamed: 0'])
-
-model2_result = model2(
-    data=inputData_model2, 
-    efficiency_seq=np.arange(0.74, 0.76, 0.001), # trim now for desktop testing: original - arange(0.75, 0.76, 0.001)
-    limit_lineincrease_seq=np.arange(1.110, 1.130, 0.001), # trim now for desktop testing: original - np.arange(1.120, 1.130, 0.001)
-    inflation_year='2022-23', 
-    deflation=deflation,
-    year_exclude = '2017-18'
-)
-
-
-# model 3
-company_return_range=np.arange(0.08, 0.12, 0.001)
-#smoothing_dic = {  # trim for desktop test
-#    1: {"2025-26": 0.95, "2026-27": 0.975, "2027-28": 1, "2028-29": 1.025, "2029-30": 1.05},
-#    2: {"2025-26": 0.96, "2026-27": 0.98, "2027-28": 1, "2028-29": 1.02, "2029-30": 1.04}}
-
-smoothing_dic = {
-    1: {"2025-26": 0.95, "2026-27": 0.975, "2027-28": 1, "2028-29": 1.025, "2029-30": 1.05},
-    2: {"2025-26": 0.96, "2026-27": 0.98, "2027-28": 1, "2028-29": 1.02, "2029-30": 1.04},
-    3: {"2025-26": 0.97, "2026-27": 0.985, "2027-28": 1, "2028-29": 1.015, "2029-30": 1.03},
-    4: {"2025-26": 0.98, "2026-27": 0.99, "2027-28": 1, "2028-29": 1.01, "2029-30": 1.02},
-}  
-
-model1_result['model'] = "model1"
-model2_result['model'] = "model2"
-
-model1_combinations = model1_result[['efficiency', 'limit_lineincrease']].drop_duplicates()
-model2_combinations = model2_result[['efficiency', 'limit_lineincrease']].drop_duplicates()
-
-# empty for store of data
-model3results = []
-n = 1
-# cartesian pdt of m1 and m2 
-for _, row1 in model1_combinations.iterrows():
-    efficiency1 = row1['efficiency']
-    limit_lineincrease1 = row1['limit_lineincrease']
-    
-    # filter model1
-    subset_data1 = model1_result[
-        (model1_result['efficiency'] == efficiency1) &
-        (model1_result['limit_lineincrease'] == limit_lineincrease1)
-    ]
-    
-    for _, row2 in model2_combinations.iterrows():
-        n=n+1
-        print(f"simulation: {n-1}")
-        efficiency2 = row2['efficiency']
-        limit_lineincrease2 = row2['limit_lineincrease']
-        
-        # filter model2
-        subset_data2 = model2_result[
-            (model2_result['efficiency'] == efficiency2) &
-            (model2_result['limit_lineincrease'] == limit_lineincrease2)
-        ]
-        
-        # combine data from model1 and model2
-        combined_data = pd.concat([subset_data1, subset_data2], ignore_index=True)
-        
-        # execute model3
-        final_dataset = model3(
-            data=combined_data,
-            smoothing_dic=smoothing_dic,
-            company_return_range=company_return_range
+from model3_function import smoothing_factors
+from parallel_sweep import iter_parallel_model3_batches
+from model3_batch import model3_scenario_table
+from model3_summary import summarise_model3
+from result_sink import ResultSink
+from result_store import ResultStore, build_result_store, sink_source
+from run_instrumentation import RunReport
+from sensitivity import sensitivity
+
+try:
+    import yaml
+except ImportError:  # yaml configs are optional, toml is read by the standard library
+    yaml = None
+
+
+# settings a run config may leave out, grids are {start, stop, step} (np.arange) or a list of values
+DEFAULT_CONFIG = {
+    'run': {
+        'output': "model3_output",
+        'file_format': 'parquet',
+        'compact': True,
+        'executor': 'process',
+        'max_workers': None,
+        'chunk_size': 1,
+        'inflation_year': '2022-23',
+        'year_exclude': '2017-18',
+        'report': "run_report.json",
+        # peak traced python memory per stage in the report (tracemalloc slows the run noticeably)
+        'sample_memory': False,
+        # replace results of a different run in output rather than refusing to resume them
+        'overwrite': False,
+        # directory of per company model 1 and 2 results, with it model 3 output is partitioned by company and
+        # a rerun sweeps only companies whose rows changed (no --overwrite needed), none to always run the whole grid
+        'incremental_cache': None,
+        # sqlite file of every model 3 row, indexed for lookups (result_store.py), none when left out
+        'store': None,
+    },
+    'deflation': {
+        'base_year': "2017-18",
+        'fiscal_year_start': 2016,
+        'fiscal_year_end': 2025,
+        'offline': None,
+        # fetch the ONS series again even when the cached copy is within its ttl
+        'refresh': False,
+    },
+    # ONS series and both workbooks load at once, timeout/retries apply to each ONS request,
+    # deadline (seconds) to the whole stage and base_url points at a stand-in (ons_stand_in.py)
+    'loader': {
+        'series': ['l522'],
+        'timeout': 30,
+        'retries': 3,
+        'deadline': None,
+        'base_url': None,
+        'workbook_executor': 'thread',
+    },
+    'model1': {'input': None, 'sheet_name': "input Data", 'header': 1, 'efficiency': None, 'limit_lineincrease': None},
+    'model2': {'input': None, 'sheet_name': "input Data", 'header': 1, 'efficiency': None, 'limit_lineincrease': None},
+    'model3': {
+        'company_return': None,
+        'smoothing': None,
+        # summary mode keeps per company/year reducers and the rows of detail_scenarios only
+        'summary': {
+            'enabled': False,
+            'k': 10,
+            'relative_accuracy': 0.01,
+            'quantiles': [0.05, 0.5, 0.95],
+            'detail_scenarios': [],
+        },
+    },
+    # point for --sensitivity (grid values, limits as in the grids), the middle of each grid when left out
+    'sensitivity': {
+        'model1_efficiency': None,
+        'model1_limit_lineincrease': None,
+        'model2_efficiency': None,
+        'model2_limit_lineincrease': None,
+        'company_return': None,
+    },
+    # targets for --search, each a charge (£m) or a table of charges by company: every company's average
+    # AMP charge within [min_charge, max_charge] and at most baseline * (1 + max_increase)
+    'search': {
+        'min_charge': None,
+        'max_charge': None,
+        'baseline': None,
+        'max_increase': None,
+        'smoothing': True,
+        'chunk_size': 64,
+    },
+    # used by --dry-run when the input workbooks are not readable
+    'estimate': {'companies': 17},
+}
+
+# approximate bytes per model 3 output row (compact: categorical codes, float32 value, int scenario id),
+# plus the per candidate row working arrays of model3_chunk (values, keep mask, row and block indices)
+BYTES_PER_ROW = {'compact': 18, 'full': 96, 'working': 25}
+
+
+def merge_config(defaults, config):
+    merged = copy.deepcopy(defaults)
+    for key, value in config.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict) and merged[key]:
+            merged[key] = merge_config(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def load_run_config(path):
+    # toml, or yaml when PyYAML is installed, input, output, store and cache paths relative to the config file
+    if path.endswith(('.yaml', '.yml')):
+        if yaml is None:
+            raise ImportError("PyYAML is needed for yaml run configs, use a .toml config instead")
+        with open(path) as f:
+            config = yaml.safe_load(f) or {}
+    else:
+        with open(path, 'rb') as f:
+            config = tomllib.load(f)
+
+    config = merge_config(DEFAULT_CONFIG, config)
+    config_dir = os.path.dirname(os.path.abspath(path))
+    for name in ('model1', 'model2'):
+        if config[name]['input'] is None:
+            raise ValueError(f"Run config has no {name} input")
+        config[name]['input'] = os.path.join(config_dir, os.path.expanduser(config[name]['input']))
+    # output, store and cache paths too, so a run does not depend on the directory it is started from
+    for key in ('output', 'store', 'incremental_cache'):
+        if config['run'][key] is not None:
+            config['run'][key] = os.path.join(config_dir, os.path.expanduser(config['run'][key]))
+    for name, keys in (('model1', ('efficiency', 'limit_lineincrease')),
+                       ('model2', ('efficiency', 'limit_lineincrease')),
+                       ('model3', ('company_return', 'smoothing'))):
+        for key in keys:
+            if config[name][key] is None:
+                raise ValueError(f"Run config has no {name} {key}")
+
+    # toml tables only have string keys, smoothing scenarios are numbered
+    config['model3']['smoothing'] = {
+        int(scenario) if str(scenario).isdigit() else scenario: factors
+        for scenario, factors in config['model3']['smoothing'].items()
+    }
+    return config
+
+
+def grid(spec):
+    if isinstance(spec, dict):
+        return np.arange(spec['start'], spec['stop'], spec['step'])
+    return np.asarray(spec, dtype=float)
+
+
+def count_companies(config):
+    # companies in the inputs if they can be read (cheap once the feather cache exists)
+    companies = set()
+    for name in ('model1', 'model2'):
+        line = config[name]
+        if not os.path.exists(line['input']):
+            return config['estimate']['companies'], 'estimate'
+        data = load_input_data(line['input'], sheet_name=line['sheet_name'], header=line['header'])
+        companies.update(data['company'].dropna().unique())
+    return len(companies), 'inputs'
+
+
+def estimate_run(config):
+    # scenario counts and approximate output and in-flight memory without running the models
+    run = config['run']
+    n1 = len(grid(config['model1']['efficiency'])) * len(grid(config['model1']['limit_lineincrease']))
+    n2 = len(grid(config['model2']['efficiency'])) * len(grid(config['model2']['limit_lineincrease']))
+    n_returns = len(grid(config['model3']['company_return']))
+    smoothing_dic = config['model3']['smoothing']
+    smooth_years, factors = smoothing_factors(smoothing_dic)
+    n_companies, companies_from = count_companies(config)
+
+    # one (m1, m2, company_return) block: smoothed charges then company return costs and customer charges by year
+    block_rows = n_companies * (len(factors) + 2 * len(set(smooth_years)))
+    chunk_size = run['chunk_size']
+    n_chunks = -(-n1 // chunk_size)
+    chunk_rows = chunk_size * n2 * n_returns * block_rows
+    row_bytes = BYTES_PER_ROW['compact' if run['compact'] else 'full']
+    chunk_mb = chunk_rows * (row_bytes + BYTES_PER_ROW['working']) / 2**20
+    summary = config['model3']['summary']
+    output_rows = n1 * n2 * n_returns * block_rows
+    if summary['enabled']:
+        output_rows = len(summary['detail_scenarios']) * block_rows
+    in_flight = 1 if run['executor'] == 'serial' else 2 * (run['max_workers'] or os.cpu_count() or 1)
+
+    return {
+        'scenarios': {
+            'model1': n1,
+            'model2': n2,
+            'company_return': n_returns,
+            'smoothing': len(smoothing_dic),
+            'model3': n1 * n2 * n_returns * len(smoothing_dic),
+        },
+        'companies': n_companies,
+        'companies_from': companies_from,
+        'model3_mode': 'summary' if summary['enabled'] else 'rows',
+        'model3_rows': output_rows,
+        'model3_output_mb': round(output_rows * row_bytes / 2**20, 1),
+        'chunks': n_chunks,
+        'chunk_rows': chunk_rows,
+        'chunk_mb': round(chunk_mb, 1),
+        'chunks_in_flight': min(in_flight, n_chunks),
+        'peak_chunk_mb': round(chunk_mb * min(in_flight, n_chunks), 1),
+    }
+
+
+def run_cost_limit_model(config, name, model, input_data, deflation, report):
+    # (results, {company: key} of the incremental cache or None without one)
+    line, run = config[name], config['run']
+
+    efficiency_seq = grid(line['efficiency'])
+    limit_lineincrease_seq = grid(line['limit_lineincrease'])
+    keys = None
+    with report.stage(name):
+        if run['incremental_cache'] is None:
+            result = model(
+                data=input_data,
+                efficiency_seq=efficiency_seq,
+                limit_lineincrease_seq=limit_lineincrease_seq,
+                inflation_year=run['inflation_year'],
+                deflation=deflation,
+                year_exclude=run['year_exclude']
+            )
+        else:
+            # only companies whose rows changed since a cached run are recomputed
+            result, keys, recomputed = incremental_cost_limit_model(
+                data=input_data,
+                cost_line=COST_LINES[name],
+                efficiency_seq=efficiency_seq,
+                limit_lineincrease_seq=limit_lineincrease_seq,
+                inflation_year=run['inflation_year'],
+                deflation=deflation,
+                year_exclude=run['year_exclude'],
+                cache_dir=run['incremental_cache']
+            )
+            report.count(f'{name}_companies_recomputed', len(recomputed))
+    report.count(f'{name}_scenarios', len(efficiency_seq) * len(limit_lineincrease_seq))
+    report.count(f'{name}_rows', len(result))
+    result['model'] = name
+    return result, keys
+
+
+def run_model3_rows(config, model1_result, model2_result, sink, report):
+    # every model 3 row, written one chunk of model1 combinations at a time (reruns resume from the manifest)
+    run = config['run']
+    company_return_range = grid(config['model3']['company_return'])
+    smoothing_dic = config['model3']['smoothing']
+
+    completed = sink.completed()
+    n_model1 = len(model1_result[['efficiency', 'limit_lineincrease']].drop_duplicates())
+    n_model2 = len(model2_result[['efficiency', 'limit_lineincrease']].drop_duplicates())
+    n_chunks = len(range(0, n_model1, run['chunk_size'])) - len(completed)
+    progress = report.progress(n_chunks, "model3 chunks")
+
+    # 'serial', 'thread' or 'process' (max_workers=None uses every core)
+    batches = iter_parallel_model3_batches(
+        model1_result=model1_result,
+        model2_result=model2_result,
+        smoothing_dic=smoothing_dic,
+        company_return_range=company_return_range,
+        chunk_size=run['chunk_size'],
+        skip=completed,
+        compact=run['compact'],
+        executor=run['executor'],
+        max_workers=run['max_workers']
+    )
+    for start, final_dataset in report.timed_iter(batches, 'model3'):
+        with report.stage('sink_write'):
+            sink.write(start, final_dataset)
+        progress.update(
+            scenarios=min(run['chunk_size'], n_model1 - start) * n_model2 * len(company_return_range) * len(smoothing_dic),
+            model3_rows=len(final_dataset)
         )
-        
-        final_dataset['model1_efficiency'] = efficiency1
-        final_dataset['model1_limit_lineincrease'] = limit_lineincrease1
-        final_dataset['model2_efficiency'] = efficiency2
-        final_dataset['model2_limit_lineincrease'] = limit_lineincrease2
-        
-        # append 
-        model3results.append(final_dataset)
 
 
-mod3_results = pd.concat(model3results, ignore_index=True)
-#mod3_results.to_csv('model3_output.txt', sep='\t', index=False)
+def run_model3_incremental(config, model1_result, model2_result, keys1, keys2, sink, report):
+    # every model 3 row as one partition per company and model1 chunk, tagged with the company's model 3
+    # key: a rerun keeps the partitions of unchanged companies and sweeps only the changed companies
+    run = config['run']
+    company_return_range = grid(config['model3']['company_return'])
+    smoothing_dic = config['model3']['smoothing']
+    keys = model3_keys(keys1, keys2, smoothing_dic, company_return_range, run['compact'], run['chunk_size'])
+
+    partitions = sink.manifest['partitions']
+    sink.remove([key for key, partition in partitions.items() if keys.get(partition['company']) != partition['source']])
+    done = {(partition['company'], partition['source'], partition['start']) for partition in partitions.values()}
+
+    n_model1 = len(model1_result[['efficiency', 'limit_lineincrease']].drop_duplicates())
+    n_model2 = len(model2_result[['efficiency', 'limit_lineincrease']].drop_duplicates())
+    todo = model3_todo(keys, done, n_model1, run['chunk_size'])
+    recomputed = [company for company, starts in todo.items() if starts]
+    report.count('model3_companies_recomputed', len(recomputed))
+    n_chunks = len(set().union(*todo.values()))
+    progress = report.progress(n_chunks, "model3 chunks")
+
+    next_key = max(sink.completed(), default=-1) + 1
+    chunks = iter_incremental_model3(
+        model1_result=model1_result,
+        model2_result=model2_result,
+        keys=keys,
+        todo=todo,
+        smoothing_dic=smoothing_dic,
+        company_return_range=company_return_range,
+        chunk_size=run['chunk_size'],
+        compact=run['compact'],
+        executor=run['executor'],
+        max_workers=run['max_workers']
+    )
+    for start, company_rows in report.timed_iter(chunks, 'model3'):
+        with report.stage('sink_write'):
+            for company, key, rows in company_rows:
+                sink.write(next_key, rows, company=company, source=key, start=start)
+                next_key += 1
+        progress.update(
+            scenarios=min(run['chunk_size'], n_model1 - start) * n_model2 * len(company_return_range) * len(smoothing_dic),
+            model3_rows=sum(len(rows) for _, _, rows in company_rows)
+        )
+
+
+def run_model3_summary(config, model1_result, model2_result, sink, report):
+    # per company/year reducers over every scenario plus the rows of the selected scenarios
+    run, summary_config = config['run'], config['model3']['summary']
+    summary = summarise_model3(
+        model1_result,
+        model2_result,
+        config['model3']['smoothing'],
+        grid(config['model3']['company_return']),
+        chunk_size=run['chunk_size'],
+        k=summary_config['k'],
+        relative_accuracy=summary_config['relative_accuracy'],
+        quantiles=summary_config['quantiles'],
+        detail_scenarios=summary_config['detail_scenarios'],
+        compact=run['compact'],
+        executor=run['executor'],
+        max_workers=run['max_workers'],
+        report=report
+    )
+
+    with report.stage('sink_write'):
+        sink.write_table('summary', summary['summary'])
+        sink.write_table('top', summary['top'])
+        if len(summary['detail']):
+            sink.write_table('detail', summary['detail'])
+    report.count('model3_detail_rows', len(summary['detail']))
+
+
+def load_inputs(config, report):
+    deflation_options = dict(config['deflation'])
+    offline = deflation_options.pop('offline')
+    refresh = deflation_options.pop('refresh')
+    with report.stage('load_inputs'):
+        loaded = load_model_inputs(
+            workbooks={name: config[name] for name in ('model1', 'model2')},
+            deflation_options=deflation_options,
+            offline=offline,
+            refresh=refresh,
+            **config['loader']
+        )
+    report.count('ons_series', len(loaded['series']))
+    # load_inputs is the wall time of the whole stage, the sources overlap inside it, so each one's own
+    # time shows whether the ONS fetch or an Excel parse is the slow part
+    for name, seconds in loaded['seconds']['series'].items():
+        report.record(f'ons_{name}', seconds)
+    for name, seconds in loaded['seconds']['inputs'].items():
+        report.record(f'excel_{name}', seconds)
+
+    # fiscal year positioned arrays, inflation_year is an index lookup in every model
+    return loaded['inputs'], deflation_table(loaded['deflation'])
+
+
+def run_fingerprint(settings, inputs, deflation):
+    # digest of everything a run's output depends on, kept in the sink manifest so a rerun
+    # only resumes partitions written with the same config and input data
+    digest = hashlib.sha256(json.dumps(settings, sort_keys=True).encode())
+    for name in sorted(inputs):
+        digest.update(name.encode() + input_fingerprint(inputs[name]).encode())
+    for key in sorted(deflation):
+        digest.update(key.encode() + np.asarray(deflation[key]).tobytes())
+    return digest.hexdigest()
+
+
+def model3_settings(config):
+    # grids as the values they expand to, so an equivalent spec gives the same fingerprint
+    run, summary = config['run'], config['model3']['summary']
+    return {
+        'mode': 'summary' if summary['enabled'] else 'rows',
+        'model1': {key: grid(config['model1'][key]).tolist() for key in ('efficiency', 'limit_lineincrease')},
+        'model2': {key: grid(config['model2'][key]).tolist() for key in ('efficiency', 'limit_lineincrease')},
+        'company_return': grid(config['model3']['company_return']).tolist(),
+        'smoothing': {str(scenario): factors for scenario, factors in config['model3']['smoothing'].items()},
+        'summary': summary if summary['enabled'] else None,
+        'chunk_size': run['chunk_size'],
+        'compact': run['compact'],
+        'inflation_year': run['inflation_year'],
+        'year_exclude': run['year_exclude'],
+    }
+
+
+def run_models(config):
+    run = config['run']
+    # stage timings and counters, written next to the results at the end
+    report = RunReport("model 1:3 execute", sample_memory=config['run']['sample_memory'])
+
+    inputs, deflation = load_inputs(config, report)
+    model1_result, keys1 = run_cost_limit_model(config, 'model1', model1, inputs['model1'], deflation, report)
+    model2_result, keys2 = run_cost_limit_model(config, 'model2', model2, inputs['model2'], deflation, report)
+
+    # model 3: cartesian pdt of m1 and m2, evaluated as arrays over (m1, m2, company return)
+    company_return_range = grid(config['model3']['company_return'])
+    incremental = keys1 is not None and not config['model3']['summary']['enabled']
+    if incremental:
+        # partitions carry their company's input key, so the sink's fingerprint is the settings alone
+        # and a resubmitted company replaces only its own partitions
+        fingerprint = run_fingerprint(dict(model3_settings(config), incremental=True), {}, {})
+    else:
+        fingerprint = run_fingerprint(model3_settings(config), inputs, deflation)
+    sink = ResultSink(
+        run['output'],
+        file_format=run['file_format'],
+        fingerprint=fingerprint,
+        overwrite=run['overwrite']
+    )
+
+    # refuse a store of another run before the sweep rather than after it
+    if run['store'] is not None and not run['overwrite'] and not config['model3']['summary']['enabled']:
+        with ResultStore(run['store']) as store:
+            store.check_source(sink_source(sink))
+
+    # compact rows and summary top/detail rows carry a scenario id into the scenario table, written
+    # with the first partition and never replaced under partitions that are being resumed
+    if run['compact'] or config['model3']['summary']['enabled']:
+        scenarios = model3_scenario_table(model1_result, model2_result, company_return_range)
+        if sink.completed():
+            if not sink.table_matches('scenarios', scenarios):
+                raise ValueError(f"Scenario table at {run['output']} does not match the partitions being resumed")
+        else:
+            sink.write_table('scenarios', scenarios)
+
+    if config['model3']['summary']['enabled']:
+        run_model3_summary(config, model1_result, model2_result, sink, report)
+    else:
+        if incremental:
+            run_model3_incremental(config, model1_result, model2_result, keys1, keys2, sink, report)
+        else:
+            run_model3_rows(config, model1_result, model2_result, sink, report)
+        if run['store'] is not None:
+            with report.stage('result_store'):
+                build_result_store(run['output'], run['store'], rebuild=run['overwrite']).close()
+
+    report.write(os.path.join(run['output'], run['report']))
+
+    # load back for inspection (full grids will not fit in memory), or query run.store
+    #mod3_results = sink.read()
+    #mod3_results = expand_results(sink.read(), sink.read_table('scenarios'), MODEL3_COLUMNS)
+    return sink
+
+
+def sensitivity_point(config):
+    # configured point, grid middles for anything left out
+    grids = {
+        'model1_efficiency': config['model1']['efficiency'],
+        'model1_limit_lineincrease': config['model1']['limit_lineincrease'],
+        'model2_efficiency': config['model2']['efficiency'],
+        'model2_limit_lineincrease': config['model2']['limit_lineincrease'],
+        'company_return': config['model3']['company_return'],
+    }
+    point = {}
+    for key, spec in grids.items():
+        values = grid(spec)
+        point[key] = config['sensitivity'][key] if config['sensitivity'][key] is not None else float(values[len(values) // 2])
+    return point
+
+
+def run_sensitivity(config):
+    # one analytic pass at a point: model 3 rows with partials, line rows and cap breakpoints
+    run = config['run']
+    report = RunReport("model 1:3 sensitivity", sample_memory=config['run']['sample_memory'])
+    inputs, deflation = load_inputs(config, report)
+
+    point = sensitivity_point(config)
+    with report.stage('sensitivity'):
+        results = sensitivity(
+            data=inputs,
+            point=point,
+            smoothing_dic=config['model3']['smoothing'],
+            inflation_year=run['inflation_year'],
+            deflation=deflation,
+            year_exclude=run['year_exclude']
+        )
+
+    settings = {
+        'mode': 'sensitivity',
+        'point': point,
+        'smoothing': {str(scenario): factors for scenario, factors in config['model3']['smoothing'].items()},
+        'inflation_year': run['inflation_year'],
+        'year_exclude': run['year_exclude'],
+    }
+    sink = ResultSink(
+        run['output'],
+        file_format=run['file_format'],
+        fingerprint=run_fingerprint(settings, inputs, deflation),
+        overwrite=run['overwrite']
+    )
+    with report.stage('sink_write'):
+        sink.write_table('sensitivity_point', pd.DataFrame([point]))
+        for name, frame in results.items():
+            sink.write_table(f'sensitivity_{name}', frame)
+    report.write(os.path.join(run['output'], run['report']))
+    return sink
+
+
+def run_search(config):
+    # only the (model1, model2, company_return, smoothing) scenarios meeting the [search] targets,
+    # found by pruning and bisecting the grids rather than evaluating every model 3 row
+    run, search = config['run'], config['search']
+    if all(search[key] is None for key in ('min_charge', 'max_charge', 'max_increase')):
+        raise ValueError("Run config has no [search] min_charge, max_charge or max_increase")
+    report = RunReport("model 1:3 search", sample_memory=config['run']['sample_memory'])
+
+    inputs, deflation = load_inputs(config, report)
+    model1_result, _ = run_cost_limit_model(config, 'model1', model1, inputs['model1'], deflation, report)
+    model2_result, _ = run_cost_limit_model(config, 'model2', model2, inputs['model2'], deflation, report)
+
+    with report.stage('search'):
+        feasible, stats = constrained_search(
+            model1_result=model1_result,
+            model2_result=model2_result,
+            company_return_range=grid(config['model3']['company_return']),
+            smoothing_dic=config['model3']['smoothing'] if search['smoothing'] else None,
+            min_charge=search['min_charge'],
+            max_charge=search['max_charge'],
+            baseline=search['baseline'],
+            max_increase=search['max_increase'],
+            chunk_size=search['chunk_size']
+        )
+    for name, value in stats.items():
+        report.count(name, value)
+
+    settings = dict(model3_settings(config), mode='search', search=search)
+    sink = ResultSink(
+        run['output'],
+        file_format=run['file_format'],
+        fingerprint=run_fingerprint(settings, inputs, deflation),
+        overwrite=run['overwrite']
+    )
+    with report.stage('sink_write'):
+        sink.write_table('search_feasible', feasible)
+        sink.write_table('search_stats', pd.DataFrame([stats]))
+    report.write(os.path.join(run['output'], run['report']))
+    return sink
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run models 1-3 from a run configuration")
+    parser.add_argument('config', help="run configuration (.toml, or .yaml with PyYAML installed)")
+    parser.add_argument('--dry-run', action='store_true', help="print scenario counts and memory estimates, then exit")
+    parser.add_argument('--sensitivity', action='store_true',
+                        help="write partial derivatives and line cap breakpoints at the [sensitivity] point instead of the grids")
+    parser.add_argument('--search', action='store_true',
+                        help="write only the scenarios meeting the [search] charge targets instead of every model 3 row")
+    parser.add_argument('--executor', choices=['serial', 'thread', 'process'], help="overrides run.executor")
+    parser.add_argument('--max-workers', type=int, help="overrides run.max_workers")
+    parser.add_argument('--output', help="overrides run.output")
+    parser.add_argument('--refresh-deflation', action='store_true',
+                        help="fetch the ONS series again rather than use the cached copy, as deflation.refresh")
+    parser.add_argument('--sample-memory', action='store_true',
+                        help="record each stage's peak traced memory in the run report (slower), as run.sample_memory")
+    parser.add_argument('--overwrite', action='store_true',
+                        help="replace results of a different run in the output instead of refusing to resume them")
+    args = parser.parse_args(argv)
+    if args.sensitivity and args.search:
+        parser.error("--sensitivity and --search are separate runs")
+
+    config = load_run_config(args.config)
+    for key in ('executor', 'max_workers', 'output'):
+        if getattr(args, key) is not None:
+            config['run'][key] = getattr(args, key)
+    for key in ('overwrite', 'sample_memory'):
+        if getattr(args, key):
+            config['run'][key] = True
+    if args.refresh_deflation:
+        config['deflation']['refresh'] = True
+
+    if args.dry_run:
+        print(json.dumps(estimate_run(config), indent=2))
+        return
+    if args.sensitivity:
+        sink = run_sensitivity(config)
+    elif args.search:
+        sink = run_search(config)
+    else:
+        sink = run_models(config)
+    print(f"results written to {sink.path}")
+
 
+if __name__ == "__main__":
+    main()
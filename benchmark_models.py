@@ -0,0 +1,229 @@
+################################################################################
+#                   Author: Joshua Thompson
+#   O__  ----       Email:  joshua.thompson@ofwat.gov.uk
+#  c/ /'_ ---
+# (*) \(*) --
+# ======================== Script  Information =================================
+# PURPOSE: benchmark models 1-3 on synthetic company submissions
+#
+# PROJECT INFORMATION:
+#   Name: benchmark models
+#
+# HISTORY:----
+#   Date		        Remarks
+#	-----------	   ---------------------------------------------------------------
+#	 18/10/2026    Created script                                   JThompson (JT)
+#	 18/10/2026    Reference driver moved out, --golden checks      JThompson (JT)
+#	 18/10/2026    --reference times the original models 1 and 2    JThompson (JT)
+#===============================  Environment Setup  ===========================
+#==========================================================================================
+
+import pandas as pd
+import numpy as np
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+
+from cost_limit_model import COST_LINES, cost_limit_models
+from fiscal_years import fiscal_year_label
+from model3_function import model3
+from model3_batch import iter_model3_batches
+from reference_models import reference_driver, reference_model1, reference_model2
+
+
+SMOOTHING_DIC = {
+    1: {"2025-26": 0.95, "2026-27": 0.975, "2027-28": 1, "2028-29": 1.025, "2029-30": 1.05},
+    2: {"2025-26": 0.96, "2026-27": 0.98, "2027-28": 1, "2028-29": 1.02, "2029-30": 1.04},
+    3: {"2025-26": 0.97, "2026-27": 0.985, "2027-28": 1, "2028-29": 1.015, "2029-30": 1.03},
+    4: {"2025-26": 0.98, "2026-27": 0.99, "2027-28": 1, "2028-29": 1.01, "2029-30": 1.02},
+}
+
+
+def make_synthetic_submission(
+    cost_line,
+    n_companies=17,
+    APR_years=range(2018, 2026),
+    BPT_years=range(2024, 2031),
+    seed=0):
+    # input Data sheet layout for one cost line: APR outturn and BPT plan items plus household numbers
+    rng = np.random.default_rng(seed)
+    companies = [f"CO{i:02d}" for i in range(n_companies)]
+    blocks = [
+        (cost_line['item_numbers_APR'], APR_years, "£m 22-23 FYA CPIH", (5, 50)),
+        ([cost_line['denominator_APR']], APR_years, "000s", (500, 2000)),
+        (cost_line['item_numbers_BPT'], BPT_years, "£m 22-23 FYA CPIH", (5, 70)),
+        ([cost_line['denominator_BPT']], BPT_years, "000s", (500, 2000)),
+    ]
+
+    frames = []
+    for item_numbers, years, unit, (low, high) in blocks:
+        index = pd.MultiIndex.from_product(
+            [companies, item_numbers, [fiscal_year_label(year) for year in years]],
+            names=['company', 'item number', 'year']).to_frame(index=False)
+        index['unit'] = unit
+        index['dp'] = 3
+        index['value'] = rng.uniform(low, high, len(index))
+        frames.append(index)
+    return pd.concat(frames, ignore_index=True)
+
+
+def make_synthetic_deflation(first_year=2018, last_year=2025, annual_rate=0.03):
+    # same layout as get_deflation(), based on the first fiscal year
+    years = np.arange(first_year, last_year)
+    index = 100 * (1 + annual_rate) ** (years - first_year)
+    return pd.DataFrame({
+        'Fiscal_Year': [fiscal_year_label(year) for year in years],
+        'FiscalYear_CPIH_INDEX': index,
+        'deflation': index[0] / index,
+        'inflation': index / index[0],
+    })
+
+
+def timed_stage(report, name, function, scenarios=None):
+    # wall time and traced peak memory of one stage (tracing slows allocation heavy stages)
+    trace_memory = report['config']['trace_memory']
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    result = function()
+    seconds = time.perf_counter() - start
+    peak = None
+    if trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    stage = {'seconds': seconds, 'peak_memory_mb': peak / 2**20 if peak is not None else None}
+    if scenarios is not None:
+        stage['scenarios'] = scenarios
+        stage['scenarios_per_second'] = scenarios / seconds if seconds > 0 else None
+    if isinstance(result, pd.DataFrame):
+        stage['rows'] = len(result)
+    elif isinstance(result, int):
+        stage['rows'] = result
+    report['stages'][name] = stage
+    print(f"{name}: {seconds:.3f}s" + (f", peak {peak / 2**20:.1f} MB" if peak is not None else ""))
+    return result
+
+
+def run_benchmark(
+    n_companies=17,
+    last_year=2030,
+    m1_grid=(21, 21),
+    m2_grid=(20, 20),
+    n_returns=40,
+    seed=0,
+    reference=False,
+    golden=False,
+    trace_memory=True):
+    inputs = {
+        name: make_synthetic_submission(
+            cost_line, n_companies, BPT_years=range(2024, last_year + 1), seed=seed + i)
+        for i, (name, cost_line) in enumerate(COST_LINES.items())
+    }
+    deflation = make_synthetic_deflation()
+    grids = {
+        'model1': (np.linspace(0.970, 0.990, m1_grid[0]), np.linspace(1.190, 1.210, m1_grid[1])),
+        'model2': (np.linspace(0.740, 0.760, m2_grid[0]), np.linspace(1.110, 1.130, m2_grid[1])),
+    }
+    company_return_range = np.linspace(0.08, 0.12, n_returns)
+    n_pairs = m1_grid[0] * m1_grid[1] * m2_grid[0] * m2_grid[1]
+    cost_limit_scenarios = sum(len(efficiency) * len(limit) for efficiency, limit in grids.values())
+
+    report = {
+        'config': {
+            'n_companies': n_companies, 'last_year': last_year, 'm1_grid': list(m1_grid),
+            'm2_grid': list(m2_grid), 'n_returns': n_returns, 'seed': seed, 'trace_memory': trace_memory,
+            'input_rows': {name: len(data) for name, data in inputs.items()},
+        },
+        'environment': {
+            'python': platform.python_version(), 'pandas': pd.__version__, 'numpy': np.__version__,
+            'machine': platform.machine(),
+        },
+        'stages': {},
+    }
+
+    results = timed_stage(
+        report, 'cost_limit_models',
+        lambda: cost_limit_models(inputs, COST_LINES, grids, '2022-23', deflation, '2017-18'),
+        scenarios=cost_limit_scenarios)
+
+    if reference:
+        # the original model 1 and 2 scripts on the same grids, one grid point at a time
+        reference_models = {'model1': reference_model1, 'model2': reference_model2}
+        timed_stage(
+            report, 'reference_cost_limit',
+            lambda: sum(len(reference_models[name](
+                inputs[name], efficiency_seq, limit_lineincrease_seq, '2022-23', deflation, '2017-18'))
+                for name, (efficiency_seq, limit_lineincrease_seq) in grids.items()),
+            scenarios=cost_limit_scenarios)
+
+    # single model3 call on one pair, the unit of work the original driver repeats
+    first_pair = pd.concat([
+        results[name][(results[name]['efficiency'] == grids[name][0][0]) &
+                      (results[name]['limit_lineincrease'] == grids[name][1][0] - 1)]
+        for name in ('model1', 'model2')
+    ], ignore_index=True)
+    timed_stage(
+        report, 'model3_single_pair',
+        lambda: model3(first_pair.copy(), SMOOTHING_DIC, company_return_range),
+        scenarios=n_returns * len(SMOOTHING_DIC))
+
+    # stream the sweep chunk by chunk, as the driver does, counting rather than keeping rows
+    timed_stage(
+        report, 'model3_batch',
+        lambda: sum(len(final_data) for _, final_data in iter_model3_batches(
+            results['model1'], results['model2'], SMOOTHING_DIC, company_return_range)),
+        scenarios=n_pairs * n_returns * len(SMOOTHING_DIC))
+
+    if reference:
+        timed_stage(
+            report, 'reference_driver',
+            lambda: reference_driver(results['model1'], results['model2'], SMOOTHING_DIC, company_return_range),
+            scenarios=n_pairs * n_returns * len(SMOOTHING_DIC))
+
+    if golden:
+        # golden_harness builds its inputs with this module's synthetic submissions
+        from golden_harness import run_golden
+        report['golden'] = run_golden(seed=seed)
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark models 1-3 on synthetic submissions")
+    parser.add_argument('--companies', type=int, default=17)
+    parser.add_argument('--last-year', type=int, default=2030, help="last BPT fiscal year (end year)")
+    parser.add_argument('--m1-grid', type=int, nargs=2, default=(21, 21), metavar=('EFFICIENCY', 'LIMIT'))
+    parser.add_argument('--m2-grid', type=int, nargs=2, default=(20, 20), metavar=('EFFICIENCY', 'LIMIT'))
+    parser.add_argument('--returns', type=int, default=40)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--reference', action='store_true', help="also time the original model 1 and 2 scripts and per-pair driver loop")
+    parser.add_argument('--golden', action='store_true', help="also check the optimised paths against the reference models")
+    parser.add_argument('--no-memory', action='store_true', help="skip tracemalloc peak memory tracing")
+    parser.add_argument('--output', default='benchmark_results.json')
+    args = parser.parse_args()
+
+    report = run_benchmark(
+        n_companies=args.companies,
+        last_year=args.last_year,
+        m1_grid=tuple(args.m1_grid),
+        m2_grid=tuple(args.m2_grid),
+        n_returns=args.returns,
+        seed=args.seed,
+        reference=args.reference,
+        golden=args.golden,
+        trace_memory=not args.no_memory,
+    )
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {args.output}")
+    if args.golden and not report['golden']['passed']:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+################################################################################
+#                   Author: Joshua Thompson
+#   O__  ----       Email:  joshua.thompson@ofwat.gov.uk
+#  c/ /'_ ---
+# (*) \(*) --
+# ======================== Script  Information =================================
+# PURPOSE: compact integer coded layout for model results
+#
+# PROJECT INFORMATION:
+#   Name: compact results
+#
+# HISTORY:----
+#   Date		        Remarks
+#	-----------	   ---------------------------------------------------------------
+#	 18/10/2026    Created script                                   JThompson (JT)
+#===============================  Environment Setup  ===========================
+#==========================================================================================
+
+import pandas as pd
+import numpy as np
+
+
+def value_column(values, decimals, value_dtype=np.float32):
+    # narrow the values only when every one stays within half a unit of its last reported decimal
+    # place (the rows' dp), float32 keeps about 7 significant figures so large values stay float64
+    values = np.asarray(values, dtype=float)
+    tolerance = 0.5 * 10.0 ** -np.asarray(decimals, dtype=float)
+    with np.errstate(over='ignore', invalid='ignore'):
+        narrowed = values.astype(value_dtype)
+        error = np.abs(narrowed.astype(float) - values)
+    if np.any(error > tolerance) or np.any(np.isnan(error) & ~np.isnan(values)):
+        return values
+    return narrowed
+
+
+def compact_labels(frame, categorical=()):
+    # repeated strings (and any listed columns) as categoricals and small integers downcast
+    compact = frame.copy()
+    for column in compact.columns:
+        if column in categorical or compact[column].dtype == object or pd.api.types.is_string_dtype(compact[column]):
+            compact[column] = compact[column].astype('category')
+        elif pd.api.types.is_integer_dtype(compact[column]):
+            compact[column] = pd.to_numeric(compact[column], downcast='integer')
+    return compact
+
+
+def compact_results(frame, scenario_columns, value_dtype=np.float32, decimals=None):
+    # (rows with an int scenario id, scenario table indexed by that id), values kept to the
+    # frame's dp column unless decimals is given
+    codes = frame.groupby(scenario_columns, sort=False, dropna=False).ngroup().to_numpy()
+    scenarios = frame[scenario_columns].drop_duplicates().reset_index(drop=True)
+    scenarios.index.name = 'scenario'
+
+    compact = compact_labels(frame.drop(columns=scenario_columns + ['value']))
+    compact['value'] = value_column(frame['value'], frame['dp'] if decimals is None else decimals, value_dtype)
+    compact['scenario'] = codes.astype(np.int32 if len(scenarios) < 2**31 else np.int64)
+    return compact, scenarios
+
+
+def expand_results(compact, scenarios, columns=None):
+    # back to the long layout with plain strings and float64, columns in the given order
+    expanded = pd.DataFrame(index=compact.index)
+    for column in compact.columns.drop('scenario'):
+        if isinstance(compact[column].dtype, pd.CategoricalDtype):
+            expanded[column] = compact[column].astype(compact[column].cat.categories.dtype)
+        elif pd.api.types.is_integer_dtype(compact[column]):
+            expanded[column] = compact[column].astype(np.int64)
+        else:
+            expanded[column] = compact[column]
+    expanded['value'] = compact['value'].astype(float)
+
+    scenario_rows = scenarios.loc[compact['scenario'].to_numpy()].reset_index(drop=True)
+    scenario_rows.index = compact.index
+    expanded = pd.concat([expanded, scenario_rows], axis=1)
+    return expanded if columns is None else expanded[columns]
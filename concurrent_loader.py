@@ -0,0 +1,107 @@
+################################################################################
+#                   Author: Joshua Thompson
+#   O__  ----       Email:  joshua.thompson@ofwat.gov.uk
+#  c/ /'_ ---
+# (*) \(*) --
+# ======================== Script  Information =================================
+# PURPOSE: ONS series and model input workbooks loaded concurrently
+#
+# PROJECT INFORMATION:
+#   Name: concurrent loader
+#
+# HISTORY:----
+#   Date		        Remarks
+#	-----------	   ---------------------------------------------------------------
+#	 18/10/2026    Created script                                   JThompson (JT)
+#	 18/10/2026    Own workbook pool, spawned not forked            JThompson (JT)
+#	 18/10/2026    refresh refetches the ONS series                 JThompson (JT)
+#	 18/10/2026    Seconds of each source returned                  JThompson (JT)
+#	 18/10/2026    cache_dir passed to the ONS fetches              JThompson (JT)
+#===============================  Environment Setup  ===========================
+#==========================================================================================
+
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+
+from inflation_data_ONS import TIMEOUT, RETRIES, env_options, load_ons_series, fiscal_year_deflation
+from input_loader import load_input_data
+
+
+def timed_call(function, *args, **kwargs):
+    # (result, seconds) of one source, timed where it runs so queueing for a worker is not counted
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def load_model_inputs(
+    workbooks,
+    series=('l522',),
+    deflation_options=None,
+    offline=None,
+    refresh=False,
+    fixture=None,
+    timeout=TIMEOUT,
+    retries=RETRIES,
+    base_url=None,
+    cache_dir=None,
+    deadline=None,
+    workbook_executor='thread',
+    max_workers=None):
+    # workbooks is {name: {'input': path, 'sheet_name': ..., 'header': ...}}, series the ONS series
+    # to fetch alongside them (l522 is always fetched for the deflation table). every source starts
+    # at once, HTTP requests use timeout and retries, deadline (seconds) bounds the whole stage,
+    # refresh fetches every series again however fresh its cached copy, cache_dir holds the cached series
+    # (default ONS_CACHE_DIR or ons_cache).
+    # returns {'inputs': {name: frame}, 'series': {name: series}, 'deflation': frame,
+    # 'seconds': {'inputs': {name: seconds}, 'series': {name: seconds}}}
+    offline, fixture = env_options(offline, fixture)
+    series = list(dict.fromkeys(['l522', *series]))
+
+    # the network fetches only wait on the ons server, the workbooks can go to processes on a first
+    # (uncached) read where parsing is the cost. workbook processes are spawned rather than forked, they
+    # start after the fetch threads and a fork would copy any lock those threads hold at the time
+    if workbook_executor == 'process':
+        workbook_pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+    elif workbook_executor in ('thread', 'serial'):
+        workbook_pool = None
+    else:
+        raise ValueError(f"Unknown workbook executor: {workbook_executor}, use 'thread' or 'process'")
+    fetch_pool = ThreadPoolExecutor(max_workers=len(series) + len(workbooks))
+    try:
+        futures = {
+            ('series', name): fetch_pool.submit(
+                timed_call, load_ons_series, name,
+                cache_dir=cache_dir,
+                offline=offline,
+                refresh=refresh,
+                fixture=fixture if name == 'l522' else None,
+                timeout=timeout,
+                retries=retries,
+                base_url=base_url)
+            for name in series
+        }
+        for name, workbook in workbooks.items():
+            args = (workbook['input'], workbook.get('sheet_name', "input Data"), workbook.get('header', 1))
+            if workbook_pool is None:
+                futures[('inputs', name)] = fetch_pool.submit(timed_call, load_input_data, *args)
+            else:
+                futures[('inputs', name)] = workbook_pool.submit(timed_call, load_input_data, *args)
+
+        _, pending = wait(futures.values(), timeout=deadline)
+        if pending:
+            late = [f"{kind} {name}" for (kind, name), future in futures.items() if future in pending]
+            raise TimeoutError(f"Inputs not loaded within {deadline}s: {', '.join(late)}")
+
+        loaded = {'inputs': {}, 'series': {}, 'seconds': {'inputs': {}, 'series': {}}}
+        for (kind, name), future in futures.items():
+            loaded[kind][name], loaded['seconds'][kind][name] = future.result()
+    finally:
+        fetch_pool.shutdown(wait=False, cancel_futures=True)
+        if workbook_pool is not None:
+            workbook_pool.shutdown(wait=False, cancel_futures=True)
+
+    loaded['deflation'] = fiscal_year_deflation(loaded['series']['l522'], **(deflation_options or {}))
+    return loaded
@@ -0,0 +1,195 @@
+################################################################################
+#                   Author: Joshua Thompson
+#   O__  ----       Email:  joshua.thompson@ofwat.gov.uk
+#  c/ /'_ ---
+# (*) \(*) --
+# ======================== Script  Information =================================
+# PURPOSE: single cost limit model driven by a cost line control spec
+#
+# PROJECT INFORMATION:
+#   Name: cost limit model
+#
+# HISTORY:----
+#   Date		        Remarks
+#	-----------	   ---------------------------------------------------------------
+#	 18/10/2026    Created script                                   JThompson (JT)
+#	 18/10/2026    Prepared cost line tables memoised per input     JThompson (JT)
+#	 18/10/2026    Integer year codes, array inflation lookup       JThompson (JT)
+#	 18/10/2026    Shared input grouping in cost_lines_tables       JThompson (JT)
+#===============================  Environment Setup  ===========================
+#==========================================================================================
+
+import pandas as pd
+import numpy as np
+import hashlib
+import json
+from collections import OrderedDict
+
+
+from grid_engine import cost_limit_tables, cost_limit_values, iter_cost_limit_blocks
+from fiscal_years import fiscal_year_codes, fiscal_year_mask, inflation_factor
+
+
+# control spec for each cost line: input items, household denominators and output renames
+COST_LINES = {
+    'model1': {
+        'item_numbers_APR': ['APRBCL1', 'APRBCL2', 'APRBCL3', 'APRBCL4', 'APRBCL5'],
+        'item_numbers_BPT': ['BPTBCL1', 'BPTBCL2', 'BPTBCL3', 'BPTBCL4', 'BPTBCL5'],
+        'denominator_APR': 'APRHH1',
+        'denominator_BPT': 'BPTHH1',
+        'years_exclude_BPT': ['2023-24', '2024-25'],
+        'rename_limited': ('BPT', 'PRA'),
+        'rename_customer': ('BPTBCL', 'PRCBLC'),
+    },
+    'model2': {
+        'item_numbers_APR': ['APRECL1', 'APRECL2', 'APRECL3', 'APRECL4', 'APRECL5'],
+        'item_numbers_BPT': ['BPTECL1', 'BPTECL2', 'BPTECL3', 'BPTECL4', 'BPTECL5'],
+        'denominator_APR': 'APRHH1',
+        'denominator_BPT': 'BPTHH1',
+        'years_exclude_BPT': ['2023-24', '2024-25'],
+        'rename_limited': ('BPT', 'PRA'),
+        'rename_customer': ('BPTECL', 'PRCELC'),
+    },
+}
+
+
+def compile_cost_input(data):
+    # integer code item number and fiscal year once so every filter is an array lookup
+    item_codes, item_labels = pd.factorize(data['item number'])
+    return {
+        'item_codes': item_codes,
+        'item_labels': pd.Index(item_labels),
+        'year_codes': fiscal_year_codes(data['year']),
+    }
+
+
+def code_mask(codes, labels, selected):
+    # missing values are coded -1 and pick up the trailing False
+    lookup = np.zeros(len(labels) + 1, dtype=bool)
+    found = labels.get_indexer(list(selected))
+    lookup[found[found >= 0]] = True
+    return lookup[codes]
+
+
+def cost_line_masks(cost_input, cost_line, year_exclude):
+    item_codes, item_labels = cost_input['item_codes'], cost_input['item_labels']
+    keep_APR_year = ~fiscal_year_mask(cost_input['year_codes'], [year_exclude])
+    keep_BPT_year = ~fiscal_year_mask(cost_input['year_codes'], cost_line['years_exclude_BPT'])
+    return {
+        'APR': code_mask(item_codes, item_labels, cost_line['item_numbers_APR']) & keep_APR_year,
+        'APR_HH': code_mask(item_codes, item_labels, [cost_line['denominator_APR']]) & keep_APR_year,
+        'BPT': code_mask(item_codes, item_labels, cost_line['item_numbers_BPT']) & keep_BPT_year,
+        'BPT_HH': code_mask(item_codes, item_labels, [cost_line['denominator_BPT']]) & keep_BPT_year,
+    }
+
+
+def prepare_cost_input(data, cost_lines, inflation_value, year_exclude):
+    cost_input = compile_cost_input(data)
+
+    # inflate APR data for every line sharing this input in one pass
+    item_numbers_APR = [item for cost_line in cost_lines.values() for item in cost_line['item_numbers_APR']]
+    is_APR = code_mask(cost_input['item_codes'], cost_input['item_labels'], item_numbers_APR)
+    input_data = data.copy()
+    input_data.loc[is_APR, 'value'] = input_data.loc[is_APR, 'value'] * inflation_value
+
+    masks = {name: cost_line_masks(cost_input, cost_line, year_exclude) for name, cost_line in cost_lines.items()}
+    return input_data, masks
+
+
+# prepared tables by (input content, cost line, inflation value, year exclude), least recently used first
+COST_TABLE_CACHE_SIZE = 16
+cost_table_cache = OrderedDict()
+
+
+def input_fingerprint(data):
+    # digest of the frame contents, an edited or reloaded frame never picks up stale tables
+    row_hashes = pd.util.hash_pandas_object(data, index=False).to_numpy()
+    return hashlib.sha256(json.dumps(list(map(str, data.columns))).encode() + row_hashes.tobytes()).hexdigest()
+
+
+def cost_line_tables(data, cost_lines, inflation_value, year_exclude):
+    # cost_limit_tables for each line sharing this input: APR inflation, household totals and
+    # denominators are worked out once and reused by every grid point and every later call
+    fingerprint = input_fingerprint(data)
+    keys = {
+        name: (fingerprint, json.dumps(cost_line, sort_keys=True), float(inflation_value), year_exclude)
+        for name, cost_line in cost_lines.items()
+    }
+    missing = {name: cost_lines[name] for name, key in keys.items() if key not in cost_table_cache}
+    if missing:
+        input_data, masks = prepare_cost_input(data, missing, inflation_value, year_exclude)
+        for name, cost_line in missing.items():
+            cost_table_cache[keys[name]] = cost_limit_tables(
+                input_data, masks[name], cost_line['rename_limited'], cost_line['rename_customer'])
+
+    tables = {}
+    for name, key in keys.items():
+        cost_table_cache.move_to_end(key)
+        tables[name] = cost_table_cache[key]
+    while len(cost_table_cache) > COST_TABLE_CACHE_SIZE:
+        cost_table_cache.popitem(last=False)
+    return tables
+
+
+def clear_cost_table_cache():
+    cost_table_cache.clear()
+
+
+def cost_lines_tables(data, cost_lines, inflation_value, year_exclude):
+    # prepared tables for every cost line, data is one frame shared by all lines or a dict of
+    # frames keyed by line name; lines that share an input frame are grouped so it is preprocessed once
+    shared_inputs = {}
+    for name in cost_lines:
+        line_data = data[name] if isinstance(data, dict) else data
+        shared_inputs.setdefault(id(line_data), (line_data, {}))[1][name] = cost_lines[name]
+
+    tables = {}
+    for line_data, line_specs in shared_inputs.values():
+        tables.update(cost_line_tables(line_data, line_specs, inflation_value, year_exclude))
+    return tables
+
+
+def cost_limit_models(
+    data,
+    cost_lines,
+    grids,
+    inflation_year,
+    deflation,
+    year_exclude):
+    # data is one frame shared by all lines or a dict of frames keyed by line name,
+    # grids is a dict of (efficiency_seq, limit_lineincrease_seq) keyed by line name
+    inflation_value = inflation_factor(deflation, inflation_year)
+    tables = cost_lines_tables(data, cost_lines, inflation_value, year_exclude)
+    return {name: cost_limit_values(tables[name], *grids[name]) for name in cost_lines}
+
+
+def cost_limit_model(
+    data,
+    cost_line,
+    efficiency_seq,
+    limit_lineincrease_seq,
+    inflation_year,
+    deflation,
+    year_exclude):
+    return cost_limit_models(
+        data=data,
+        cost_lines={'line': cost_line},
+        grids={'line': (efficiency_seq, limit_lineincrease_seq)},
+        inflation_year=inflation_year,
+        deflation=deflation,
+        year_exclude=year_exclude
+    )['line']
+
+
+def iter_cost_limit_model(
+    data,
+    cost_line,
+    efficiency_seq,
+    limit_lineincrease_seq,
+    inflation_year,
+    deflation,
+    year_exclude):
+    # yield (efficiency, limit_lineincrease - 1, block) per grid point in cost_limit_model order
+    inflation_value = inflation_factor(deflation, inflation_year)
+    tables = cost_line_tables(data, {'line': cost_line}, inflation_value, year_exclude)['line']
+    yield from iter_cost_limit_blocks(tables, efficiency_seq, limit_lineincrease_seq)
@@ -0,0 +1,103 @@
+################################################################################
+#                   Author: Joshua Thompson
+#   O__  ----       Email:  joshua.thompson@ofwat.gov.uk
+#  c/ /'_ ---
+# (*) \(*) --
+# ======================== Script  Information =================================
+# PURPOSE: integer coded fiscal years and an array backed deflation table
+#
+# PROJECT INFORMATION:
+#   Name: fiscal years
+#
+# HISTORY:----
+#   Date		        Remarks
+#	-----------	   ---------------------------------------------------------------
+#	 18/10/2026    Created script                                   JThompson (JT)
+#===============================  Environment Setup  ===========================
+#==========================================================================================
+
+import pandas as pd
+import numpy as np
+
+
+# fiscal years are coded by the calendar year they end in: "2017-18" is 2018
+
+
+def fiscal_year_label(end_year):
+    return f"{end_year-1}-{end_year % 100:02d}"
+
+
+def fiscal_year_labels(end_years):
+    return np.array([fiscal_year_label(end_year) for end_year in np.asarray(end_years).tolist()], dtype=object)
+
+
+def fiscal_year_codes(labels):
+    # "YYYY-YY" labels to end years, -1 for missing or malformed labels, each distinct label parsed once
+    codes, uniques = pd.factorize(pd.Series(np.asarray(labels, dtype=object)))
+    parsed = pd.Series(uniques, dtype=object).astype(str).str.extract(r"^(\d{4})-(\d{2})$")
+    start, end = pd.to_numeric(parsed[0]).to_numpy(), pd.to_numeric(parsed[1]).to_numpy()
+    with np.errstate(invalid='ignore'):
+        valid = (start + 1) % 100 == end
+    lookup = np.append(np.where(valid, start + 1, -1), -1).astype(np.int64)
+    return lookup[codes]
+
+
+def fiscal_year_code(label):
+    code = fiscal_year_codes([label])[0]
+    if code < 0:
+        raise ValueError(f"Not a fiscal year label: {label!r}")
+    return int(code)
+
+
+def fiscal_year_mask(year_codes, years):
+    # rows whose coded year is one of years (labels), missing years never match
+    selected = fiscal_year_codes(list(years))
+    return np.isin(year_codes, selected[selected >= 0])
+
+
+def rebase_index(index, base_position):
+    # (deflation, inflation) of every year relative to the year at base_position
+    base = index[base_position]
+    return base / index, index / base
+
+
+def deflation_table(deflation):
+    # fiscal_year_deflation frame (or a table already) as arrays positioned by end year - first_year
+    if isinstance(deflation, dict):
+        return deflation
+    codes = fiscal_year_codes(deflation['Fiscal_Year'])
+    first_year = int(codes.min())
+    position = codes - first_year
+    table = {'first_year': first_year}
+    for key, column in (('index', 'FiscalYear_CPIH_INDEX'), ('deflation', 'deflation'), ('inflation', 'inflation')):
+        table[key] = np.full(codes.max() - first_year + 1, np.nan)
+        table[key][position] = deflation[column].to_numpy(dtype=float)
+    return table
+
+
+def year_positions(table, years):
+    # array positions of fiscal year labels, KeyError for years the table does not cover
+    positions = fiscal_year_codes(np.atleast_1d(np.asarray(years, dtype=object))) - table['first_year']
+    missing = (positions < 0) | (positions >= len(table['index']))
+    missing[~missing] = np.isnan(table['index'][positions[~missing]])
+    if missing.any():
+        raise KeyError(f"No deflation for fiscal year(s): {np.atleast_1d(years)[missing].tolist()}")
+    return positions
+
+
+def inflation_factors(deflation, years):
+    # inflation of each fiscal year relative to the table's base year
+    table = deflation_table(deflation)
+    return table['inflation'][year_positions(table, years)]
+
+
+def inflation_factor(deflation, inflation_year):
+    return float(inflation_factors(deflation, [inflation_year])[0])
+
+
+def rebase(deflation, base_year):
+    # the same table with deflation and inflation relative to another base year
+    table = deflation_table(deflation)
+    rebased = dict(table)
+    rebased['deflation'], rebased['inflation'] = rebase_index(table['index'], year_positions(table, [base_year])[0])
+    return rebased
@@ -0,0 +1,677 @@
+################################################################################
+#                   Author: Joshua Thompson
+#   O__  ----       Email:  joshua.thompson@ofwat.gov.uk
+#  c/ /'_ ---
+# (*) \(*) --
+# ======================== Script  Information =================================
+# PURPOSE: golden output checks of the optimised engines against the reference models
+#
+# PROJECT INFORMATION:
+#   Name: golden harness
+#
+# HISTORY:----
+#   Date		        Remarks
+#	-----------	   ---------------------------------------------------------------
+#	 18/10/2026    Created script                                   JThompson (JT)
+#	 18/10/2026    Incremental cache paths checked cold and warm    JThompson (JT)
+#	 18/10/2026    Unexpected dtypes fail, ragged companies dataset JThompson (JT)
+#	 18/10/2026    Incremental model 3 by company chunk, cold/warm  JThompson (JT)
+#	 18/10/2026    constrained_search against a filtered sweep      JThompson (JT)
+#	 18/10/2026    Sensitivity partials and cap breakpoints checked JThompson (JT)
+#	 18/10/2026    ONS loading checked against the stand-in         JThompson (JT)
+#	 18/10/2026    iter_model1/2 blocks against model1/2            JThompson (JT)
+#===============================  Environment Setup  ===========================
+#==========================================================================================
+
+import pandas as pd
+import numpy as np
+import argparse
+import csv
+import json
+import os
+import sys
+import tempfile
+import time
+import warnings
+
+
+from benchmark_models import SMOOTHING_DIC, make_synthetic_submission, make_synthetic_deflation
+from compact_results import expand_results
+from concurrent_loader import load_model_inputs
+from cost_limit_model import COST_LINES, clear_cost_table_cache
+from fiscal_years import deflation_table
+from grid_search import constrained_search
+from inflation_data_ONS import get_deflation, load_ons_series, fiscal_year_deflation, month_to_numeric
+from incremental_cache import incremental_cost_limit_model, iter_incremental_model3, model3_keys, model3_todo
+from input_loader import load_input_data, read_input_sheet
+from model1_function import model1, iter_model1
+from model2_function import model2, iter_model2
+from model3_batch import MODEL3_COLUMNS, iter_model3_batches, model3_batch, model3_scenario_table
+from model3_function import model3
+from ons_stand_in import ons_stand_in
+from parallel_sweep import iter_parallel_model3_batches, parallel_cost_limit_models
+from reference_models import reference_model1, reference_model2, reference_model3, reference_driver
+from sensitivity import sensitivity
+
+
+# rows are matched on these columns (plus the occurrence of a repeated key), everything else is compared
+COST_LIMIT_KEYS = ['company', 'item number', 'year', 'efficiency', 'limit_lineincrease']
+MODEL3_KEYS = [
+    'company', 'item number', 'year', 'smooth_factor', 'company_return',
+    'model1_efficiency', 'model1_limit_lineincrease', 'model2_efficiency', 'model2_limit_lineincrease'
+]
+SCENARIO_KEYS = [
+    'model1_efficiency', 'model1_limit_lineincrease', 'model2_efficiency', 'model2_limit_lineincrease', 'company_return'
+]
+
+RTOL = 1e-9
+ATOL = 1e-9
+# compact results narrow values to float32 only within half a unit of the rows' dp (3)
+COMPACT_ATOL = 5e-4
+# sensitivity partials against central differences of step SENSITIVITY_STEP (the models are linear
+# between cap breakpoints, so only rounding separates them), breakpoints probed a relative
+# BREAKPOINT_STEP either side
+SENSITIVITY_STEP = 1e-6
+SENSITIVITY_TOL = 1e-5
+BREAKPOINT_STEP = 1e-4
+# the stand-in answers the deadline case this many seconds late, past a load deadline of ONS_DEADLINE
+ONS_STAND_IN_DELAY = 1.0
+ONS_DEADLINE = 0.2
+
+# dtype differences by design, (reference, candidate) per column: the reference smooth_factor is None
+# on the company return and customer charge rows (object) where the batch engines use NaN, and the
+# loader reads company and year as categoricals; any other dtype difference fails the case
+ACCEPTED_DTYPE_DIFFERENCES = {
+    'smooth_factor': [('object', 'float64')],
+    'company': [('str', 'category')],
+    'year': [('str', 'category')],
+}
+
+
+def plain_columns(frame, keys, key_decimals):
+    # categoricals back to their labels, object columns of numbers and None (smooth_factor) to float,
+    # float keys rounded so last bit differences do not split rows
+    frame = frame.reset_index(drop=True).copy()
+    for column in frame.columns:
+        if isinstance(frame[column].dtype, pd.CategoricalDtype):
+            frame[column] = frame[column].astype(frame[column].cat.categories.dtype)
+        elif frame[column].dtype == object:
+            numeric = pd.to_numeric(frame[column], errors='coerce')
+            if numeric.notna().sum() == frame[column].notna().sum():
+                frame[column] = numeric.astype(float)
+    for key in keys:
+        if pd.api.types.is_float_dtype(frame[key]):
+            frame[key] = frame[key].round(key_decimals)
+    frame['occurrence'] = frame.groupby(keys, dropna=False, sort=False).cumcount()
+    return frame
+
+
+def column_differences(reference, candidate, rtol, atol):
+    if pd.api.types.is_numeric_dtype(reference) and pd.api.types.is_numeric_dtype(candidate):
+        reference = reference.to_numpy(dtype=float)
+        candidate = candidate.to_numpy(dtype=float)
+        both = ~np.isnan(reference) & ~np.isnan(candidate)
+        abs_diff = np.abs(reference - candidate)[both]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rel_diff = np.where(abs_diff == 0, 0.0, abs_diff / np.abs(reference[both]))
+        mismatched = (np.isnan(reference) != np.isnan(candidate)).sum() + (
+            ~np.isclose(candidate[both], reference[both], rtol=rtol, atol=atol)).sum()
+        return {
+            'max_abs_diff': float(abs_diff.max()) if len(abs_diff) else 0.0,
+            'max_rel_diff': float(rel_diff.max()) if len(rel_diff) else 0.0,
+            'n_mismatched': int(mismatched),
+        }
+
+    same = (reference.to_numpy(dtype=object) == candidate.to_numpy(dtype=object)) | (
+        reference.isna().to_numpy() & candidate.isna().to_numpy())
+    return {'max_abs_diff': None, 'max_rel_diff': None, 'n_mismatched': int((~same).sum())}
+
+
+def compare_frames(reference, candidate, keys, rtol=RTOL, atol=ATOL, key_decimals=10,
+                   accepted_dtypes=ACCEPTED_DTYPE_DIFFERENCES):
+    # align two result frames by key and report row, column, dtype and value differences
+    report = {
+        'rows_reference': len(reference),
+        'rows_candidate': len(candidate),
+        'missing_columns': [column for column in reference.columns if column not in candidate.columns],
+        'extra_columns': [column for column in candidate.columns if column not in reference.columns],
+        'dtype_differences': {
+            column: [str(reference[column].dtype), str(candidate[column].dtype)]
+            for column in reference.columns
+            if column in candidate.columns and reference[column].dtype != candidate[column].dtype
+        },
+    }
+    report['unexpected_dtype_differences'] = [
+        column for column, dtypes in report['dtype_differences'].items()
+        if tuple(dtypes) not in accepted_dtypes.get(column, [])
+    ]
+
+    value_columns = [column for column in reference.columns if column in candidate.columns and column not in keys]
+    merged = pd.merge(
+        plain_columns(reference, keys, key_decimals),
+        plain_columns(candidate, keys, key_decimals),
+        on=keys + ['occurrence'],
+        how='outer',
+        suffixes=('_reference', '_candidate'),
+        indicator=True
+    )
+    report['missing_rows'] = int((merged['_merge'] == 'left_only').sum())
+    report['extra_rows'] = int((merged['_merge'] == 'right_only').sum())
+
+    matched = merged[merged['_merge'] == 'both']
+    report['columns'] = {
+        column: column_differences(matched[column + '_reference'], matched[column + '_candidate'], rtol, atol)
+        for column in value_columns
+    }
+    report['passed'] = (
+        not report['missing_columns'] and not report['extra_columns'] and not report['unexpected_dtype_differences']
+        and report['missing_rows'] == 0 and report['extra_rows'] == 0
+        and all(column['n_mismatched'] == 0 for column in report['columns'].values())
+    )
+    return report
+
+
+def filtered_sweep(driver, smoothing_dic, lower, upper):
+    # the scenarios of a full model 3 sweep whose smoothed charge rows (PRSMCT1, one per company, year
+    # and smoothing factor) all lie within [lower, upper], a charge or {company: charge}
+    smoothed = driver[driver['item number'].str.endswith('PRSMCT1')].astype({'smooth_factor': float})
+    factors = pd.DataFrame(
+        [(scenario, year, factor) for scenario, year_factors in smoothing_dic.items() for year, factor in year_factors.items()],
+        columns=['smoothing_scenario', 'year', 'smooth_factor'])
+    rows = smoothed.drop_duplicates(SCENARIO_KEYS + ['company', 'year', 'smooth_factor']).merge(
+        factors, on=['year', 'smooth_factor'])
+
+    def bound(value):
+        return rows['company'].map(value).to_numpy(dtype=float) if isinstance(value, dict) else value
+
+    rows['ok'] = (rows['value'] >= bound(lower)) & (rows['value'] <= bound(upper))
+    feasible = rows.groupby(SCENARIO_KEYS + ['smoothing_scenario'])['ok'].all()
+    return feasible[feasible].index.to_frame(index=False)
+
+
+def search_cases(driver, candidate, smoothing_dic, company_return_range):
+    # constrained_search against the full sweep filtered by the same targets, targets taken from
+    # quantiles of the smoothed charges so each keeps some scenarios and drops others
+    charges = driver.loc[driver['item number'].str.endswith('PRSMCT1'), ['company', 'value']]
+    baseline = charges.groupby('company')['value'].median().to_dict()
+    targets = {
+        'search_max_charge': (dict(max_charge=charges['value'].quantile(0.6)), -np.inf, charges['value'].quantile(0.6)),
+        'search_charge_band': (
+            dict(min_charge=charges['value'].quantile(0.1), max_charge=charges['value'].quantile(0.9)),
+            charges['value'].quantile(0.1), charges['value'].quantile(0.9)),
+        'search_max_increase': (
+            dict(baseline=baseline, max_increase=0.05), -np.inf,
+            {company: charge * 1.05 for company, charge in baseline.items()}),
+    }
+    cases = {}
+    for name, (search_targets, lower, upper) in targets.items():
+        expected, reference_seconds = timed(lambda: filtered_sweep(driver, smoothing_dic, lower, upper))
+        (feasible, _), candidate_seconds = timed(lambda: constrained_search(
+            candidate['model1'], candidate['model2'], company_return_range, smoothing_dic, **search_targets))
+        cases[name] = dict(
+            compare_frames(expected, feasible, SCENARIO_KEYS + ['smoothing_scenario']),
+            reference_seconds=reference_seconds, candidate_seconds=candidate_seconds)
+    return cases
+
+
+def reference_point(reference_inputs, reference_deflation, point, smoothing_dic, inflation_year, year_exclude):
+    # the original scripts' model 3 rows at one sensitivity point
+    reference_models = {'model1': reference_model1, 'model2': reference_model2}
+    results = [
+        model(reference_inputs[name], [point[f'{name}_efficiency']], [point[f'{name}_limit_lineincrease']],
+              inflation_year, reference_deflation, year_exclude)
+        for name, model in reference_models.items()
+    ]
+    return reference_model3(pd.concat(results, ignore_index=True), smoothing_dic, [point['company_return']])
+
+
+def sensitivity_cases(
+    reference_inputs,
+    candidate_inputs,
+    reference_deflation,
+    candidate_deflation,
+    grids,
+    smoothing_dic,
+    company_return_range,
+    inflation_year,
+    year_exclude):
+    # sensitivity at the grid middles: each model 3 partial against a central difference of the original
+    # scripts, and each cap breakpoint against the original model 1/2 just above (cap not binding, same
+    # value as with no cap) and just below it (cap binding, value lower)
+    point = {'company_return': float(company_return_range[len(company_return_range) // 2])}
+    for name in COST_LINES:
+        efficiency_seq, limit_lineincrease_seq = grids[name]
+        point[f'{name}_efficiency'] = float(efficiency_seq[len(efficiency_seq) // 2])
+        point[f'{name}_limit_lineincrease'] = float(limit_lineincrease_seq[len(limit_lineincrease_seq) // 2])
+    result, candidate_seconds = timed(lambda: sensitivity(
+        candidate_inputs, point, smoothing_dic, inflation_year, candidate_deflation, year_exclude))
+
+    cases = {}
+    row_keys = MODEL3_KEYS[:4]
+    for variable in point:
+        start = time.perf_counter()
+        above, below = dict(point), dict(point)
+        above[variable] += SENSITIVITY_STEP
+        below[variable] -= SENSITIVITY_STEP
+        plus, minus = (reference_point(reference_inputs, reference_deflation, shifted, smoothing_dic,
+                                       inflation_year, year_exclude) for shifted in (above, below))
+        difference = plus[row_keys].assign(
+            value=(plus['value'].to_numpy(dtype=float) - minus['value'].to_numpy(dtype=float)) / (2 * SENSITIVITY_STEP))
+        partial = result['model3'][row_keys].assign(value=result['model3'][f'd_{variable}'].to_numpy())
+        cases[f'sensitivity_d_{variable}'] = dict(
+            compare_frames(difference, partial, row_keys, rtol=SENSITIVITY_TOL, atol=SENSITIVITY_TOL),
+            reference_seconds=time.perf_counter() - start, candidate_seconds=candidate_seconds)
+
+    # every breakpoint's line item at limits either side of it and with no cap at all
+    start = time.perf_counter()
+    reference_models = {'model1': reference_model1, 'model2': reference_model2}
+    breakpoints = result['breakpoints']
+    observed = []
+    for name, model in reference_models.items():
+        line_breakpoints = breakpoints[breakpoints['model'] == name]
+        limits = np.concatenate([
+            line_breakpoints['limit_breakpoint'].to_numpy() * (1 + BREAKPOINT_STEP),
+            line_breakpoints['limit_breakpoint'].to_numpy() * (1 - BREAKPOINT_STEP),
+            [np.inf]])
+        values = model(reference_inputs[name], [point[f'{name}_efficiency']], limits,
+                       inflation_year, reference_deflation, year_exclude)
+        for company, item_number, limit_breakpoint in line_breakpoints[
+                ['company', 'item number', 'limit_breakpoint']].itertuples(index=False, name=None):
+            rows = values[(values['company'] == company) & (values['item number'] == item_number)]
+
+            def at(limit):
+                return rows.loc[np.isclose(rows['limit_lineincrease'], limit - 1, rtol=0, atol=1e-12), 'value'].to_numpy(dtype=float)
+
+            uncapped = rows.loc[rows['limit_lineincrease'] == np.inf, 'value'].to_numpy(dtype=float)
+            observed.append({
+                'model': name, 'company': company, 'item number': item_number, 'limit_breakpoint': limit_breakpoint,
+                'free_above': bool(np.allclose(at(limit_breakpoint * (1 + BREAKPOINT_STEP)), uncapped, rtol=RTOL, atol=ATOL)),
+                'binds_below': bool((at(limit_breakpoint * (1 - BREAKPOINT_STEP)) < uncapped).all()),
+            })
+    observed = pd.DataFrame(observed, columns=['model', 'company', 'item number', 'limit_breakpoint', 'free_above', 'binds_below'])
+    expected = observed.assign(free_above=True, binds_below=True)
+    cases['sensitivity_breakpoints'] = dict(
+        compare_frames(expected, observed, ['model', 'company', 'item number', 'limit_breakpoint']),
+        reference_seconds=time.perf_counter() - start, candidate_seconds=candidate_seconds)
+    return cases
+
+
+def synthetic_ons_csv(path, seed=0, first_year=2015, last_year=2025):
+    # a cpih like index in the generator's layout (metadata rows, then annual, quarterly and monthly
+    # periods) written to path, returns the monthly series load_ons_series should parse from it
+    rng = np.random.default_rng(seed)
+    series = pd.DataFrame(
+        [(year, month) for year in range(first_year, last_year) for month in range(1, 13)],
+        columns=['Year', 'Month_numeric'])
+    series['CPIH INDEX'] = np.round(100 * np.cumprod(1 + rng.normal(0.002, 0.002, len(series))), 1)
+
+    month_names = {month: name.upper() for name, month in month_to_numeric.items()}
+    rows = [
+        ['Title', 'CPIH INDEX 00: ALL ITEMS 2015=100'], ['CDID', 'L522'], ['Source dataset ID', 'MM23'],
+        ['PreUnit', ''], ['Unit', 'Index, base year = 100'], ['Release date', '15-10-2026'], ['Next release', '12 November 2026'],
+        ['Important notes', ''],
+    ]
+    by_year = series.groupby('Year')['CPIH INDEX']
+    rows += [[str(year), f"{value:.1f}"] for year, value in by_year.mean().items()]
+    rows += [[f"{year} Q{quarter + 1}", f"{values.iloc[3 * quarter:3 * quarter + 3].mean():.1f}"]
+             for year, values in by_year for quarter in range(4)]
+    rows += [[f"{year} {month_names[month]}", f"{value:.1f}"] for year, month, value in series.itertuples(index=False)]
+    with open(path, 'w', newline='') as f:
+        csv.writer(f, quoting=csv.QUOTE_ALL).writerows(rows)
+    return series
+
+
+def check_case(expected, observed, seconds):
+    # expected and observed are {check: value}, as a case so it reports like the frame comparisons
+    frames = [pd.DataFrame({'check': list(checks), 'value': [float(value) for value in checks.values()]})
+              for checks in (expected, observed)]
+    return dict(compare_frames(frames[0], frames[1], ['check']), reference_seconds=None, candidate_seconds=seconds)
+
+
+def raises(error, function):
+    try:
+        function()
+    except error:
+        return True
+    return False
+
+
+def ons_cases(seed=0):
+    # load_ons_series and load_model_inputs against ons_stand_in serving a synthetic csv: retries of 503s,
+    # ETag revalidation of a stale cache, offline runs from the cache and the load deadline
+    cases = {}
+    with tempfile.TemporaryDirectory() as directory:
+        fixture = os.path.join(directory, 'l522.csv')
+        expected = synthetic_ons_csv(fixture, seed)
+        cache_dir = os.path.join(directory, 'cache')
+        series_keys = ['Year', 'Month_numeric']
+
+        def read_meta():
+            with open(os.path.join(cache_dir, 'l522.json')) as f:
+                return json.load(f)
+
+        with ons_stand_in({'l522': fixture}, failures={'l522': 2}) as (base_url, server):
+            # two 503s: one retry is not enough and there is no cache to fall back on, three are
+            start = time.perf_counter()
+            exhausted = raises(RuntimeError, lambda: load_ons_series(
+                'l522', cache_dir=os.path.join(directory, 'empty'), base_url=base_url, retries=1, backoff=0))
+            exhausted_requests = len(server.requests)
+            server.failures['l522'] = 2
+            server.requests.clear()
+            series = load_ons_series('l522', cache_dir=cache_dir, base_url=base_url, retries=3, backoff=0)
+            cases['ons_retry_503'] = check_case(
+                {'exhausted_raises': True, 'exhausted_requests': 2, 'series_matches': True, 'requests': 3},
+                {'exhausted_raises': exhausted, 'exhausted_requests': exhausted_requests,
+                 'series_matches': compare_frames(expected, series, series_keys)['passed'], 'requests': len(server.requests)},
+                time.perf_counter() - start)
+
+            # a stale cache (ttl 0) is revalidated with its ETag, the 304 keeps the series and renews fetched_at
+            start = time.perf_counter()
+            meta = read_meta()
+            server.requests.clear()
+            series = load_ons_series('l522', cache_dir=cache_dir, ttl=0, base_url=base_url, backoff=0)
+            cases['ons_etag_revalidation'] = check_case(
+                {'series_matches': True, 'requests': 1, 'sent_cached_etag': True, 'fetched_at_renewed': True},
+                {'series_matches': compare_frames(expected, series, series_keys)['passed'], 'requests': len(server.requests),
+                 'sent_cached_etag': server.requests == [('l522', meta['etag'])],
+                 'fetched_at_renewed': read_meta()['fetched_at'] > meta['fetched_at']},
+                time.perf_counter() - start)
+
+            # offline loads only from the cache, and fails when there is none
+            start = time.perf_counter()
+            server.requests.clear()
+            loaded = load_model_inputs({}, offline=True, cache_dir=cache_dir, base_url=base_url)
+            missing = raises(RuntimeError, lambda: load_model_inputs(
+                {}, offline=True, cache_dir=os.path.join(directory, 'empty'), base_url=base_url))
+            cases['ons_offline'] = check_case(
+                {'series_matches': True, 'deflation_matches': True, 'requests': 0, 'empty_cache_raises': True},
+                {'series_matches': compare_frames(expected, loaded['series']['l522'], series_keys)['passed'],
+                 'deflation_matches': compare_frames(
+                     fiscal_year_deflation(expected), loaded['deflation'], ['Fiscal_Year'])['passed'],
+                 'requests': len(server.requests), 'empty_cache_raises': missing},
+                time.perf_counter() - start)
+
+        with ons_stand_in({'l522': fixture}, delay=ONS_STAND_IN_DELAY) as (base_url, server):
+            # a slow server fails the load at the deadline rather than when the response arrives
+            start = time.perf_counter()
+            late = raises(TimeoutError, lambda: load_model_inputs(
+                {}, cache_dir=os.path.join(directory, 'slow'), base_url=base_url, retries=0, deadline=ONS_DEADLINE))
+            seconds = time.perf_counter() - start
+            cases['ons_deadline'] = check_case(
+                {'raises_timeout': True, 'before_response': True},
+                {'raises_timeout': late, 'before_response': seconds < ONS_STAND_IN_DELAY},
+                seconds)
+    return cases
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def golden_grids(m1_grid, m2_grid):
+    # line limits from no increase to 60% so both sides of the cap are exercised
+    return {
+        'model1': (np.linspace(0.970, 0.990, m1_grid[0]), np.linspace(1.0, 1.6, m1_grid[1])),
+        'model2': (np.linspace(0.740, 0.760, m2_grid[0]), np.linspace(1.0, 1.6, m2_grid[1])),
+    }
+
+
+def make_ragged_submission(data, cost_line):
+    # a company without its last BPT item and another without its last BPT year, so the positional
+    # APR/BPT pairing of the original scripts meets companies with different rows (it leaves rows with
+    # no item number, which the original model 3 script cannot read, so only models 1 and 2 are checked)
+    companies = data['company'].unique()
+    last_year = data.loc[data['item number'].isin(cost_line['item_numbers_BPT']), 'year'].max()
+    drop = ((data['company'] == companies[1]) & (data['item number'] == cost_line['item_numbers_BPT'][-1])) | (
+        (data['company'] == companies[2]) & (data['year'] == last_year))
+    return data[~drop].reset_index(drop=True)
+
+
+def golden_datasets(n_companies=4, seed=0, input_paths=None, ons_fixture=None):
+    # (name, reference inputs, candidate inputs, reference deflation, candidate deflation, check model 3),
+    # the reference side gets plain frames as the original scripts read them, the candidate side the
+    # loader's and table forms
+    synthetic_inputs = {
+        name: make_synthetic_submission(cost_line, n_companies, seed=seed + i)
+        for i, (name, cost_line) in enumerate(COST_LINES.items())
+    }
+    synthetic_deflation = make_synthetic_deflation()
+    ragged_inputs = {
+        name: make_ragged_submission(synthetic_inputs[name], cost_line) for name, cost_line in COST_LINES.items()
+    }
+    datasets = [
+        ('synthetic', synthetic_inputs, synthetic_inputs, synthetic_deflation, deflation_table(synthetic_deflation), True),
+        ('ragged', ragged_inputs, ragged_inputs, synthetic_deflation, deflation_table(synthetic_deflation), False),
+    ]
+
+    if input_paths or ons_fixture:
+        reference_inputs, candidate_inputs = synthetic_inputs, synthetic_inputs
+        if input_paths:
+            reference_inputs = {name: read_input_sheet(path) for name, path in input_paths.items()}
+            candidate_inputs = {name: load_input_data(path) for name, path in input_paths.items()}
+        deflation = get_deflation(fixture=ons_fixture) if ons_fixture else synthetic_deflation
+        datasets.append(('fixture', reference_inputs, candidate_inputs, deflation, deflation_table(deflation), True))
+
+    return datasets
+
+
+def first_pair(results, grids):
+    # model 3 input for the first model1 and model2 grid points
+    return pd.concat([
+        results[name][(results[name]['efficiency'] == results[name]['efficiency'].iloc[0]) &
+                      (results[name]['limit_lineincrease'] == results[name]['limit_lineincrease'].iloc[0])]
+        for name in ('model1', 'model2')
+    ], ignore_index=True)
+
+
+def golden_cases(
+    reference_inputs,
+    candidate_inputs,
+    reference_deflation,
+    candidate_deflation,
+    grids,
+    smoothing_dic,
+    company_return_range,
+    inflation_year="2022-23",
+    year_exclude="2017-18",
+    max_workers=2,
+    check_model3=True):
+    # reference outputs once, then every optimised path checked against them end to end
+    # (model 3 paths take the optimised model 1 and 2 results as their input)
+    reference_models = {'model1': reference_model1, 'model2': reference_model2}
+    candidate_models = {'model1': model1, 'model2': model2}
+    iter_models = {'model1': iter_model1, 'model2': iter_model2}
+    cases = {}
+
+    clear_cost_table_cache()
+    reference, candidate = {}, {}
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        for name in COST_LINES:
+            efficiency_seq, limit_lineincrease_seq = grids[name]
+            reference[name], reference_seconds = timed(lambda: reference_models[name](
+                reference_inputs[name], efficiency_seq, limit_lineincrease_seq, inflation_year, reference_deflation, year_exclude))
+            candidate[name], candidate_seconds = timed(lambda: candidate_models[name](
+                candidate_inputs[name], efficiency_seq, limit_lineincrease_seq, inflation_year, candidate_deflation, year_exclude))
+            cases[name] = dict(
+                compare_frames(reference[name], candidate[name], COST_LIMIT_KEYS),
+                reference_seconds=reference_seconds, candidate_seconds=candidate_seconds)
+
+            # the streamed blocks concatenated are model1/2's frame itself, same rows in the same order
+            blocks, iter_seconds = timed(lambda: [block for _, _, block in iter_models[name](
+                candidate_inputs[name], efficiency_seq, limit_lineincrease_seq, inflation_year, candidate_deflation, year_exclude)])
+            streamed = pd.concat(blocks, ignore_index=True)
+            case = compare_frames(candidate[name], streamed, COST_LIMIT_KEYS)
+            case['identical'] = bool(streamed.equals(candidate[name].reset_index(drop=True)))
+            case['passed'] = case['passed'] and case['identical']
+            cases['iter_' + name] = dict(case, reference_seconds=candidate_seconds, candidate_seconds=iter_seconds)
+
+        clear_cost_table_cache()
+        parallel, parallel_seconds = timed(lambda: parallel_cost_limit_models(
+            candidate_inputs, COST_LINES, grids, inflation_year, candidate_deflation, year_exclude,
+            executor='thread', max_workers=max_workers))
+        for name in COST_LINES:
+            cases['parallel_' + name] = dict(
+                compare_frames(reference[name], parallel[name], COST_LIMIT_KEYS),
+                reference_seconds=cases[name]['reference_seconds'], candidate_seconds=parallel_seconds)
+
+    if check_model3:
+        model3_results, driver, driver_seconds = model3_cases(
+            reference, candidate, grids, smoothing_dic, company_return_range, max_workers)
+        cases.update(model3_results)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            cases.update(sensitivity_cases(
+                reference_inputs, candidate_inputs, reference_deflation, candidate_deflation, grids,
+                smoothing_dic, company_return_range, inflation_year, year_exclude))
+
+    # incremental cache: a cold run computes every company, the warm rerun reads them all back and
+    # model 3 recomputes only the company chunks missing from what the cold run wrote
+    written = {}
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for run in ('cold', 'warm'):
+            incremental, keys = {}, {}
+            for name in COST_LINES:
+                efficiency_seq, limit_lineincrease_seq = grids[name]
+                (incremental[name], keys[name], _), candidate_seconds = timed(lambda: incremental_cost_limit_model(
+                    candidate_inputs[name], COST_LINES[name], efficiency_seq, limit_lineincrease_seq,
+                    inflation_year, candidate_deflation, year_exclude, cache_dir=cache_dir))
+                cases[f'incremental_{name}_{run}'] = dict(
+                    compare_frames(reference[name], incremental[name], COST_LIMIT_KEYS),
+                    reference_seconds=cases[name]['reference_seconds'], candidate_seconds=candidate_seconds)
+            if not check_model3:
+                continue
+            company_keys = model3_keys(keys['model1'], keys['model2'], smoothing_dic, company_return_range, False, 2)
+            n_model1 = len(grids['model1'][0]) * len(grids['model1'][1])
+            todo = model3_todo(company_keys, set(written), n_model1, 2)
+            chunks, candidate_seconds = timed(lambda: list(iter_incremental_model3(
+                incremental['model1'], incremental['model2'], company_keys, todo, smoothing_dic,
+                company_return_range, chunk_size=2, executor='thread', max_workers=max_workers)))
+            for start, company_rows in chunks:
+                for company, key, rows in company_rows:
+                    written[(company, key, start)] = rows
+            recomputed = sum(len(company_rows) for _, company_rows in chunks)
+            case = compare_frames(driver, pd.concat(written.values(), ignore_index=True), MODEL3_KEYS)
+            # the warm rerun must not sweep anything again
+            case['chunks_recomputed'] = recomputed
+            case['passed'] = case['passed'] and (run == 'cold' or recomputed == 0)
+            cases[f'incremental_model3_{run}'] = dict(
+                case, reference_seconds=driver_seconds, candidate_seconds=candidate_seconds)
+
+    return cases
+
+
+def model3_cases(reference, candidate, grids, smoothing_dic, company_return_range, max_workers):
+    # model 3 paths on the optimised model 1 and 2 results against the reference driver,
+    # returns (cases, driver output, driver seconds)
+    cases = {}
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        pair, reference_seconds = timed(lambda: reference_model3(first_pair(reference, grids), smoothing_dic, company_return_range))
+        single, candidate_seconds = timed(lambda: model3(first_pair(candidate, grids), smoothing_dic, company_return_range))
+        cases['model3_single_pair'] = dict(
+            compare_frames(pair, single, MODEL3_KEYS[:5]),
+            reference_seconds=reference_seconds, candidate_seconds=candidate_seconds)
+
+        driver, driver_seconds = timed(lambda: reference_driver(
+            reference['model1'], reference['model2'], smoothing_dic, company_return_range))
+
+    model3_paths = {
+        'model3_batch': lambda: model3_batch(candidate['model1'], candidate['model2'], smoothing_dic, company_return_range),
+        'model3_parallel': lambda: pd.concat([final_data for _, final_data in iter_parallel_model3_batches(
+            candidate['model1'], candidate['model2'], smoothing_dic, company_return_range,
+            chunk_size=2, executor='thread', max_workers=max_workers)], ignore_index=True),
+        'model3_compact': lambda: expand_results(
+            pd.concat([final_data for _, final_data in iter_model3_batches(
+                candidate['model1'], candidate['model2'], smoothing_dic, company_return_range,
+                chunk_size=2, compact=True)], ignore_index=True),
+            model3_scenario_table(candidate['model1'], candidate['model2'], company_return_range),
+            MODEL3_COLUMNS),
+    }
+    for name, path in model3_paths.items():
+        result, candidate_seconds = timed(path)
+        atol = COMPACT_ATOL if name == 'model3_compact' else ATOL
+        cases[name] = dict(
+            compare_frames(driver, result, MODEL3_KEYS, atol=atol),
+            reference_seconds=driver_seconds, candidate_seconds=candidate_seconds)
+    cases.update(search_cases(driver, candidate, smoothing_dic, company_return_range))
+    return cases, driver, driver_seconds
+
+
+def run_golden(
+    n_companies=4,
+    m1_grid=(3, 3),
+    m2_grid=(2, 3),
+    n_returns=3,
+    seed=0,
+    input_paths=None,
+    ons_fixture=None,
+    smoothing_dic=SMOOTHING_DIC,
+    max_workers=2):
+    grids = golden_grids(m1_grid, m2_grid)
+    company_return_range = np.linspace(0.08, 0.12, n_returns)
+    report = {
+        'config': {
+            'n_companies': n_companies, 'm1_grid': list(m1_grid), 'm2_grid': list(m2_grid),
+            'n_returns': n_returns, 'seed': seed, 'input_paths': input_paths, 'ons_fixture': ons_fixture,
+        },
+        'datasets': {},
+    }
+
+    for name, reference_inputs, candidate_inputs, reference_deflation, candidate_deflation, check_model3 in golden_datasets(
+            n_companies, seed, input_paths, ons_fixture):
+        cases = golden_cases(
+            reference_inputs, candidate_inputs, reference_deflation, candidate_deflation,
+            grids, smoothing_dic, company_return_range, max_workers=max_workers, check_model3=check_model3)
+        report['datasets'][name] = cases
+        print_cases(name, cases)
+
+    # the ONS loader paths do not depend on the dataset
+    report['ons'] = ons_cases(seed)
+    print_cases('ons', report['ons'])
+
+    report['passed'] = all(case['passed'] for cases in report['datasets'].values() for case in cases.values()) and all(
+        case['passed'] for case in report['ons'].values())
+    return report
+
+
+def print_cases(name, cases):
+    for case, result in cases.items():
+        worst = max((column['max_abs_diff'] or 0.0 for column in result['columns'].values()), default=0.0)
+        print(f"{name}/{case}: {'ok' if result['passed'] else 'FAILED'}, {result['rows_reference']} rows, "
+              f"max abs diff {worst:.3g}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the optimised models against the reference models")
+    parser.add_argument('--companies', type=int, default=4)
+    parser.add_argument('--m1-grid', type=int, nargs=2, default=(3, 3), metavar=('EFFICIENCY', 'LIMIT'))
+    parser.add_argument('--m2-grid', type=int, nargs=2, default=(2, 3), metavar=('EFFICIENCY', 'LIMIT'))
+    parser.add_argument('--returns', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--inputs', nargs=2, metavar=('MODEL1', 'MODEL2'), help="model input workbooks to check as well")
+    parser.add_argument('--ons-fixture', help="ONS csv download to build the fixture deflation from")
+    parser.add_argument('--max-workers', type=int, default=2)
+    parser.add_argument('--output', default='golden_results.json')
+    args = parser.parse_args()
+
+    report = run_golden(
+        n_companies=args.companies,
+        m1_grid=tuple(args.m1_grid),
+        m2_grid=tuple(args.m2_grid),
+        n_returns=args.returns,
+        seed=args.seed,
+        input_paths=dict(zip(COST_LINES, args.inputs)) if args.inputs else None,
+        ons_fixture=args.ons_fixture,
+        max_workers=args.max_workers,
+    )
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"{'passed' if report['passed'] else 'FAILED'}, results written to {args.output}")
+    sys.exit(0 if report['passed'] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+################################################################################
+#                   Author: Joshua Thompson
+#   O__  ----       Email:  joshua.thompson@ofwat.gov.uk
+#  c/ /'_ ---
+# (*) \(*) --
+# ======================== Script  Information =================================
+# PURPOSE: vectorised efficiency x line increase grid for the cost limit models
+#
+# PROJECT INFORMATION:
+#   Name: grid engine
+#
+# HISTORY:----
+#   Date		        Remarks
+#	-----------	   ---------------------------------------------------------------
+#	 18/10/2026    Created script                                   JThompson (JT)
+#	 18/10/2026    Output block from a rename lookup, no slices     JThompson (JT)
+#	 18/10/2026    Removed unused cost_limit_grid                   JThompson (JT)
+#===============================  Environment Setup  ===========================
+#==========================================================================================
+
+import pandas as pd
+import numpy as np
+
+
+def household_totals(input_data, masks):
+    # line item totals by (company, item number) and household denominators by company, summed once
+    # and indexed so every cost line, grid point and run on the same input can reuse them
+    def totals(mask, by):
+        return input_data[mask].groupby(by, observed=True)['value'].sum()
+
+    return {
+        'APR': totals(masks['APR'], ['company', 'item number']),
+        'BPT': totals(masks['BPT'], ['company', 'item number']),
+        'APR_HH': totals(masks['APR_HH'], 'company'),
+        'BPT_HH': totals(masks['BPT_HH'], 'company'),
+    }
+
+
+def household_cost(numerator_totals, denominator_totals):
+    # cost per household for each line item total, companies without a denominator dropped
+    merged_data = pd.merge(
+        numerator_totals.rename('value_numerator').reset_index(),
+        denominator_totals.rename('value_denominator').reset_index(),
+        on="company"
+    )
+    merged_data['result'] = (merged_data['value_numerator'] / merged_data['value_denominator']) * 1000000
+    return merged_data[['company', 'item number', 'result']]
+
+
+def cost_per_household_tables(totals):
+    cost_per_household_APR = household_cost(totals['APR'], totals['APR_HH'])
+    cost_per_household_BPT = household_cost(totals['BPT'], totals['BPT_HH'])
+
+    # APR and BPT rows pair up by position (company, then line item)
+    cost_per_household = cost_per_household_APR.rename(
+        columns={'item number': 'item number APR', 'result': 'result_APR'})
+    cost_per_household['item number BPT'] = cost_per_household_BPT['item number']
+    cost_per_household['result_BPT'] = cost_per_household_BPT['result']
+    cost_per_household['div'] = ((cost_per_household['result_BPT'] / cost_per_household['result_APR'])*100)
+
+    return cost_per_household
+
+
+def accepted_cost_table(input_data, cost_per_household, masks):
+    # BPT rows with the household cost ratios needed to apply any line limit
+    accepted_costs = input_data[masks['BPT']]
+    accepted_costs = accepted_costs.merge(
+        cost_per_household[['company', 'item number BPT', 'result_APR', 'result_BPT', 'div']],
+        left_on=['company', 'item number'],
+        right_on=['company', 'item number BPT'],
+        how='left'
+    )
+    return accepted_costs
+
+
+def accepted_cost_values(accepted_costs, limit_lineincrease_seq):
+    # calculated value for every (limit, accepted row), limit on the first axis
+    limits = np.asarray(limit_lineincrease_seq, dtype=float)
+    value = accepted_costs['value'].to_numpy(dtype=float)
+    result_APR = accepted_costs['result_APR'].to_numpy(dtype=float)
+    result_BPT = accepted_costs['result_BPT'].to_numpy(dtype=float)
+    div = accepted_costs['div'].to_numpy(dtype=float)
+
+    capped = div[None, :] > (limits * 100)[:, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        increase_BPT = (result_APR[None, :] * limits[:, None]) / result_BPT[None, :]
+    return np.where(capped & ~np.isnan(increase_BPT), value[None, :] * increase_BPT, value[None, :])
+
+
+def renamed_item_numbers(item_numbers, renames):
+    # renames applied to each distinct item number once, then looked up by code for every row,
+    # one block of rows per rename
+    codes, _ = pd.factorize(item_numbers, use_na_sentinel=False)
+    _, first_rows = np.unique(codes, return_index=True)
+    distinct = item_numbers.iloc[first_rows].reset_index(drop=True)
+    renamed = pd.concat([distinct.str.replace(*rename) for rename in renames], ignore_index=True)
+    return renamed.array.take(np.concatenate([codes + i * len(distinct) for i in range(len(renames))]))
+
+
+def output_block(accepted_costs, renames):
+    # output rows for every grid point (limited then customer), taken from the accepted cost
+    # columns by position rather than sliced, renamed and concatenated
+    rows = np.tile(np.arange(len(accepted_costs)), len(renames))
+    return pd.DataFrame({
+        'company': accepted_costs['company'].array.take(rows),
+        'item number': renamed_item_numbers(accepted_costs['item number BPT'], renames),
+        'year': accepted_costs['year'].array.take(rows),
+        'unit': accepted_costs['unit'].array.take(rows),
+        'dp': accepted_costs['dp'].array.take(rows),
+    })
+
+
+def cost_limit_tables(
+    input_data,
+    masks,
+    rename_limited,
+    rename_customer):
+    # input_data already has APR inflated, nothing here depends on efficiency or line limit
+    totals = household_totals(input_data, masks)
+    cost_per_household = cost_per_household_tables(totals)
+    accepted_costs = accepted_cost_table(input_data, cost_per_household, masks)
+
+    block = output_block(accepted_costs, [rename_limited, rename_customer])
+
+    return {'totals': totals, 'accepted_costs': accepted_costs, 'block': block}
+
+
+class CostLimitResultBuilder:
+    # preallocated columns for n_points grid points, each one copy of the output block,
+    # filled in order and turned into the long frame in a single allocation per column
+
+    def __init__(self, block, n_points):
+        self.block = block
+        self.n_points = n_points
+        self.filled = 0
+        n_values = n_points * len(block)
+        self.value = np.empty(n_values)
+        self.efficiency = np.empty(n_values)
+        self.limit_lineincrease = np.empty(n_values)
+
+    def add(self, values, efficiencies, limit_lineincreases):
+        # values is (points, block rows), efficiencies and limit_lineincreases one per point
+        n_block = len(self.block)
+        values = np.asarray(values).reshape(-1, n_block)
+        if self.filled + len(values) > self.n_points:
+            raise ValueError(f"Result builder sized for {self.n_points} grid points")
+        start, stop = self.filled * n_block, (self.filled + len(values)) * n_block
+        self.value[start:stop] = values.reshape(-1)
+        self.efficiency[start:stop] = np.repeat(efficiencies, n_block)
+        self.limit_lineincrease[start:stop] = np.repeat(limit_lineincreases, n_block)
+        self.filled += len(values)
+
+    def frame(self):
+        n_values = self.filled * len(self.block)
+        results = self.block.take(np.tile(np.arange(len(self.block)), self.filled)).reset_index(drop=True)
+        results['value'] = self.value[:n_values]
+        results['efficiency'] = self.efficiency[:n_values]
+        results['limit_lineincrease'] = self.limit_lineincrease[:n_values]
+        return results
+
+
+def iter_cost_limit_values(tables, efficiency_seq, limit_lineincrease_seq):
+    # (efficiency, limit_lineincrease - 1, limited then customer values) per grid point in output order
+    efficiencies = np.asarray(efficiency_seq, dtype=float)
+    limits = np.asarray(limit_lineincrease_seq, dtype=float)
+    calculated_value = accepted_cost_values(tables['accepted_costs'], limits)
+    for efficiency in efficiencies:
+        for limit, calculated in zip(limits - 1, calculated_value):
+            yield efficiency, limit, np.concatenate([calculated, calculated * efficiency])
+
+
+def iter_cost_limit_blocks(tables, efficiency_seq, limit_lineincrease_seq):
+    # one output block per grid point, for consumers that stream rather than hold the grid
+    # each frame is built straight from the block's column arrays rather than copying the block
+    # and setting the value columns on it
+    block = {column: values.array for column, values in tables['block'].items()}
+    n_rows = len(tables['block'])
+    for efficiency, limit_lineincrease, values in iter_cost_limit_values(tables, efficiency_seq, limit_lineincrease_seq):
+        yield efficiency, limit_lineincrease, pd.DataFrame({
+            **block,
+            'value': values,
+            'efficiency': np.full(n_rows, efficiency),
+            'limit_lineincrease': np.full(n_rows, limit_lineincrease),
+        })
+
+
+def cost_limit_values(tables, efficiency_seq, limit_lineincrease_seq):
+    accepted_costs, block = tables['accepted_costs'], tables['block']
+    efficiencies = np.asarray(efficiency_seq, dtype=float)
+    limits = np.asarray(limit_lineincrease_seq, dtype=float)
+    calculated_value = accepted_cost_values(accepted_costs, limits)
+
+    # every limit for one efficiency per add: (limit, limited then customer rows)
+    builder = CostLimitResultBuilder(block, len(efficiencies) * len(limits))
+    for efficiency in efficiencies:
+        builder.add(
+            np.concatenate([calculated_value, calculated_value * efficiency], axis=1),
+            np.full(len(limits), efficiency),
+            limits - 1
+        )
+    return builder.frame()
+
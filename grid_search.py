@@ -0,0 +1,157 @@
+################################################################################
+#                   Author: Joshua Thompson
+#   O__  ----       Email:  joshua.thompson@ofwat.gov.uk
+#  c/ /'_ ---
+# (*) \(*) --
+# ======================== Script  Information =================================
+# PURPOSE: find the model1 x model2 x return scenarios that meet charge targets
+#
+# PROJECT INFORMATION:
+#   Name: grid search
+#
+# HISTORY:----
+#   Date		        Remarks
+#	-----------	   ---------------------------------------------------------------
+#	 18/10/2026    Created script                                   JThompson (JT)
+#	 18/10/2026    max_increase without a baseline is an error      JThompson (JT)
+#===============================  Environment Setup  ===========================
+#==========================================================================================
+
+import pandas as pd
+import numpy as np
+
+
+from model3_batch import pivot_model_result, dense_sums
+from model3_function import smoothing_factor_matrix
+
+
+def company_bounds(bound, companies, default):
+    # scalar, {company: bound} or None as one bound per company
+    if bound is None:
+        return np.full(len(companies), default)
+    if isinstance(bound, dict):
+        return np.array([bound.get(company, default) for company in companies], dtype=float)
+    return np.full(len(companies), float(bound))
+
+
+def amp_charge_terms(sums, mask):
+    # average charge over the pivot years is C + company_return * A: (combination, company)
+    counts = mask.sum(axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        A = np.where(mask, np.nan_to_num(sums[0]) + np.nan_to_num(sums[1]), 0).sum(axis=-1) / counts
+        C = np.where(mask, np.nan_to_num(sums[2]) + np.nan_to_num(sums[3]), 0).sum(axis=-1) / counts
+    return A, C
+
+
+def return_interval(A, C, factor, lower, upper):
+    # company_return range meeting lower <= factor * (C + r * A) <= upper, intersected over companies
+    with np.errstate(invalid='ignore', divide='ignore'):
+        low = np.where(A > 0, (lower / factor - C) / A, np.where(A < 0, (upper / factor - C) / A, -np.inf))
+        high = np.where(A > 0, (upper / factor - C) / A, np.where(A < 0, (lower / factor - C) / A, np.inf))
+    # with no return term the charge either always or never meets the bounds
+    flat = A == 0
+    flat_ok = (factor * C >= lower) & (factor * C <= upper)
+    low = np.where(flat & ~flat_ok, np.inf, low)
+    return np.nanmax(low, axis=-1), np.nanmin(high, axis=-1)
+
+
+def constrained_search(
+    model1_result,
+    model2_result,
+    company_return_range,
+    smoothing_dic=None,
+    min_charge=None,
+    max_charge=None,
+    baseline=None,
+    max_increase=None,
+    chunk_size=64):
+    # scenarios where every company's average AMP charge (times each smoothing factor when a
+    # smoothing_dic is given) lies within [min_charge, max_charge], max_increase caps the charge
+    # at baseline * (1 + max_increase); returns (feasible scenarios, search counters)
+    if max_increase is not None and baseline is None:
+        raise ValueError("max_increase needs a baseline charge to cap the increase from")
+    pivot1 = pivot_model_result(model1_result)
+    pivot2 = pivot_model_result(model2_result)
+    keys = pd.concat([pivot1['sums'].index.to_frame(index=False), pivot2['sums'].index.to_frame(index=False)])
+    companies = pd.Index(keys['company'].unique()).sort_values()
+    years = pd.Index(keys['year'].unique()).sort_values()
+    sums1 = dense_sums(pivot1, companies, years)
+    sums2 = dense_sums(pivot2, companies, years)
+
+    # pivot years where model3 has all four sums (charges are NaN elsewhere)
+    mask = (~np.isnan(sums1[:, 0]) | ~np.isnan(sums2[:, 0])).all(axis=0)
+    A1, C1 = amp_charge_terms(sums1, mask)
+    A2, C2 = amp_charge_terms(sums2, mask)
+
+    lower = company_bounds(min_charge, companies, -np.inf)
+    upper = company_bounds(max_charge, companies, np.inf)
+    if max_increase is not None:
+        upper = np.minimum(upper, company_bounds(baseline, companies, np.inf) * (1 + max_increase))
+
+    # smoothing scenarios bind at their largest (upper) and smallest (lower) factor
+    if smoothing_dic is None:
+        scenarios, factor_high, factor_low = [None], np.ones(1), np.ones(1)
+    else:
+        scenarios, _, factor_matrix = smoothing_factor_matrix(smoothing_dic)
+        factor_high, factor_low = np.nanmax(factor_matrix, axis=1), np.nanmin(factor_matrix, axis=1)
+
+    returns = np.sort(np.asarray(company_return_range, dtype=float))
+    r_min, r_max = returns[0], returns[-1]
+
+    # charges rise with every parameter, so a combination that fails with the other model's cheapest
+    # combination at the lowest return (or passes nothing at its dearest and highest return) is pruned
+    def prune(A, C, A_other, C_other):
+        cheapest = C + C_other.min(axis=0) + r_min * (A + A_other.min(axis=0))
+        dearest = C + C_other.max(axis=0) + r_max * (A + A_other.max(axis=0))
+        too_high = (cheapest * factor_low.min() > upper).any(axis=-1)
+        too_low = (dearest * factor_high.max() < lower).any(axis=-1)
+        return np.flatnonzero(~(too_high | too_low))
+
+    keep1 = prune(A1, C1, A2, C2)
+    keep2 = prune(A2, C2, A1, C1)
+
+    rows = []
+    for start in range(0, len(keep1), chunk_size):
+        index1 = keep1[start:start + chunk_size]
+        A = A1[index1][:, None, :] + A2[keep2][None, :, :]
+        C = C1[index1][:, None, :] + C2[keep2][None, :, :]
+        for scenario, high, low in zip(scenarios, factor_high, factor_low):
+            r_low_upper, r_high_upper = return_interval(A, C, high, -np.inf, upper)
+            r_low_lower, r_high_lower = return_interval(A, C, low, lower, np.inf)
+            r_low = np.maximum(r_low_upper, r_low_lower)
+            r_high = np.minimum(r_high_upper, r_high_lower)
+
+            # bisect the sorted return grid for each pair's interval
+            first = np.searchsorted(returns, r_low, side='left')
+            last = np.searchsorted(returns, r_high, side='right')
+            pair1, pair2 = np.nonzero(last > first)
+            counts = (last - first)[pair1, pair2]
+            offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            rows.append(pd.DataFrame({
+                'model1_combination': np.repeat(index1[pair1], counts),
+                'model2_combination': np.repeat(keep2[pair2], counts),
+                'company_return': returns[np.repeat(first[pair1, pair2], counts) + offsets],
+                'smoothing_scenario': scenario,
+            }))
+
+    combinations1, combinations2 = pivot1['combinations'], pivot2['combinations']
+    feasible = pd.concat(rows, ignore_index=True) if rows else pd.DataFrame(
+        columns=['model1_combination', 'model2_combination', 'company_return', 'smoothing_scenario'])
+    m1 = feasible['model1_combination'].to_numpy(dtype=int)
+    m2 = feasible['model2_combination'].to_numpy(dtype=int)
+    feasible.insert(0, 'model1_efficiency', combinations1['efficiency'].to_numpy()[m1])
+    feasible.insert(1, 'model1_limit_lineincrease', combinations1['limit_lineincrease'].to_numpy()[m1])
+    feasible.insert(2, 'model2_efficiency', combinations2['efficiency'].to_numpy()[m2])
+    feasible.insert(3, 'model2_limit_lineincrease', combinations2['limit_lineincrease'].to_numpy()[m2])
+    feasible = feasible.drop(columns=['model1_combination', 'model2_combination'])
+
+    stats = {
+        'model1_combinations': len(combinations1),
+        'model1_pruned': len(combinations1) - len(keep1),
+        'model2_combinations': len(combinations2),
+        'model2_pruned': len(combinations2) - len(keep2),
+        'pairs_evaluated': len(keep1) * len(keep2),
+        'scenarios_in_grid': len(combinations1) * len(combinations2) * len(returns) * len(scenarios),
+        'scenarios_feasible': len(feasible),
+    }
+    return feasible, stats
@@ -0,0 +1,175 @@
+################################################################################
+#                   Author: Joshua Thompson
+#   O__  ----       Email:  joshua.thompson@ofwat.gov.uk
+#  c/ /'_ ---
+# (*) \(*) --
+# ======================== Script  Information =================================
+# PURPOSE: recompute only the companies whose inputs or parameters changed
+#
+# PROJECT INFORMATION:
+#   Name: incremental cache
+#
+# HISTORY:----
+#   Date		        Remarks
+#	-----------	   ---------------------------------------------------------------
+#	 18/10/2026    Created script                                   JThompson (JT)
+#	 18/10/2026    Whole input recomputed when companies are ragged JThompson (JT)
+#	 18/10/2026    Streamed model 3 for changed companies' chunks   JThompson (JT)
+#===============================  Environment Setup  ===========================
+#==========================================================================================
+
+import pandas as pd
+import numpy as np
+import hashlib
+import json
+import os
+
+
+from cost_limit_model import cost_limit_model
+from fiscal_years import inflation_factor
+from parallel_sweep import iter_parallel_model3_batches
+
+
+# per company results live here, one parquet file per (stage, key)
+INCREMENTAL_CACHE_DIR = os.environ.get(
+    "INCREMENTAL_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "incremental_cache"))
+
+
+def params_hash(*params):
+    # stable digest of parameters (grids, specs, smoothing) via their json form
+    text = json.dumps(params, sort_keys=True, default=lambda x: np.asarray(x).tolist())
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def company_hashes(data):
+    # digest of each company's rows, unchanged companies keep their digest between submissions
+    hashes = {}
+    for company, rows in data.groupby('company', sort=False, observed=True):
+        row_hashes = pd.util.hash_pandas_object(rows.astype({'company': str}), index=False).to_numpy()
+        hashes[company] = hashlib.sha256(row_hashes.tobytes()).hexdigest()
+    return hashes
+
+
+def cached_frame(cache_dir, stage, key, compute):
+    # (frame, True) from the cache or (computed frame, False) after storing it
+    path = os.path.join(cache_dir, stage, f"{key}.parquet")
+    if os.path.exists(path):
+        return pd.read_parquet(path), True
+    frame = compute()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    frame.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    return frame, False
+
+
+def complete_companies(data, cost_line):
+    # True when every company has the same cost line (item number, year) rows. The model pairs APR
+    # and BPT line items by position over all companies, so only then does no pair cross companies
+    items = cost_line['item_numbers_APR'] + cost_line['item_numbers_BPT'] + [
+        cost_line['denominator_APR'], cost_line['denominator_BPT']]
+    is_item = data['item number'].isin(items).to_numpy()
+    row_sets = {company: frozenset() for company in data['company'].dropna().unique()}
+    for company, rows in data[is_item].groupby('company', sort=False, observed=True):
+        row_sets[company] = frozenset(zip(rows['item number'].astype(str), rows['year'].astype(str)))
+    return len(set(row_sets.values())) <= 1
+
+
+def incremental_cost_limit_model(
+    data,
+    cost_line,
+    efficiency_seq,
+    limit_lineincrease_seq,
+    inflation_year,
+    deflation,
+    year_exclude,
+    cache_dir=INCREMENTAL_CACHE_DIR):
+    # cost_limit_model output with each company computed on its own and cached,
+    # returns (results, {company: key}, [recomputed companies])
+    inflation_value = inflation_factor(deflation, inflation_year)
+    grid_key = params_hash(cost_line, efficiency_seq, limit_lineincrease_seq, inflation_value, year_exclude)
+    n_points = len(efficiency_seq) * len(limit_lineincrease_seq)
+    hashes = company_hashes(data)
+
+    if not complete_companies(data, cost_line):
+        # ragged companies: a company's rows can depend on every other company, so the whole input
+        # is one cache entry and every company's key changes with any of them
+        data_key = params_hash(hashes, grid_key)
+        results, hit = cached_frame(cache_dir, 'cost_limit', data_key, lambda: cost_limit_model(
+            data, cost_line, efficiency_seq, limit_lineincrease_seq, inflation_year, deflation, year_exclude))
+        return results, {company: data_key for company in hashes}, [] if hit else list(hashes)
+
+    keys, frames, recomputed = {}, [], []
+    for company, company_hash in hashes.items():
+        keys[company] = params_hash(company_hash, grid_key)
+        frame, hit = cached_frame(cache_dir, 'cost_limit', keys[company], lambda: cost_limit_model(
+            data[data['company'] == company], cost_line, efficiency_seq, limit_lineincrease_seq,
+            inflation_year, deflation, year_exclude))
+        if not hit:
+            recomputed.append(company)
+        frames.append(frame)
+
+    # companies come back company-major, restore (grid point, limited/customer block) order
+    order_keys = []
+    for frame in frames:
+        n_rows = len(frame) // (2 * n_points) if n_points else 0
+        position = np.arange(len(frame))
+        order_keys.append(position // n_rows if n_rows else position)
+    results = pd.concat(frames, ignore_index=True)
+    order = np.argsort(np.concatenate(order_keys) if order_keys else [], kind='stable')
+    return results.take(order).reset_index(drop=True), keys, recomputed
+
+
+def model3_keys(keys1, keys2, smoothing_dic, company_return_range, compact, chunk_size):
+    # a model 3 key per company, changed only by that company's model1 or model2 key or the sweep settings
+    sweep_key = params_hash(smoothing_dic, company_return_range, compact, chunk_size)
+    return {
+        company: params_hash(keys1.get(company), keys2.get(company), sweep_key)
+        for company in sorted(set(keys1) | set(keys2))
+    }
+
+
+def model3_todo(keys, done, n_model1, chunk_size):
+    # {company: model1 chunk starts to compute}, done holds the (company, key, start) chunks already written
+    starts = range(0, n_model1, chunk_size)
+    return {
+        company: [start for start in starts if (company, key, start) not in done]
+        for company, key in keys.items()
+    }
+
+
+def iter_incremental_model3(
+    model1_result,
+    model2_result,
+    keys,
+    todo,
+    smoothing_dic,
+    company_return_range,
+    chunk_size=1,
+    compact=False,
+    executor='serial',
+    max_workers=None):
+    # model 3 for only the companies and chunks in todo, one sweep over those companies' rows,
+    # yields (start, [(company, key, rows), ...]) per chunk so nothing is held beyond a chunk
+    companies = [company for company, starts in todo.items() if starts]
+    if not companies:
+        return
+    needed = set().union(*(todo[company] for company in companies))
+    n_model1 = len(model1_result[['efficiency', 'limit_lineincrease']].drop_duplicates())
+    batches = iter_parallel_model3_batches(
+        model1_result=model1_result[model1_result['company'].isin(companies)],
+        model2_result=model2_result[model2_result['company'].isin(companies)],
+        smoothing_dic=smoothing_dic,
+        company_return_range=company_return_range,
+        chunk_size=chunk_size,
+        skip=set(range(0, n_model1, chunk_size)) - needed,
+        compact=compact,
+        executor=executor,
+        max_workers=max_workers
+    )
+    for start, final_data in batches:
+        yield start, [
+            (company, keys[company], rows.reset_index(drop=True))
+            for company, rows in final_data.groupby('company', sort=False, observed=True)
+            if start in todo[company]
+        ]
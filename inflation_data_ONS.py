@@ -13,6 +13,11 @@
 #   Date		        Remarks
 #	-----------	   ---------------------------------------------------------------
 #	 29/11/2024    Created script                                   JThompson (JT)
+#	 18/10/2026    On-disk cache, offline mode and CSV fixture      JThompson (JT)
+#	 18/10/2026    Lazy memoised get_deflation, no import work      JThompson (JT)
+#	 18/10/2026    Other ONS series, retries and batch fetch        JThompson (JT)
+#	 18/10/2026    Deflation rebased on integer fiscal year codes   JThompson (JT)
+#	 18/10/2026    ONS_CACHE_DIR read when the cache is used        JThompson (JT)
 #===============================  Environment Setup  ===========================
 #==========================================================================================
 
@@ -22,26 +27,49 @@ import pandas as pd
 import requests
 from io import StringIO
 import numpy as np
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from fiscal_years import fiscal_year_code, fiscal_year_labels, rebase_index, deflation_table
 
-# url to ons data 
-url = "https://www.ons.gov.uk/generator?format=csv&uri=/economy/inflationandpriceindices/timeseries/l522/mm23"
+# ons csv generator, ONS_BASE_URL points it at a local stand-in (see ons_stand_in.py)
+ONS_BASE_URL = os.environ.get("ONS_BASE_URL", "https://www.ons.gov.uk")
+SERIES_PATH = "/generator?format=csv&uri=/economy/inflationandpriceindices/timeseries/{name}/mm23"
+
+# monthly price index series and the column each is parsed into
+ONS_SERIES = {
+    'l522': "CPIH INDEX",
+    'd7bt': "CPI INDEX",
+    'chaw': "RPI INDEX",
+}
+
+# per request timeout (seconds) and retries of transient failures, backoff doubles each retry
+TIMEOUT = 30
+RETRIES = 3
+BACKOFF = 1.0
 
 # user-agent as csv can't be directly read
 headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36"}
 
-# get request for the data 
-response = requests.get(url, headers=headers)
+# parsed series are cached on disk (ONS_CACHE_DIR, else CACHE_DIR) and refetched once older than the ttl (seconds)
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ons_cache")
+CACHE_TTL = 24 * 60 * 60
+
+# month to numeric values
+month_to_numeric = {month: i for i, month in enumerate(['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 
+                                                        'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'], 1)}
 
-# check request code
-if response.status_code == 200:
+
+def parse_ons_csv(csv_text, value_column="CPIH INDEX"):
     # data to pandas 
-    csv_data = StringIO(response.text)
-    ONS_Data = pd.read_csv(csv_data, skiprows=7)  # Skip the first 7 rows
+    ONS_Data = pd.read_csv(StringIO(csv_text), skiprows=7)  # Skip the first 7 rows
 
     # rename collumns
     ONS_Data = ONS_Data.rename(columns={
         "Important notes": "Period",
-        "Unnamed: 1": "CPIH INDEX"
+        "Unnamed: 1": value_column
     })
 
     # subset on period where format is 'YYYY MMM'
@@ -51,41 +79,195 @@ if response.status_code == 200:
     ONS_Data_filtered_split = ONS_Data_filtered.copy()
     ONS_Data_filtered_split[['Year', 'Month']] = ONS_Data_filtered_split['Period'].str.split(' ', expand=True)
     ONS_Data_filtered_split['Month'] = ONS_Data_filtered_split['Month'].str.title()
-
-    # month to numeric values
-    month_to_numeric = {month: i for i, month in enumerate(['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 
-                                                            'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'], 1)}
     ONS_Data_filtered_split['Month_numeric'] = ONS_Data_filtered_split['Month'].map(month_to_numeric)
 
     # change data type
     ONS_Data_filtered_split['Year'] = ONS_Data_filtered_split['Year'].astype(int)
-    ONS_Data_filtered_split['CPIH INDEX'] = pd.to_numeric(ONS_Data_filtered_split['CPIH INDEX'], errors='coerce')
+    ONS_Data_filtered_split[value_column] = pd.to_numeric(ONS_Data_filtered_split[value_column], errors='coerce')
+
+    return ONS_Data_filtered_split[['Year', 'Month_numeric', value_column]].reset_index(drop=True)
+
+
+def cache_location(cache_dir):
+    # an explicit cache_dir, else ONS_CACHE_DIR as set when the cache is used
+    if cache_dir is None:
+        cache_dir = os.environ.get("ONS_CACHE_DIR", CACHE_DIR)
+    return cache_dir
+
+
+def read_cache(cache_dir, name):
+    cache_dir = cache_location(cache_dir)
+    series_path = os.path.join(cache_dir, f"{name}.csv")
+    meta_path = os.path.join(cache_dir, f"{name}.json")
+    if not (os.path.exists(series_path) and os.path.exists(meta_path)):
+        return None, None
+    with open(meta_path) as f:
+        meta = json.load(f)
+    return pd.read_csv(series_path), meta
+
+
+def write_cache(cache_dir, name, series, meta):
+    cache_dir = cache_location(cache_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+    series.to_csv(os.path.join(cache_dir, f"{name}.csv"), index=False)
+    with open(os.path.join(cache_dir, f"{name}.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+
+
+def fetch(series_url, request_headers, timeout=TIMEOUT, retries=RETRIES, backoff=BACKOFF):
+    # connection errors, timeouts and 5xx responses are retried, the last failure is returned or raised
+    for attempt in range(retries + 1):
+        try:
+            response = requests.get(series_url, headers=request_headers, timeout=timeout)
+            if response.status_code < 500 or attempt == retries:
+                return response
+        except requests.RequestException:
+            if attempt == retries:
+                raise
+        time.sleep(backoff * 2 ** attempt)
+
+
+def load_ons_series(
+    name="l522",
+    cache_dir=None,
+    ttl=CACHE_TTL,
+    offline=False,
+    refresh=False,
+    fixture=None,
+    series_url=None,
+    timeout=TIMEOUT,
+    retries=RETRIES,
+    backoff=BACKOFF,
+    base_url=None):
+    # monthly series from a local ONS csv fixture, the disk cache or the ONS generator
+    value_column = ONS_SERIES.get(name, f"{name.upper()} INDEX")
+    if fixture is not None:
+        with open(fixture, encoding="utf-8-sig") as f:
+            return parse_ons_csv(f.read(), value_column)
+
+    cache_dir = cache_location(cache_dir)
+    cached, meta = read_cache(cache_dir, name)
+    if offline:
+        if cached is None:
+            raise RuntimeError(f"Offline and no cached ONS series {name} in {cache_dir}")
+        return cached
+    if cached is not None and not refresh and time.time() - meta["fetched_at"] < ttl:
+        return cached
+
+    # conditional get so an unchanged series is not downloaded again
+    if series_url is None:
+        series_url = (base_url or ONS_BASE_URL) + SERIES_PATH.format(name=name)
+    request_headers = dict(headers)
+    if cached is not None and meta.get("etag"):
+        request_headers["If-None-Match"] = meta["etag"]
+    if cached is not None and meta.get("last_modified"):
+        request_headers["If-Modified-Since"] = meta["last_modified"]
+
+    try:
+        response = fetch(series_url, request_headers, timeout, retries, backoff)
+    except requests.RequestException as error:
+        if cached is None:
+            raise
+        print(f"Failed to fetch {name} ({error}), using cached series from {cache_dir}")
+        return cached
 
-    # get fiscal year and calculate the average CPIH INDEX
+    if response.status_code == 304 and cached is not None:
+        meta["fetched_at"] = time.time()
+        write_cache(cache_dir, name, cached, meta)
+        return cached
+
+    if response.status_code != 200:
+        if cached is None:
+            raise RuntimeError(f"Failed to fetch {name}. HTTP Status Code: {response.status_code}")
+        print(f"Failed to fetch {name}. HTTP Status Code: {response.status_code}, using cached series")
+        return cached
+
+    series = parse_ons_csv(response.text, value_column)
+    write_cache(cache_dir, name, series, {
+        "url": series_url,
+        "fetched_at": time.time(),
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+    })
+    return series
+
+
+def load_cpih_series(
+    cache_dir=None,
+    ttl=CACHE_TTL,
+    offline=False,
+    refresh=False,
+    fixture=None,
+    name="l522",
+    series_url=None,
+    timeout=TIMEOUT,
+    retries=RETRIES):
+    return load_ons_series(name, cache_dir, ttl, offline, refresh, fixture, series_url, timeout, retries)
+
+
+def load_ons_series_batch(names=tuple(ONS_SERIES), fixtures=None, max_workers=None, **options):
+    # {name: series} fetched concurrently, fixtures maps a series name to a local csv
+    fixtures = fixtures or {}
+    with ThreadPoolExecutor(max_workers=max_workers or len(names) or 1) as pool:
+        futures = {name: pool.submit(load_ons_series, name, fixture=fixtures.get(name), **options) for name in names}
+        return {name: future.result() for name, future in futures.items()}
+
+
+def fiscal_year_deflation(ONS_Data_filtered_split, base_year="2017-18", fiscal_year_start=2016, fiscal_year_end=2025):
+    # get fiscal year and calculate the average CPIH INDEX (fiscal years by end year, end exclusive)
     deflation = (
         ONS_Data_filtered_split
         .assign(Fiscal_Year=lambda df: np.where(df['Month_numeric'] >= 4, df['Year'] + 1, df['Year']))
-        .query("Fiscal_Year >= 2016 and Fiscal_Year < 2025")
+        .query("Fiscal_Year >= @fiscal_year_start and Fiscal_Year < @fiscal_year_end")
         .groupby('Fiscal_Year', as_index=False)
         .agg(FiscalYear_CPIH_INDEX=('CPIH INDEX', 'mean'))
     )
 
-    # fiscal yaer format change to match fountain
-    deflation['Fiscal_Year'] = deflation['Fiscal_Year'].apply(lambda x: f"{x-1}-{x % 100:02d}")
+    # deflation relative to the base fiscal yr, years still integer coded (end year)
+    fiscal_years = deflation['Fiscal_Year'].to_numpy()
+    base_code = fiscal_year_code(base_year)
+    base_position = np.flatnonzero(fiscal_years == base_code)[0]
+    deflation['deflation'], deflation['inflation'] = rebase_index(
+        deflation['FiscalYear_CPIH_INDEX'].to_numpy(), base_position)
+
+    # subset to >= base fiscal yr, fiscal yaer format change to match fountain
+    deflation = deflation[fiscal_years >= base_code].copy()
+    deflation['Fiscal_Year'] = fiscal_year_labels(deflation['Fiscal_Year'])
+    return deflation
+
+
+def env_options(offline, fixture):
+    # ONS_OFFLINE=1 uses only the cache, ONS_FIXTURE=<csv> reads a local download
+    if offline is None:
+        offline = os.environ.get("ONS_OFFLINE") == "1"
+    if fixture is None:
+        fixture = os.environ.get("ONS_FIXTURE")
+    return offline, fixture
+
+
+@lru_cache(maxsize=None)
+def cpih_series(offline, fixture):
+    return load_cpih_series(offline=offline, fixture=fixture)
+
+
+@lru_cache(maxsize=None)
+def cached_deflation(base_year, fiscal_year_start, fiscal_year_end, offline, fixture):
+    return fiscal_year_deflation(cpih_series(offline, fixture), base_year, fiscal_year_start, fiscal_year_end)
+
+
+def get_deflation(base_year="2017-18", fiscal_year_start=2016, fiscal_year_end=2025, offline=None, fixture=None):
+    # nothing is fetched until the first call, later calls with the same arguments reuse the frame
+    offline, fixture = env_options(offline, fixture)
+    return cached_deflation(base_year, fiscal_year_start, fiscal_year_end, offline, fixture)
 
-    # deflation relative to fiscal yr 2017-18
-    base_cpi = deflation.loc[deflation['Fiscal_Year'] == "2017-18", 'FiscalYear_CPIH_INDEX'].values[0]
-    deflation['deflation'] = base_cpi / deflation['FiscalYear_CPIH_INDEX']
-    deflation['inflation'] = deflation['FiscalYear_CPIH_INDEX']/base_cpi
 
-    # subset to >= 2017-18
-    deflation = deflation[deflation['Fiscal_Year'] >= "2017-18"]
-    
-    def get_deflation():
-        return deflation
+def get_deflation_table(base_year="2017-18", fiscal_year_start=2016, fiscal_year_end=2025, offline=None, fixture=None):
+    # get_deflation as arrays positioned by fiscal year, what the models index into
+    return deflation_table(get_deflation(base_year, fiscal_year_start, fiscal_year_end, offline, fixture))
 
-else:
-    print(f"Failed to fetch data. HTTP Status Code: {response.status_code}")
-    def get_deflation():
-        return None
 
+def refresh_deflation():
+    # refetch the series now and drop every memoised deflation table
+    load_cpih_series(refresh=True)
+    cpih_series.cache_clear()
+    cached_deflation.cache_clear()
@@ -0,0 +1,68 @@
+################################################################################
+#                   Author: Joshua Thompson
+#   O__  ----       Email:  joshua.thompson@ofwat.gov.uk
+#  c/ /'_ ---
+# (*) \(*) --
+# ======================== Script  Information =================================
+# PURPOSE: load model input workbooks through a columnar cache
+#
+# PROJECT INFORMATION:
+#   Name: input loader
+#
+# HISTORY:----
+#   Date		        Remarks
+#	-----------	   ---------------------------------------------------------------
+#	 18/10/2026    Created script                                   JThompson (JT)
+#===============================  Environment Setup  ===========================
+#==========================================================================================
+
+import pandas as pd
+import pyarrow.feather as feather
+import hashlib
+import os
+
+
+# converted sheets are cached here, keyed by the hash of the source workbook
+INPUT_CACHE_DIR = os.environ.get(
+    "INPUT_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "input_cache"))
+
+# repeated labels stored once per sheet
+CATEGORICAL_COLUMNS = ['company', 'item number', 'year']
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def input_cache_path(path, sheet_name, header, cache_dir):
+    # the key changes whenever the workbook bytes or the sheet layout change
+    key = hashlib.sha256(f"{file_hash(path)}|{sheet_name}|{header}".encode()).hexdigest()[:16]
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(cache_dir, f"{stem}-{key}.feather")
+
+
+def read_input_sheet(path, sheet_name="input Data", header=1):
+    return pd.read_excel(path, sheet_name=sheet_name, header=header).drop(columns=['Unnamed: 0'])
+
+
+def load_input_data(path, sheet_name="input Data", header=1, cache_dir=INPUT_CACHE_DIR):
+    # read the model input sheet, parsing the workbook only when it has changed
+    cache_path = input_cache_path(path, sheet_name, header, cache_dir)
+    if os.path.exists(cache_path):
+        # uncompressed feather is memory mapped rather than read into memory
+        return feather.read_table(cache_path, memory_map=True).to_pandas()
+
+    data = read_input_sheet(path, sheet_name, header)
+    for column in CATEGORICAL_COLUMNS:
+        data[column] = data[column].astype('category')
+
+    # write then rename so a half written cache is never picked up
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = cache_path + '.tmp'
+    feather.write_feather(data, tmp_path, compression='uncompressed')
+    os.replace(tmp_path, cache_path)
+    return data
@@ -0,0 +1,264 @@
+################################################################################
+#                   Author: Joshua Thompson
+#   O__  ----       Email:  joshua.thompson@ofwat.gov.uk
+#  c/ /'_ ---
+# (*) \(*) --
+# ======================== Script  Information =================================
+# PURPOSE: model 3 evaluated for every model1 x model2 combination at once
+#
+# PROJECT INFORMATION:
+#   Name: model 3 batch
+#
+# HISTORY:----
+#   Date		        Remarks
+#	-----------	   ---------------------------------------------------------------
+#	 18/10/2026    Created script                                   JThompson (JT)
+#===============================  Environment Setup  ===========================
+#==========================================================================================
+
+import pandas as pd
+import numpy as np
+import warnings
+from model3_function import smoothing_factors
+from compact_results import compact_labels, value_column
+
+
+# item prefixes summed by model 3 and the unit of its outputs
+MODEL3_PREFIXES = ('PRABCL', 'PRAECL', 'PRCBLC', 'PRCELC')
+MODEL3_UNIT = "£m 22-23 FYA CPIH"
+
+MODEL3_COLUMNS = [
+    'company', 'item number', 'year', 'unit', 'dp', 'value', 'smooth_factor', 'company_return',
+    'model1_efficiency', 'model1_limit_lineincrease', 'model2_efficiency', 'model2_limit_lineincrease'
+]
+
+
+def item_prefix_codes(item_numbers, prefixes=MODEL3_PREFIXES):
+    # position of the first matching prefix, -1 where none match
+    conditions = [item_numbers.str.startswith(prefix).fillna(False).to_numpy(dtype=bool) for prefix in prefixes]
+    return np.select(conditions, np.arange(len(prefixes)), default=-1)
+
+
+def pivot_model_result(model_result, prefixes=MODEL3_PREFIXES):
+    # per (combination, company, year, prefix) sums, combinations in order of appearance
+    combinations = model_result[['efficiency', 'limit_lineincrease']].drop_duplicates().reset_index(drop=True)
+    combination_codes = model_result.groupby(['efficiency', 'limit_lineincrease'], sort=False).ngroup().to_numpy()
+    prefix = item_prefix_codes(model_result['item number'], prefixes)
+    keep = prefix >= 0
+
+    sums = pd.DataFrame({
+        'combination': combination_codes[keep],
+        'company': model_result['company'].to_numpy()[keep],
+        'year': model_result['year'].to_numpy()[keep],
+        'prefix': prefix[keep],
+        'value': model_result['value'].to_numpy(dtype=float)[keep],
+    }).groupby(['combination', 'company', 'year', 'prefix'], observed=True)['value'].sum()
+
+    return {
+        'combinations': combinations,
+        'sums': sums,
+        'n_prefixes': len(prefixes),
+    }
+
+
+def dense_sums(pivot, companies, years):
+    # (prefix, combination, company, year) array, NaN where model 3 would have no pivot value
+    sums = pivot['sums']
+    dense = np.full((pivot['n_prefixes'], len(pivot['combinations']), len(companies), len(years)), np.nan)
+    dense[
+        sums.index.get_level_values('prefix'),
+        sums.index.get_level_values('combination'),
+        companies.get_indexer(sums.index.get_level_values('company')),
+        years.get_indexer(sums.index.get_level_values('year')),
+    ] = sums.to_numpy()
+    return dense
+
+
+def model3_template(companies, years, smoothing_dic):
+    # one (m1, m2, company_return) block: smoothed charges, company return costs, customer charges
+    smooth_years, factors = smoothing_factors(smoothing_dic)
+    n_companies, n_years = len(companies), len(years)
+    company_values = companies.to_numpy(dtype=object)
+
+    smooth = pd.DataFrame({
+        'company': np.tile(company_values, len(factors)),
+        'year': np.repeat(smooth_years, n_companies),
+        'smooth_factor': np.repeat(factors, n_companies),
+    })
+    smooth['item number'] = smooth['company'] + "PRSMCT1"
+
+    pivot_rows = pd.DataFrame({
+        'company': np.repeat(company_values, n_years),
+        'year': np.tile(years.to_numpy(dtype=object), n_companies),
+        'smooth_factor': np.nan,
+    })
+    company_return_data = pivot_rows.assign(**{'item number': pivot_rows['company'] + "PRCRCO1"})
+    customers_charge = pivot_rows.assign(**{'item number': pivot_rows['company'] + "PRCTCU1"})
+
+    template = pd.concat([smooth, company_return_data, customers_charge], ignore_index=True)
+    template['unit'] = MODEL3_UNIT
+    template['dp'] = 3
+    return template[['company', 'item number', 'year', 'unit', 'dp', 'smooth_factor']]
+
+
+def model3_batch_values(sums1, sums2, company_return_range, factors):
+    # sums are (prefix, combination, company, year); output axes (m1, m2, company_return, ...)
+    returns = np.asarray(company_return_range, dtype=float)
+    a = sums1[:, :, None]
+    b = sums2[:, None, :]
+    combined = np.where(np.isnan(a) & np.isnan(b), np.nan, np.nan_to_num(a) + np.nan_to_num(b))
+    present = ~np.isnan(combined).all(axis=0)
+
+    # company return costs and charges to customers
+    company_return_costs = (combined[0] + combined[1])[:, :, None] * returns[None, None, :, None, None]
+    charge_to_customers = (combined[2] + combined[3])[:, :, None] + company_return_costs
+
+    # average amp charges and smoothing
+    with np.errstate(invalid='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        average_charge = np.nanmean(charge_to_customers, axis=-1)
+    smoothed = average_charge[:, :, :, None, :] * factors[None, None, None, :, None]
+
+    values = np.concatenate([
+        smoothed.reshape(smoothed.shape[:3] + (-1,)),
+        company_return_costs.reshape(company_return_costs.shape[:3] + (-1,)),
+        charge_to_customers.reshape(charge_to_customers.shape[:3] + (-1,)),
+    ], axis=-1)
+
+    # keep the rows model 3 would produce for each pair
+    company_present = present.any(axis=-1)
+    keep = np.concatenate([
+        np.broadcast_to(company_present[:, :, None, :], company_present.shape[:2] + (len(factors), company_present.shape[-1])
+                        ).reshape(company_present.shape[:2] + (-1,)),
+        present.reshape(present.shape[:2] + (-1,)),
+        present.reshape(present.shape[:2] + (-1,)),
+    ], axis=-1)
+    return values, keep
+
+
+def prepare_model3_batch(
+    model1_result,
+    model2_result,
+    smoothing_dic,
+    company_return_range):
+    # everything model3_chunk needs, independent of which model1 combinations are evaluated
+    pivot1 = pivot_model_result(model1_result)
+    pivot2 = pivot_model_result(model2_result)
+
+    keys = pd.concat([pivot1['sums'].index.to_frame(index=False), pivot2['sums'].index.to_frame(index=False)])
+    companies = pd.Index(keys['company'].unique()).sort_values()
+    years = pd.Index(keys['year'].unique()).sort_values()
+    _, factors = smoothing_factors(smoothing_dic)
+
+    return {
+        'sums1': dense_sums(pivot1, companies, years),
+        'sums2': dense_sums(pivot2, companies, years),
+        'returns': np.asarray(company_return_range, dtype=float),
+        'factors': factors,
+        'template': model3_template(companies, years, smoothing_dic),
+        'compact_template': compact_labels(model3_template(companies, years, smoothing_dic), ['smooth_factor']),
+        'combinations1': pivot1['combinations'],
+        'combinations2': pivot2['combinations'],
+    }
+
+
+def model3_chunk_arrays(batch, start, stop):
+    # (scenario, template row) values and keep mask for model1 combinations [start, stop) against
+    # every model2 combination, with the compact scenario id of each row of the arrays
+    values, keep = model3_batch_values(batch['sums1'][:, start:stop], batch['sums2'], batch['returns'], batch['factors'])
+    n_blocks, n_template = (stop - start) * len(batch['combinations2']) * len(batch['returns']), values.shape[-1]
+    keep = np.broadcast_to(keep[:, :, None, :], values.shape)
+    scenarios = start * len(batch['combinations2']) * len(batch['returns']) + np.arange(n_blocks)
+    return values.reshape(n_blocks, n_template), keep.reshape(n_blocks, n_template), scenarios
+
+
+def scenario_parameters(batch, scenarios):
+    # company return and model1/model2 combination behind each compact scenario id
+    returns, combinations1, combinations2 = batch['returns'], batch['combinations1'], batch['combinations2']
+    pair1 = scenarios // (len(combinations2) * len(returns))
+    pair2 = (scenarios // len(returns)) % len(combinations2)
+    return {
+        'company_return': returns[scenarios % len(returns)],
+        'model1_efficiency': combinations1['efficiency'].to_numpy()[pair1],
+        'model1_limit_lineincrease': combinations1['limit_lineincrease'].to_numpy()[pair1],
+        'model2_efficiency': combinations2['efficiency'].to_numpy()[pair2],
+        'model2_limit_lineincrease': combinations2['limit_lineincrease'].to_numpy()[pair2],
+    }
+
+
+def model3_rows(batch, values, keep, scenarios, compact=False, value_dtype=np.float32):
+    # long rows for (scenario, template row) arrays, dropping rows outside each pivot
+    template = batch['template']
+    keep = keep.reshape(-1)
+    rows = np.tile(np.arange(len(template)), len(scenarios))[keep]
+    scenario = np.repeat(scenarios, len(template))[keep]
+
+    if compact:
+        final_data = batch['compact_template'].take(rows).reset_index(drop=True)
+        final_data['value'] = value_column(values.reshape(-1)[keep], template['dp'].to_numpy()[rows], value_dtype)
+        final_data['scenario'] = scenario
+        return final_data
+
+    final_data = template.take(rows).reset_index(drop=True)
+    final_data['value'] = values.reshape(-1)[keep]
+    for column, column_values in scenario_parameters(batch, scenario).items():
+        final_data[column] = column_values
+
+    return final_data[MODEL3_COLUMNS]
+
+
+def model3_chunk(batch, start, stop, compact=False, value_dtype=np.float32):
+    # model 3 results for model1 combinations [start, stop) against every model2 combination,
+    # compact gives categorical labels, narrowed values and a scenario id into model3_scenario_table
+    values, keep, scenarios = model3_chunk_arrays(batch, start, stop)
+    return model3_rows(batch, values, keep, scenarios, compact, value_dtype)
+
+
+def model3_scenario_table(model1_result, model2_result, company_return_range):
+    # (company_return, model1 combination, model2 combination) for every compact scenario id
+    combinations1 = model1_result[['efficiency', 'limit_lineincrease']].drop_duplicates()
+    combinations2 = model2_result[['efficiency', 'limit_lineincrease']].drop_duplicates()
+    returns = np.asarray(company_return_range, dtype=float)
+    n1, n2, n_returns = len(combinations1), len(combinations2), len(returns)
+    pair1 = np.repeat(np.arange(n1), n2 * n_returns)
+    pair2 = np.tile(np.repeat(np.arange(n2), n_returns), n1)
+    scenarios = pd.DataFrame({
+        'company_return': np.tile(returns, n1 * n2),
+        'model1_efficiency': combinations1['efficiency'].to_numpy()[pair1],
+        'model1_limit_lineincrease': combinations1['limit_lineincrease'].to_numpy()[pair1],
+        'model2_efficiency': combinations2['efficiency'].to_numpy()[pair2],
+        'model2_limit_lineincrease': combinations2['limit_lineincrease'].to_numpy()[pair2],
+    })
+    scenarios.index.name = 'scenario'
+    return scenarios
+
+
+def model3_chunks(batch, chunk_size=1, skip=()):
+    # (start, stop) model1 combination ranges still to evaluate
+    n1 = len(batch['combinations1'])
+    return [(start, min(start + chunk_size, n1)) for start in range(0, n1, chunk_size) if start not in skip]
+
+
+def iter_model3_batches(
+    model1_result,
+    model2_result,
+    smoothing_dic,
+    company_return_range,
+    chunk_size=1,
+    skip=(),
+    compact=False):
+    # yield (first model1 combination, results) for chunk_size model1 combinations against every
+    # model2 combination, chunks starting at a position in skip are not evaluated
+    batch = prepare_model3_batch(model1_result, model2_result, smoothing_dic, company_return_range)
+    for start, stop in model3_chunks(batch, chunk_size, skip):
+        yield start, model3_chunk(batch, start, stop, compact)
+
+
+def model3_batch(
+    model1_result,
+    model2_result,
+    smoothing_dic,
+    company_return_range,
+    chunk_size=1):
+    batches = iter_model3_batches(model1_result, model2_result, smoothing_dic, company_return_range, chunk_size)
+    return pd.concat([final_data for _, final_data in batches], ignore_index=True)
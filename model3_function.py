@@ -13,12 +13,33 @@
 #   Date		        Remarks
 #	-----------	   ---------------------------------------------------------------
 #	 05/12/2024    Created script                                   JThompson (JT)
+#	 18/10/2026    Smoothing as one outer product over returns      JThompson (JT)
+#	 18/10/2026    String labels for categorical loader inputs      JThompson (JT)
 #===============================  Environment Setup  ===========================
 #==========================================================================================
 
 import pandas as pd
 import numpy as np
 
+
+def smoothing_factor_matrix(smoothing_dic):
+    # scenario x year factors (years in order of first appearance), NaN where a scenario has no factor
+    scenarios = list(smoothing_dic)
+    years = list(dict.fromkeys(year for factors in smoothing_dic.values() for year in factors))
+    factor_matrix = np.full((len(scenarios), len(years)), np.nan)
+    for i, factors in enumerate(smoothing_dic.values()):
+        for year, factor in factors.items():
+            factor_matrix[i, years.index(year)] = factor
+    return scenarios, years, factor_matrix
+
+
+def smoothing_factors(smoothing_dic):
+    # the factor matrix entries that exist, scenario by scenario, with their years
+    _, years, factor_matrix = smoothing_factor_matrix(smoothing_dic)
+    has_factor = ~np.isnan(factor_matrix)
+    return np.array(years, dtype=object)[np.nonzero(has_factor)[1]], factor_matrix[has_factor]
+
+
 def model3(data, smoothing_dic, company_return_range):
 
     # get prefix
@@ -31,67 +52,50 @@ def model3(data, smoothing_dic, company_return_range):
     filt_df = data[data['prefix'].notna()]
     filt_df_grp = filt_df.groupby(['company', 'year', 'prefix'])['value'].sum().reset_index()
     filt_df_pvt = filt_df_grp.pivot(index=['company', 'year'], columns='prefix', values='value').reset_index()
-    
-    # final data
-    final_data_list = []
-    
-    for company_return in company_return_range:
-        # company return costs and charges to customers
-        filt_df_pvt['company_return_costs'] = (filt_df_pvt['PRABCL'] + filt_df_pvt['PRAECL']) * company_return
-        filt_df_pvt['charge_to_customers'] = (
-            filt_df_pvt['PRCBLC'] + filt_df_pvt['PRCELC'] + filt_df_pvt['company_return_costs']
-        )
-        
-        # average amp charges
-        average_charge_by_company = filt_df_pvt.groupby('company')['charge_to_customers'].mean().reset_index()
-        
-        # apply smoothing factors
-        smoothed_data = []
-        for scenario, factors in smoothing_dic.items():
-            for year, factor in factors.items():
-                for _, row in average_charge_by_company.iterrows():
-                    smoothed_charge = row['charge_to_customers'] * factor
-                    smoothed_data.append({
-                        "company": row['company'],
-                        "year": year,
-                        "value": smoothed_charge,
-                        "scenario_smooth_value": scenario, 
-                        "smooth_factor": factor
-                    })
-        smoothed_df = pd.DataFrame(smoothed_data)
-        smoothed_df["item number"] = smoothed_df["company"] + "PRSMCT1"
-        
-        # format data (smooth)
-        smooth_costs = smoothed_df.drop(columns=['scenario_smooth_value'])
-        smooth_costs['unit'] = "£m 22-23 FYA CPIH"
-        smooth_costs["dp"] = 3
-        smooth_costs['company_return'] = company_return
-        smooth_costs = smooth_costs[['company', 'item number', 'year', 'unit', 'dp', 'value', 'smooth_factor', 'company_return']]
-        
-        # format data (company return)
-        company_return_data = filt_df_pvt.drop(columns=['PRABCL', 'PRAECL', 'PRCBLC', 'PRCELC', 'charge_to_customers'])
-        company_return_data['unit'] = "£m 22-23 FYA CPIH"
-        company_return_data["dp"] = 3
-        company_return_data["item number"] = company_return_data["company"] + "PRCRCO1"
-        company_return_data = company_return_data.rename(columns={'company_return_costs': 'value'})
-        company_return_data['smooth_factor'] = None
-        company_return_data['company_return'] = company_return
-        company_return_data = company_return_data[['company', 'item number', 'year', 'unit', 'dp', 'value', 'smooth_factor', 'company_return']]
-        
-        # format data (customer charge)
-        customers_charge = filt_df_pvt.drop(columns=['PRABCL', 'PRAECL', 'PRCBLC', 'PRCELC', 'company_return_costs'])
-        customers_charge['unit'] = "£m 22-23 FYA CPIH"
-        customers_charge["dp"] = 3
-        customers_charge["item number"] = customers_charge["company"] + "PRCTCU1"
-        customers_charge = customers_charge.rename(columns={'charge_to_customers': 'value'})
-        customers_charge['smooth_factor'] = None
-        customers_charge['company_return'] = company_return
-        customers_charge = customers_charge[['company', 'item number', 'year', 'unit', 'dp', 'value', 'smooth_factor', 'company_return']]
-        
-        # final format
-        final_data = pd.concat([smooth_costs, company_return_data, customers_charge], ignore_index=True)
-        final_data_list.append(final_data)
-    
-    # Concatenate all results for different company_return values
-    combined_data = pd.concat(final_data_list, ignore_index=True)
-    return combined_data
+
+    # company return costs and charges to customers for every company_return: (return, pivot row)
+    company_return_range = np.asarray(company_return_range, dtype=float)
+    company_return_costs = (
+        (filt_df_pvt['PRABCL'] + filt_df_pvt['PRAECL']).to_numpy(dtype=float)[None, :] * company_return_range[:, None]
+    )
+    charge_to_customers = (
+        (filt_df_pvt['PRCBLC'] + filt_df_pvt['PRCELC']).to_numpy(dtype=float)[None, :] + company_return_costs
+    )
+
+    # average amp charges: (company, return)
+    average_charge_by_company = pd.DataFrame(charge_to_customers.T).groupby(filt_df_pvt['company'].to_numpy()).mean()
+    companies = average_charge_by_company.index.to_numpy()
+
+    # apply smoothing factors: (return, scenario x year, company) outer product
+    factor_years, factors = smoothing_factors(smoothing_dic)
+    smoothed_charge = average_charge_by_company.to_numpy().T[:, None, :] * factors[None, :, None]
+
+    # one block per company_return: smooth costs, company return, customer charge
+    smooth_costs = pd.DataFrame({
+        'company': np.tile(companies, len(factors)),
+        'year': np.repeat(factor_years, len(companies)),
+        'smooth_factor': np.repeat(factors, len(companies)).astype(object),
+    })
+    smooth_costs['item number'] = smooth_costs['company'] + "PRSMCT1"
+
+    # categorical labels (cached loader inputs) back to strings so the item numbers can be built
+    pivot_labels = filt_df_pvt[['company', 'year']].astype(str)
+    company_return_data = pivot_labels.assign(smooth_factor=None)
+    company_return_data['item number'] = company_return_data['company'] + "PRCRCO1"
+
+    customers_charge = pivot_labels.assign(smooth_factor=None)
+    customers_charge["item number"] = customers_charge["company"] + "PRCTCU1"
+
+    block = pd.concat([smooth_costs, company_return_data, customers_charge], ignore_index=True)
+    block['unit'] = "£m 22-23 FYA CPIH"
+    block["dp"] = 3
+
+    # final format
+    combined_data = block.take(np.tile(np.arange(len(block)), len(company_return_range))).reset_index(drop=True)
+    combined_data['value'] = np.concatenate([
+        smoothed_charge.reshape(len(company_return_range), -1),
+        company_return_costs,
+        charge_to_customers,
+    ], axis=1).reshape(-1)
+    combined_data['company_return'] = np.repeat(company_return_range, len(block))
+    return combined_data[['company', 'item number', 'year', 'unit', 'dp', 'value', 'smooth_factor', 'company_return']]
@@ -0,0 +1,288 @@
+################################################################################
+#                   Author: Joshua Thompson
+#   O__  ----       Email:  joshua.thompson@ofwat.gov.uk
+#  c/ /'_ ---
+# (*) \(*) --
+# ======================== Script  Information =================================
+# PURPOSE: streaming per company and year summaries of the model 3 scenario space
+#
+# PROJECT INFORMATION:
+#   Name: model 3 summary
+#
+# HISTORY:----
+#   Date		        Remarks
+#	-----------	   ---------------------------------------------------------------
+#	 18/10/2026    Created script                                   JThompson (JT)
+#	 18/10/2026    Task reads its sweep's keyed worker state        JThompson (JT)
+#	 18/10/2026    summarise_model3 timed and reported via a report JThompson (JT)
+#===============================  Environment Setup  ===========================
+#==========================================================================================
+
+import pandas as pd
+import numpy as np
+from contextlib import nullcontext
+
+
+from model3_batch import prepare_model3_batch, model3_chunk_arrays, model3_rows, model3_chunks, scenario_parameters
+from parallel_sweep import worker_state, run_tasks
+
+
+class QuantileSketch:
+    # DDSketch style log buckets per key: any quantile comes back within relative_accuracy of a
+    # true value, memory grows with the log of the value range rather than the number of values
+
+    def __init__(self, n_keys, relative_accuracy=0.01, min_value=1e-9):
+        self.n_keys = n_keys
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = np.log(self.gamma)
+        self.min_value = min_value
+        self.zero = np.zeros(n_keys, dtype=np.int64)
+        # (key, bucket) counts for values above min_value and below -min_value, column j is bucket offset + j
+        self.counts = {'positive': np.zeros((n_keys, 0), dtype=np.int64), 'negative': np.zeros((n_keys, 0), dtype=np.int64)}
+        self.offsets = {'positive': 0, 'negative': 0}
+
+    def bucket(self, magnitudes):
+        return np.ceil(np.log(magnitudes) / self.log_gamma).astype(np.int64)
+
+    def bucket_value(self, buckets):
+        return 2 * self.gamma ** buckets / (self.gamma + 1)
+
+    def grow(self, side, low, high):
+        # widen a store so buckets low..high fit
+        counts, offset = self.counts[side], self.offsets[side]
+        if counts.shape[1]:
+            low, high = min(low, offset), max(high, offset + counts.shape[1] - 1)
+        if counts.shape[1] and (low, high) == (offset, offset + counts.shape[1] - 1):
+            return
+        grown = np.zeros((self.n_keys, high - low + 1), dtype=np.int64)
+        grown[:, offset - low:offset - low + counts.shape[1]] = counts
+        self.counts[side], self.offsets[side] = grown, low
+
+    def add_counts(self, side, keys, buckets):
+        if not len(keys):
+            return
+        self.grow(side, buckets.min(), buckets.max())
+        width = self.counts[side].shape[1]
+        flat = keys * width + (buckets - self.offsets[side])
+        self.counts[side] += np.bincount(flat, minlength=self.n_keys * width).reshape(self.n_keys, width)
+
+    def add(self, keys, values):
+        # one value per key entry, NaN ignored
+        keys, values = np.asarray(keys), np.asarray(values, dtype=float)
+        positive = values > self.min_value
+        negative = values < -self.min_value
+        zero = np.abs(values) <= self.min_value
+        self.add_counts('positive', keys[positive], self.bucket(values[positive]))
+        self.add_counts('negative', keys[negative], self.bucket(-values[negative]))
+        self.zero += np.bincount(keys[zero], minlength=self.n_keys)
+
+    def merge(self, other):
+        self.zero += other.zero
+        for side, counts in other.counts.items():
+            if counts.shape[1]:
+                offset = other.offsets[side]
+                self.grow(side, offset, offset + counts.shape[1] - 1)
+                start = offset - self.offsets[side]
+                self.counts[side][:, start:start + counts.shape[1]] += counts
+
+    def quantile(self, quantiles):
+        # (quantile, key) values, NaN for keys with no values
+        negative, positive = self.counts['negative'], self.counts['positive']
+        counts = np.hstack([negative[:, ::-1], self.zero[:, None], positive])
+        bucket_values = np.concatenate([
+            -self.bucket_value(self.offsets['negative'] + np.arange(negative.shape[1]))[::-1],
+            [0.0],
+            self.bucket_value(self.offsets['positive'] + np.arange(positive.shape[1])),
+        ])
+        cumulative = np.cumsum(counts, axis=1)
+        total = cumulative[:, -1]
+        result = np.full((len(quantiles), self.n_keys), np.nan)
+        for i, q in enumerate(quantiles):
+            rank = np.floor(q * (total - 1))
+            position = np.argmax(cumulative > rank[:, None], axis=1)
+            result[i] = np.where(total > 0, bucket_values[position], np.nan)
+        return result
+
+
+class TopK:
+    # k smallest (or largest) values per key and the scenario each came from, ties to the lower scenario
+
+    def __init__(self, n_keys, k, largest=False):
+        self.k = k
+        self.largest = largest
+        self.values = np.full((k, n_keys), np.nan)
+        self.scenarios = np.full((k, n_keys), -1, dtype=np.int64)
+
+    def add(self, values, scenarios):
+        # values is (scenario, key), scenarios one id per row or an array the shape of values
+        scenarios = np.asarray(scenarios)
+        if scenarios.ndim == 1:
+            scenarios = scenarios[:, None]
+        values = np.concatenate([self.values, values])
+        scenarios = np.concatenate([self.scenarios, np.broadcast_to(scenarios, values[self.k:].shape)])
+
+        order = np.where(np.isnan(values), np.inf, -values if self.largest else values)
+        candidates = np.isfinite(order)
+        if len(order) > self.k:
+            candidates &= order <= np.partition(order, self.k - 1, axis=0)[self.k - 1]
+        row, key = np.nonzero(candidates)
+        ranked = np.lexsort((scenarios[row, key], order[row, key], key))
+        row, key = row[ranked], key[ranked]
+        rank = np.arange(len(key)) - np.searchsorted(key, key)
+        take = rank < self.k
+
+        self.values = np.full(self.values.shape, np.nan)
+        self.scenarios = np.full(self.scenarios.shape, -1, dtype=np.int64)
+        self.values[rank[take], key[take]] = values[row[take], key[take]]
+        self.scenarios[rank[take], key[take]] = scenarios[row[take], key[take]]
+
+    def merge(self, other):
+        self.add(other.values, other.scenarios)
+
+
+class Model3Summary:
+    # mergeable reducers over every scenario for each model 3 template row (company, item, year, smoothing):
+    # count, mean, min, max, a quantile sketch and the k lowest and highest scenarios
+
+    def __init__(self, n_keys, k=10, relative_accuracy=0.01):
+        self.count = np.zeros(n_keys, dtype=np.int64)
+        self.total = np.zeros(n_keys)
+        self.minimum = np.full(n_keys, np.inf)
+        self.maximum = np.full(n_keys, -np.inf)
+        self.sketch = QuantileSketch(n_keys, relative_accuracy)
+        self.lowest = TopK(n_keys, k)
+        self.highest = TopK(n_keys, k, largest=True)
+
+    def update(self, values, keep, scenarios):
+        # (scenario, template row) values and keep mask as from model3_chunk_arrays
+        values = np.where(keep, values, np.nan)
+        finite = np.isfinite(values)
+        self.count += finite.sum(axis=0)
+        self.total += np.where(finite, values, 0).sum(axis=0)
+        self.minimum = np.minimum(self.minimum, np.where(finite, values, np.inf).min(axis=0, initial=np.inf))
+        self.maximum = np.maximum(self.maximum, np.where(finite, values, -np.inf).max(axis=0, initial=-np.inf))
+        self.sketch.add(np.nonzero(finite)[1], values[finite])
+        self.lowest.add(values, scenarios)
+        self.highest.add(values, scenarios)
+
+    def merge(self, other):
+        self.count += other.count
+        self.total += other.total
+        self.minimum = np.minimum(self.minimum, other.minimum)
+        self.maximum = np.maximum(self.maximum, other.maximum)
+        self.sketch.merge(other.sketch)
+        self.lowest.merge(other.lowest)
+        self.highest.merge(other.highest)
+
+    def frame(self, template, quantiles=(0.05, 0.5, 0.95)):
+        # one row per template row that any scenario produced
+        summary = template.copy()
+        summary['count'] = self.count
+        with np.errstate(invalid='ignore'):
+            summary['mean'] = self.total / self.count
+        summary['min'] = self.minimum
+        summary['max'] = self.maximum
+        for q, values in zip(quantiles, self.sketch.quantile(quantiles)):
+            # bucket midpoints can fall just outside the observed range
+            summary[f"p{q * 100:g}"] = np.clip(values, self.minimum, self.maximum)
+        return summary[self.count > 0].reset_index(drop=True)
+
+    def top_frame(self, batch):
+        # the k lowest and highest scenarios per template row with their parameters
+        frames = []
+        for order, top in (('lowest', self.lowest), ('highest', self.highest)):
+            rank, key = np.nonzero(top.scenarios >= 0)
+            top_rows = batch['template'].take(key).reset_index(drop=True)
+            top_rows['order'] = order
+            top_rows['rank'] = rank + 1
+            top_rows['value'] = top.values[rank, key]
+            top_rows['scenario'] = top.scenarios[rank, key]
+            for column, column_values in scenario_parameters(batch, top_rows['scenario'].to_numpy()).items():
+                top_rows[column] = column_values
+            frames.append(top_rows)
+        return pd.concat(frames, ignore_index=True)
+
+
+def model3_summary_task(state_key, start, stop):
+    # chunk reducers plus the full rows of any selected scenario in the chunk
+    state = worker_state[state_key]
+    batch = state['batch']
+    values, keep, scenarios = model3_chunk_arrays(batch, start, stop)
+    summary = Model3Summary(values.shape[1], state['k'], state['relative_accuracy'])
+    summary.update(values, keep, scenarios)
+
+    selected = np.isin(scenarios, state['detail_scenarios'])
+    detail = None
+    if selected.any():
+        detail = model3_rows(batch, values[selected], keep[selected], scenarios[selected], state['compact'])
+    return start, summary, detail
+
+
+def iter_model3_summaries(
+    batch,
+    chunk_size=1,
+    k=10,
+    relative_accuracy=0.01,
+    detail_scenarios=(),
+    compact=False,
+    executor='serial',
+    max_workers=None):
+    # yield (first model1 combination, chunk summary, detail rows or None) per chunk, in order
+    state = {
+        'batch': batch,
+        'k': k,
+        'relative_accuracy': relative_accuracy,
+        'detail_scenarios': np.asarray(detail_scenarios, dtype=np.int64),
+        'compact': compact,
+    }
+    yield from run_tasks(model3_summary_task, model3_chunks(batch, chunk_size), executor, max_workers, state)
+
+
+def summarise_model3(
+    model1_result,
+    model2_result,
+    smoothing_dic,
+    company_return_range,
+    chunk_size=1,
+    k=10,
+    relative_accuracy=0.01,
+    quantiles=(0.05, 0.5, 0.95),
+    detail_scenarios=(),
+    compact=False,
+    executor='serial',
+    max_workers=None,
+    report=None):
+    # summaries in place of the long model 3 output, memory independent of the grid size
+    # apart from the detail rows of detail_scenarios (compact ids, see model3_scenario_table).
+    # with a RunReport the stages are timed and progress is reported chunk by chunk
+    stage = report.stage if report is not None else lambda name: nullcontext()
+    with stage('model3_prepare'):
+        batch = prepare_model3_batch(model1_result, model2_result, smoothing_dic, company_return_range)
+
+    n1 = len(batch['combinations1'])
+    chunks = iter_model3_summaries(
+        batch, chunk_size, k, relative_accuracy, detail_scenarios, compact, executor, max_workers)
+    progress = None
+    if report is not None:
+        chunks = report.timed_iter(chunks, 'model3')
+        progress = report.progress(len(range(0, n1, chunk_size)), "model3 summary chunks")
+
+    summary = Model3Summary(len(batch['template']), k, relative_accuracy)
+    details = []
+    for start, chunk_summary, detail in chunks:
+        with stage('model3_merge'):
+            summary.merge(chunk_summary)
+        if detail is not None:
+            details.append(detail)
+        if progress is not None:
+            progress.update(scenarios=(min(start + chunk_size, n1) - start) * len(batch['combinations2'])
+                            * len(batch['returns']) * len(smoothing_dic))
+
+    return {
+        'summary': summary.frame(batch['template'], quantiles),
+        'top': summary.top_frame(batch),
+        'detail': pd.concat(details, ignore_index=True) if details
+        else model3_rows(batch, np.empty((0, len(batch['template']))), np.empty((0, len(batch['template'])), dtype=bool),
+                         np.empty(0, dtype=np.int64), compact),
+    }
@@ -0,0 +1,109 @@
+################################################################################
+#                   Author: Joshua Thompson
+#   O__  ----       Email:  joshua.thompson@ofwat.gov.uk
+#  c/ /'_ ---
+# (*) \(*) --
+# ======================== Script  Information =================================
+# PURPOSE: local stand-in for the ONS csv generator, for tests and offline runs
+#
+# PROJECT INFORMATION:
+#   Name: ONS stand-in
+#
+# HISTORY:----
+#   Date		        Remarks
+#	-----------	   ---------------------------------------------------------------
+#	 18/10/2026    Created script                                   JThompson (JT)
+#===============================  Environment Setup  ===========================
+#==========================================================================================
+
+import argparse
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    # each fixture at its ONS generator path with an ETag, optionally slow or failing the first requests
+
+    def do_GET(self):
+        server = self.server
+        uri = parse_qs(urlparse(self.path).query).get('uri', [''])[0]
+        parts = uri.rstrip('/').split('/')
+        name = parts[-2] if len(parts) >= 2 else None
+        server.requests.append((name, self.headers.get('If-None-Match')))
+        if server.delay:
+            time.sleep(server.delay)
+
+        if server.failures.get(name, 0) > 0:
+            server.failures[name] -= 1
+            self.send_response(503)
+            self.end_headers()
+            return
+        if name not in server.fixtures:
+            self.send_response(404)
+            self.end_headers()
+            return
+
+        body = server.fixtures[name]
+        etag = '"%s"' % hashlib.sha256(body).hexdigest()[:16]
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/csv')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(fixtures, port=0, failures=None, delay=0.0):
+    # fixtures maps a series name (l522, d7bt, ...) to a csv downloaded from the ONS generator
+    server = ThreadingHTTPServer(('127.0.0.1', port), StandInHandler)
+    server.fixtures = {}
+    for name, path in fixtures.items():
+        with open(path, 'rb') as f:
+            server.fixtures[name] = f.read()
+    server.failures = dict(failures or {})
+    server.delay = delay
+    server.requests = []
+    return server
+
+
+@contextmanager
+def ons_stand_in(fixtures, port=0, failures=None, delay=0.0):
+    # (base url for ONS_BASE_URL or base_url=, server) while the stand-in runs on a background thread,
+    # failures={name: n} answers the first n requests for a series with a 503, server.requests logs each one
+    server = make_server(fixtures, port, failures, delay)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}", server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve ONS csv fixtures at the generator path")
+    parser.add_argument('--fixture', action='append', default=[], metavar='NAME=CSV', help="e.g. l522=l522.csv")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--delay', type=float, default=0.0, help="seconds before each response")
+    args = parser.parse_args()
+
+    fixtures = dict(fixture.split('=', 1) for fixture in args.fixture)
+    server = make_server(fixtures, args.port, delay=args.delay)
+    print(f"serving {', '.join(fixtures)} at http://127.0.0.1:{args.port} (set ONS_BASE_URL to this)")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
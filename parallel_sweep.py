@@ -0,0 +1,143 @@
+################################################################################
+#                   Author: Joshua Thompson
+#   O__  ----       Email:  joshua.thompson@ofwat.gov.uk
+#  c/ /'_ ---
+# (*) \(*) --
+# ======================== Script  Information =================================
+# PURPOSE: run the model 1-3 sweeps on a pool of workers
+#
+# PROJECT INFORMATION:
+#   Name: parallel sweep
+#
+# HISTORY:----
+#   Date		        Remarks
+#	-----------	   ---------------------------------------------------------------
+#	 18/10/2026    Created script                                   JThompson (JT)
+#	 18/10/2026    Worker state keyed per sweep, pools made here    JThompson (JT)
+#	 18/10/2026    Tables from cost_limit_model.cost_lines_tables   JThompson (JT)
+#===============================  Environment Setup  ===========================
+#==========================================================================================
+
+import pandas as pd
+import itertools
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+
+from cost_limit_model import cost_lines_tables
+from fiscal_years import inflation_factor
+from grid_engine import cost_limit_values
+from model3_batch import prepare_model3_batch, model3_chunk, model3_chunks
+
+
+# read-only inputs for the workers by state key, inherited on fork or set once per worker on spawn.
+# each run_tasks call has its own key, so sweeps running side by side never see each other's state
+worker_state = {}
+state_keys = itertools.count()
+
+
+def init_worker(state_key, state):
+    worker_state[state_key] = state
+
+
+def make_executor(executor, max_workers, state_key, state):
+    # executor is 'serial', 'thread' or 'process', returns the pool (None for serial). the pool is made
+    # here rather than passed in so that its workers are sure to hold the state (a process pool made
+    # earlier never would)
+    if executor == 'serial':
+        init_worker(state_key, state)
+        return None
+    if executor == 'thread':
+        init_worker(state_key, state)
+        return ThreadPoolExecutor(max_workers=max_workers)
+    if executor == 'process':
+        if 'fork' in multiprocessing.get_all_start_methods():
+            # workers fork from this process and share its pages copy-on-write
+            init_worker(state_key, state)
+            return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('fork'))
+        return ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_worker,
+            initargs=(state_key, state)
+        )
+    raise ValueError(f"Unknown executor: {executor}, use 'serial', 'thread' or 'process'")
+
+
+def run_tasks(function, tasks, executor, max_workers, state):
+    # function(state_key, *task) for every task, reading its inputs from worker_state[state_key].
+    # results come back in task order whatever order the workers finish in,
+    # with at most two tasks per worker in flight so finished chunks do not pile up
+    state_key = next(state_keys)
+    pool = make_executor(executor, max_workers, state_key, state)
+    try:
+        if pool is None:
+            yield from (function(state_key, *task) for task in tasks)
+            return
+        window = 2 * (max_workers or os.cpu_count() or 1)
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.submit(function, state_key, *task))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        worker_state.pop(state_key, None)
+
+
+def cost_limit_task(state_key, name, efficiency_seq):
+    state = worker_state[state_key]
+    return cost_limit_values(state['tables'][name], efficiency_seq, state['limits'][name])
+
+
+def parallel_cost_limit_models(
+    data,
+    cost_lines,
+    grids,
+    inflation_year,
+    deflation,
+    year_exclude,
+    executor='process',
+    max_workers=None):
+    # same inputs and outputs as cost_limit_models, efficiency values sharded over the workers
+    tables = cost_lines_tables(data, cost_lines, inflation_factor(deflation, inflation_year), year_exclude)
+
+    # one task per efficiency value keeps every shard in output order
+    tasks = [(name, [efficiency]) for name in cost_lines for efficiency in grids[name][0]]
+    state = {'tables': tables, 'limits': {name: grids[name][1] for name in cost_lines}}
+
+    blocks = {name: [] for name in cost_lines}
+    for (name, _), results in zip(tasks, run_tasks(cost_limit_task, tasks, executor, max_workers, state)):
+        blocks[name].append(results)
+
+    return {
+        name: pd.concat(blocks[name], ignore_index=True) if blocks[name]
+        else cost_limit_values(tables[name], [], grids[name][1])
+        for name in cost_lines
+    }
+
+
+def model3_task(state_key, start, stop):
+    state = worker_state[state_key]
+    return start, model3_chunk(state['batch'], start, stop, state['compact'])
+
+
+def iter_parallel_model3_batches(
+    model1_result,
+    model2_result,
+    smoothing_dic,
+    company_return_range,
+    chunk_size=1,
+    skip=(),
+    compact=False,
+    executor='process',
+    max_workers=None):
+    # same (first model1 combination, results) stream as iter_model3_batches
+    batch = prepare_model3_batch(model1_result, model2_result, smoothing_dic, company_return_range)
+    tasks = model3_chunks(batch, chunk_size, skip)
+    yield from run_tasks(model3_task, tasks, executor, max_workers, {'batch': batch, 'compact': compact})
@@ -0,0 +1,272 @@
+################################################################################
+#                   Author: Joshua Thompson
+#   O__  ----       Email:  joshua.thompson@ofwat.gov.uk
+#  c/ /'_ ---
+# (*) \(*) --
+# ======================== Script  Information =================================
+# PURPOSE: original pandas models 1-3 and driver loop, the reference for the faster engines
+#
+# PROJECT INFORMATION:
+#   Name: reference models
+#
+# HISTORY:----
+#   Date		        Remarks
+#	-----------	   ---------------------------------------------------------------
+#	 18/10/2026    Created script                                   JThompson (JT)
+#===============================  Environment Setup  ===========================
+#==========================================================================================
+
+import pandas as pd
+import numpy as np
+
+
+# reproduced from the original model1_function/model2_function/model3_function and driver loop,
+# row for row and quirk for quirk (limit_lineincrease - 1, object smooth_factor with None rows,
+# BPT -> PRA and BPTxCL -> PRCxLC renames). do not optimise anything in this file
+
+
+def reference_cost_limit_model(
+    data,
+    efficiency_seq,
+    limit_lineincrease_seq,
+    inflation_year,
+    deflation,
+    year_exclude,
+    item_numbers_APR,
+    item_numbers_BPT,
+    rename_customer):
+    # filter inflation data 
+    inflation_value = deflation.loc[deflation['Fiscal_Year'] == inflation_year, 'inflation'].values[0]
+
+    # shell pandas df for reults
+    results = pd.DataFrame()
+
+    # loop through input vars for efficiency and line increase lims 
+    for efficiency in efficiency_seq:
+        for limit_lineincrease in limit_lineincrease_seq:
+            input_data = data.copy()
+
+            # inflate APR data with input inflation data and sekected year
+            for company in input_data['company'].unique():
+                company_data = input_data[(input_data['company'] == company) & (input_data['item number'].isin(item_numbers_APR))]
+                input_data.loc[
+                    (input_data['company'] == company) & (input_data['item number'].isin(item_numbers_APR)), 
+                    'value'
+                ] = company_data['value'] * inflation_value
+
+            # aggregate cost per household (APR)
+            denominator_APR = 'APRHH1'
+            numerator_APRdata = input_data[input_data['item number'].isin(item_numbers_APR)]
+            numerator_APRdata = numerator_APRdata[numerator_APRdata['year'] != year_exclude]
+            numerator_APRdata_agg = numerator_APRdata.groupby(['company', 'item number'], as_index=False)['value'].sum()
+
+            denominator_APRdata = input_data[input_data['item number'] == denominator_APR]
+            denominator_APRdata = denominator_APRdata[denominator_APRdata['year'] != year_exclude]
+            denominator_APRdata_agg = denominator_APRdata.groupby(['company', 'item number'], as_index=False)['value'].sum()
+
+            merged_APRdata = pd.merge(
+                numerator_APRdata_agg, 
+                denominator_APRdata_agg[["company", "value"]], 
+                on="company", 
+                suffixes=('_numerator', '_denominator')
+            )
+
+            merged_APRdata['result'] = (merged_APRdata['value_numerator'] / merged_APRdata['value_denominator']) * 1000000
+            cost_per_household_APR = merged_APRdata.drop(columns=['value_numerator', 'value_denominator'])
+
+            # aggregate cost per household (BPT)
+            denominator_BPT = 'BPTHH1'
+            numerator_BPTdata = input_data[input_data['item number'].isin(item_numbers_BPT)]
+            numerator_BPTdata = numerator_BPTdata[~numerator_BPTdata['year'].isin(['2023-24', '2024-25'])]
+            numerator_BPTdata_agg = numerator_BPTdata.groupby(['company', 'item number'], as_index=False)['value'].sum()
+
+            denominator_BPTdata = input_data[input_data['item number'] == denominator_BPT]
+            denominator_BPTdata = denominator_BPTdata[~denominator_BPTdata['year'].isin(['2023-24', '2024-25'])]
+            denominator_BPTdata_agg = denominator_BPTdata.groupby(['company', 'item number'], as_index=False)['value'].sum()
+
+            merged_BPTdata = pd.merge(
+                numerator_BPTdata_agg, 
+                denominator_BPTdata_agg[["company", "value"]], 
+                on="company", 
+                suffixes=('_numerator', '_denominator')
+            )
+
+            merged_BPTdata['result'] = (merged_BPTdata['value_numerator'] / merged_BPTdata['value_denominator']) * 1000000
+            cost_per_household_BPT = merged_BPTdata.drop(columns=['value_numerator', 'value_denominator'])
+
+            #  merge cost per household (APR and BPT) and adjust future costs
+            cost_per_household = cost_per_household_APR.copy()
+            cost_per_household['item number BPT'] = cost_per_household_BPT['item number']
+            cost_per_household['result_BPT'] = cost_per_household_BPT['result']
+            cost_per_household = cost_per_household.rename(columns={'item number': 'item number APR', 'result': 'result_APR'})
+
+            cost_per_household['div'] = ((cost_per_household['result_BPT'] / cost_per_household['result_APR'])*100)
+            cost_per_household['int'] = (cost_per_household['div'] > (limit_lineincrease*100)).astype(int)
+
+            cost_per_household['increase APR'] = cost_per_household.apply(
+                lambda row: row['result_APR'] * (limit_lineincrease) if row['int'] == 1 else None, 
+                axis=1)
+
+            cost_per_household['increase BPT'] = cost_per_household.apply(
+                lambda row: row['increase APR']/row['result_BPT'] if row['int'] == 1 else None, 
+                axis=1)
+
+            # accepted costs
+            accepted_costs = input_data[input_data['item number'].isin(item_numbers_BPT)]
+            accepted_costs = accepted_costs[~accepted_costs['year'].isin(['2023-24', '2024-25'])]
+            accepted_costs = accepted_costs.merge(
+                cost_per_household[['company', 'item number BPT', 'int', 'increase BPT']], 
+                left_on=['company', 'item number'],  
+                right_on=['company', 'item number BPT'],  
+                how='left'
+            )
+            accepted_costs['calculated_value'] = np.where(
+                accepted_costs['int'] == 0,  
+                accepted_costs['value'],     
+                np.where(
+                    accepted_costs['increase BPT'].isna() | (accepted_costs['increase BPT'] == ''),  
+                    accepted_costs['value'],  
+                    accepted_costs['value'] * accepted_costs['increase BPT']  
+                )
+            )
+            accepted_costs['customer_calculated_value'] = accepted_costs['calculated_value'] * efficiency
+
+            # format data for export 
+            limited_costs = accepted_costs[['company', 'item number BPT', 'year', 'unit', 'dp', 'calculated_value']]
+            limited_costs['item number BPT'] = limited_costs['item number BPT'].str.replace('BPT', 'PRA')
+            limited_costs.rename(columns={'item number BPT': 'item number', 'calculated_value': 'value'}, inplace=True)
+
+            customer_costs = accepted_costs[['company', 'item number BPT', 'year', 'unit', 'dp', 'customer_calculated_value']]
+            customer_costs['item number BPT'] = customer_costs['item number BPT'].str.replace(*rename_customer)
+            customer_costs.rename(columns={'item number BPT': 'item number', 'customer_calculated_value': 'value'}, inplace=True)
+
+            final_data = pd.concat([limited_costs, customer_costs], ignore_index=True)
+            final_data['efficiency'] = efficiency
+            final_data['limit_lineincrease'] = limit_lineincrease-1
+
+            # Append to results
+            results = pd.concat([results, final_data], ignore_index=True)
+
+    return results
+
+
+def reference_model1(data, efficiency_seq, limit_lineincrease_seq, inflation_year, deflation, year_exclude):
+    return reference_cost_limit_model(
+        data, efficiency_seq, limit_lineincrease_seq, inflation_year, deflation, year_exclude,
+        item_numbers_APR=['APRBCL1', 'APRBCL2', 'APRBCL3', 'APRBCL4', 'APRBCL5'],
+        item_numbers_BPT=['BPTBCL1', 'BPTBCL2', 'BPTBCL3', 'BPTBCL4', 'BPTBCL5'],
+        rename_customer=('BPTBCL', 'PRCBLC'))
+
+
+def reference_model2(data, efficiency_seq, limit_lineincrease_seq, inflation_year, deflation, year_exclude):
+    return reference_cost_limit_model(
+        data, efficiency_seq, limit_lineincrease_seq, inflation_year, deflation, year_exclude,
+        item_numbers_APR=['APRECL1', 'APRECL2', 'APRECL3', 'APRECL4', 'APRECL5'],
+        item_numbers_BPT=['BPTECL1', 'BPTECL2', 'BPTECL3', 'BPTECL4', 'BPTECL5'],
+        rename_customer=('BPTECL', 'PRCELC'))
+
+
+def reference_model3(data, smoothing_dic, company_return_range):
+
+    # get prefix
+    prefixes = ('PRABCL', 'PRAECL', 'PRCBLC', 'PRCELC')
+    data['prefix'] = data['item number'].apply(
+        lambda x: next((prefix for prefix in prefixes if x.startswith(prefix)), None)
+    )
+    
+    # filter and aggregate
+    filt_df = data[data['prefix'].notna()]
+    filt_df_grp = filt_df.groupby(['company', 'year', 'prefix'])['value'].sum().reset_index()
+    filt_df_pvt = filt_df_grp.pivot(index=['company', 'year'], columns='prefix', values='value').reset_index()
+    
+    # final data
+    final_data_list = []
+    
+    for company_return in company_return_range:
+        # company return costs and charges to customers
+        filt_df_pvt['company_return_costs'] = (filt_df_pvt['PRABCL'] + filt_df_pvt['PRAECL']) * company_return
+        filt_df_pvt['charge_to_customers'] = (
+            filt_df_pvt['PRCBLC'] + filt_df_pvt['PRCELC'] + filt_df_pvt['company_return_costs']
+        )
+        
+        # average amp charges
+        average_charge_by_company = filt_df_pvt.groupby('company')['charge_to_customers'].mean().reset_index()
+        
+        # apply smoothing factors
+        smoothed_data = []
+        for scenario, factors in smoothing_dic.items():
+            for year, factor in factors.items():
+                for _, row in average_charge_by_company.iterrows():
+                    smoothed_charge = row['charge_to_customers'] * factor
+                    smoothed_data.append({
+                        "company": row['company'],
+                        "year": year,
+                        "value": smoothed_charge,
+                        "scenario_smooth_value": scenario, 
+                        "smooth_factor": factor
+                    })
+        smoothed_df = pd.DataFrame(smoothed_data)
+        smoothed_df["item number"] = smoothed_df["company"] + "PRSMCT1"
+        
+        # format data (smooth)
+        smooth_costs = smoothed_df.drop(columns=['scenario_smooth_value'])
+        smooth_costs['unit'] = "£m 22-23 FYA CPIH"
+        smooth_costs["dp"] = 3
+        smooth_costs['company_return'] = company_return
+        smooth_costs = smooth_costs[['company', 'item number', 'year', 'unit', 'dp', 'value', 'smooth_factor', 'company_return']]
+        
+        # format data (company return)
+        company_return_data = filt_df_pvt.drop(columns=['PRABCL', 'PRAECL', 'PRCBLC', 'PRCELC', 'charge_to_customers'])
+        company_return_data['unit'] = "£m 22-23 FYA CPIH"
+        company_return_data["dp"] = 3
+        company_return_data["item number"] = company_return_data["company"] + "PRCRCO1"
+        company_return_data = company_return_data.rename(columns={'company_return_costs': 'value'})
+        company_return_data['smooth_factor'] = None
+        company_return_data['company_return'] = company_return
+        company_return_data = company_return_data[['company', 'item number', 'year', 'unit', 'dp', 'value', 'smooth_factor', 'company_return']]
+        
+        # format data (customer charge)
+        customers_charge = filt_df_pvt.drop(columns=['PRABCL', 'PRAECL', 'PRCBLC', 'PRCELC', 'company_return_costs'])
+        customers_charge['unit'] = "£m 22-23 FYA CPIH"
+        customers_charge["dp"] = 3
+        customers_charge["item number"] = customers_charge["company"] + "PRCTCU1"
+        customers_charge = customers_charge.rename(columns={'charge_to_customers': 'value'})
+        customers_charge['smooth_factor'] = None
+        customers_charge['company_return'] = company_return
+        customers_charge = customers_charge[['company', 'item number', 'year', 'unit', 'dp', 'value', 'smooth_factor', 'company_return']]
+        
+        # final format
+        final_data = pd.concat([smooth_costs, company_return_data, customers_charge], ignore_index=True)
+        final_data_list.append(final_data)
+    
+    # Concatenate all results for different company_return values
+    combined_data = pd.concat(final_data_list, ignore_index=True)
+    return combined_data
+
+
+def reference_driver(model1_result, model2_result, smoothing_dic, company_return_range, model3=reference_model3):
+    # the original per-pair loop over model3()
+    model3results = []
+    model1_combinations = model1_result[['efficiency', 'limit_lineincrease']].drop_duplicates()
+    model2_combinations = model2_result[['efficiency', 'limit_lineincrease']].drop_duplicates()
+    for _, row1 in model1_combinations.iterrows():
+        subset_data1 = model1_result[
+            (model1_result['efficiency'] == row1['efficiency']) &
+            (model1_result['limit_lineincrease'] == row1['limit_lineincrease'])
+        ]
+        for _, row2 in model2_combinations.iterrows():
+            subset_data2 = model2_result[
+                (model2_result['efficiency'] == row2['efficiency']) &
+                (model2_result['limit_lineincrease'] == row2['limit_lineincrease'])
+            ]
+            final_dataset = model3(
+                data=pd.concat([subset_data1, subset_data2], ignore_index=True),
+                smoothing_dic=smoothing_dic,
+                company_return_range=company_return_range
+            )
+            final_dataset['model1_efficiency'] = row1['efficiency']
+            final_dataset['model1_limit_lineincrease'] = row1['limit_lineincrease']
+            final_dataset['model2_efficiency'] = row2['efficiency']
+            final_dataset['model2_limit_lineincrease'] = row2['limit_lineincrease']
+            model3results.append(final_dataset)
+    return pd.concat(model3results, ignore_index=True)
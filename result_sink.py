@@ -0,0 +1,147 @@
+################################################################################
+#                   Author: Joshua Thompson
+#   O__  ----       Email:  joshua.thompson@ofwat.gov.uk
+#  c/ /'_ ---
+# (*) \(*) --
+# ======================== Script  Information =================================
+# PURPOSE: write model 3 results to disk chunk by chunk
+#
+# PROJECT INFORMATION:
+#   Name: result sink
+#
+# HISTORY:----
+#   Date		        Remarks
+#	-----------	   ---------------------------------------------------------------
+#	 18/10/2026    Created script                                   JThompson (JT)
+#	 18/10/2026    Run fingerprint in the manifest, --overwrite     JThompson (JT)
+#	 18/10/2026    Partition tags and remove                        JThompson (JT)
+#===============================  Environment Setup  ===========================
+#==========================================================================================
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import json
+import os
+import shutil
+
+
+# file extension for each supported format
+SINK_FORMATS = {'parquet': '.parquet', 'arrow': '.arrow'}
+
+
+class ResultSink:
+    # partitioned result store: one file per model1 combination chunk plus a manifest,
+    # so peak memory is one chunk and an interrupted run can resume from the manifest
+
+    def __init__(self, path, file_format='parquet', resume=True, fingerprint=None, overwrite=False):
+        # fingerprint identifies the run (config and input data) the partitions belong to, results of
+        # a different run are never resumed: they are cleared with overwrite, otherwise refused
+        if file_format not in SINK_FORMATS:
+            raise ValueError(f"Unknown sink format: {file_format}")
+        self.path = path
+        self.file_format = file_format
+        self.manifest_path = os.path.join(path, '_manifest.json')
+        os.makedirs(path, exist_ok=True)
+
+        self.manifest = {'format': file_format, 'fingerprint': fingerprint, 'partitions': {}, 'tables': []}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+            if overwrite:
+                self.clear(manifest)
+            elif resume:
+                if manifest['format'] != file_format:
+                    raise ValueError(f"Existing results at {path} are {manifest['format']}, not {file_format}")
+                if manifest.get('fingerprint') != fingerprint:
+                    raise ValueError(
+                        f"Existing results at {path} are from a different run (config or input data changed), "
+                        "use another output or --overwrite to replace them")
+                manifest.setdefault('tables', [])
+                self.manifest = manifest
+
+    def clear(self, manifest):
+        # remove the partitions and tables listed in an earlier manifest, nothing else in the directory
+        for partition in manifest['partitions'].values():
+            shutil.rmtree(os.path.join(self.path, os.path.dirname(partition['file'])), ignore_errors=True)
+        for name in manifest.get('tables', []):
+            table_path = os.path.join(self.path, f"{name}.parquet")
+            if os.path.exists(table_path):
+                os.remove(table_path)
+        os.remove(self.manifest_path)
+
+    def completed(self):
+        # model1 combination chunks already on disk
+        return {int(key) for key in self.manifest['partitions']}
+
+    def write(self, key, frame, **tags):
+        # tags (e.g. the company and input key of an incremental run) are kept with the partition
+        partition = f"model1_combination={key:06d}"
+        file_name = os.path.join(partition, 'part' + SINK_FORMATS[self.file_format])
+        os.makedirs(os.path.join(self.path, partition), exist_ok=True)
+
+        # write then rename so a partition is either complete or absent
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        tmp_path = os.path.join(self.path, file_name + '.tmp')
+        if self.file_format == 'parquet':
+            pq.write_table(table, tmp_path)
+        else:
+            with pa.OSFile(tmp_path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, os.path.join(self.path, file_name))
+
+        partition_info = {'file': file_name, 'rows': len(frame), **tags}
+        if 'scenario' in frame:
+            # compact rows carry scenario ids instead of the model parameters
+            partition_info['scenarios'] = [int(frame['scenario'].min()), int(frame['scenario'].max())]
+        else:
+            model1_combinations = frame[['model1_efficiency', 'model1_limit_lineincrease']].drop_duplicates()
+            partition_info['model1_combinations'] = model1_combinations.values.tolist()
+        self.manifest['partitions'][str(key)] = partition_info
+        self.write_manifest()
+
+    def remove(self, keys):
+        # drop partitions, e.g. the chunks of a company whose inputs changed
+        for key in keys:
+            partition = self.manifest['partitions'].pop(str(key))
+            shutil.rmtree(os.path.join(self.path, os.path.dirname(partition['file'])), ignore_errors=True)
+        self.write_manifest()
+
+    def write_manifest(self):
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def write_table(self, name, frame):
+        # small side tables (e.g. the compact scenario table) stored next to the partitions
+        table = pa.Table.from_pandas(frame, preserve_index=frame.index.name is not None)
+        pq.write_table(table, os.path.join(self.path, f"{name}.parquet"))
+        if name not in self.manifest['tables']:
+            self.manifest['tables'].append(name)
+            self.write_manifest()
+
+    def read_table(self, name):
+        return pq.read_table(os.path.join(self.path, f"{name}.parquet")).to_pandas()
+
+    def table_matches(self, name, frame):
+        # a side table stored by write_table holds exactly frame
+        if name not in self.manifest['tables']:
+            return False
+        stored = self.read_table(name)
+        return stored.index.equals(frame.index) and stored.equals(frame)
+
+    def read(self, keys=None):
+        # load some or all partitions back into one frame for inspection
+        keys = sorted(self.completed()) if keys is None else keys
+        tables = []
+        for key in keys:
+            file_path = os.path.join(self.path, self.manifest['partitions'][str(key)]['file'])
+            if self.file_format == 'parquet':
+                tables.append(pq.read_table(file_path))
+            else:
+                with pa.memory_map(file_path) as source:
+                    tables.append(pa.ipc.open_file(source).read_all())
+        if not tables:
+            return pd.DataFrame()
+        return pa.concat_tables(tables, promote_options='permissive').to_pandas()
@@ -0,0 +1,302 @@
+################################################################################
+#                   Author: Joshua Thompson
+#   O__  ----       Email:  joshua.thompson@ofwat.gov.uk
+#  c/ /'_ ---
+# (*) \(*) --
+# ======================== Script  Information =================================
+# PURPOSE: indexed sqlite store of model 3 results for point and range lookups
+#
+# PROJECT INFORMATION:
+#   Name: result store
+#
+# HISTORY:----
+#   Date		        Remarks
+#	-----------	   ---------------------------------------------------------------
+#	 18/10/2026    Created script                                   JThompson (JT)
+#	 18/10/2026    Partitions keyed by source run, --rebuild        JThompson (JT)
+#	 18/10/2026    Rows of partitions gone from the sink dropped    JThompson (JT)
+#===============================  Environment Setup  ===========================
+#==========================================================================================
+
+import pandas as pd
+import numpy as np
+import argparse
+import json
+import os
+import sqlite3
+import time
+
+
+from compact_results import expand_results
+from model3_batch import MODEL3_COLUMNS
+from result_sink import ResultSink
+
+
+# model 3 columns as stored (sqlite names without spaces)
+STORE_COLUMNS = {
+    'company': 'TEXT',
+    'item_number': 'TEXT',
+    'year': 'TEXT',
+    'unit': 'TEXT',
+    'dp': 'INTEGER',
+    'value': 'REAL',
+    'smooth_factor': 'REAL',
+    'company_return': 'REAL',
+    'model1_efficiency': 'REAL',
+    'model1_limit_lineincrease': 'REAL',
+    'model2_efficiency': 'REAL',
+    'model2_limit_lineincrease': 'REAL',
+}
+
+# scenario parameters are stored (and looked up) rounded, so 0.98 finds np.arange's 0.9800000000000001
+KEY_DECIMALS = 9
+KEY_COLUMNS = [
+    'smooth_factor', 'company_return', 'model1_efficiency', 'model1_limit_lineincrease',
+    'model2_efficiency', 'model2_limit_lineincrease'
+]
+
+# sorted multi-key indexes, one led by company and year for reviewer lookups and one by the scenario
+# parameters for every company at a grid point, plus partition for dropping a replaced partition
+STORE_INDEXES = {
+    'company_year': [
+        'company', 'year', 'model1_efficiency', 'model1_limit_lineincrease', 'model2_efficiency',
+        'model2_limit_lineincrease', 'company_return', 'smooth_factor'
+    ],
+    'scenario': [
+        'model1_efficiency', 'model1_limit_lineincrease', 'model2_efficiency', 'model2_limit_lineincrease',
+        'company_return', 'company', 'year'
+    ],
+    'partition': ['partition'],
+}
+
+
+class ResultStore:
+    # model 3 rows in one sqlite file: loaded partition by partition, indexed once after loading,
+    # queried a few rows at a time without reading the rest of the results
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.create_tables()
+
+    def create_tables(self):
+        # loaded records each partition against the run (source) it came from, every row keeps its
+        # partition so a partition the sink replaces can be dropped
+        columns = ', '.join(f"{column} {column_type}" for column, column_type in STORE_COLUMNS.items())
+        with self.connection:
+            self.connection.execute(f"CREATE TABLE IF NOT EXISTS results ({columns}, partition INTEGER)")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS loaded "
+                "(source TEXT, partition INTEGER, rows INTEGER, PRIMARY KEY (source, partition))")
+
+    def clear(self):
+        # drop every row, index and loaded partition
+        with self.connection:
+            self.connection.execute("DROP TABLE IF EXISTS results")
+            self.connection.execute("DROP TABLE IF EXISTS loaded")
+        self.create_tables()
+
+    def sources(self):
+        # runs with rows in the store, a store built by build_result_store holds one
+        return {source for (source,) in self.connection.execute("SELECT DISTINCT source FROM loaded")}
+
+    def check_source(self, source):
+        other_sources = self.sources() - {source}
+        if other_sources:
+            raise ValueError(
+                f"Result store {self.path} holds rows of a different run, "
+                "use another store or rebuild it (--rebuild, or --overwrite on the model run)")
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def loaded(self, source):
+        # partitions of the source run already in the store
+        rows = self.connection.execute("SELECT partition FROM loaded WHERE source = ?", (source,))
+        return {partition for (partition,) in rows}
+
+    def remove(self, source, partitions):
+        # rows and loaded records of partitions no longer in the source run's sink
+        partitions = [int(partition) for partition in partitions]
+        placeholders = ', '.join('?' * len(partitions))
+        with self.connection:
+            self.connection.execute(f"DELETE FROM results WHERE partition IN ({placeholders})", partitions)
+            self.connection.execute(
+                f"DELETE FROM loaded WHERE source = ? AND partition IN ({placeholders})", [source, *partitions])
+
+    def append(self, frame, source=None, partition=None):
+        # long model 3 rows (MODEL3_COLUMNS), a partition is recorded in the same transaction as its rows
+        frame = frame.rename(columns={'item number': 'item_number'})
+        columns = {}
+        for column in STORE_COLUMNS:
+            values = frame[column]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                values = values.astype(values.cat.categories.dtype)
+            if column in KEY_COLUMNS:
+                values = pd.to_numeric(values).astype(float).round(KEY_DECIMALS)
+            if column == 'dp':
+                values = values.astype(int)
+            elif column == 'value':
+                values = values.astype(float)
+            # NaN (e.g. smooth_factor of the company return and customer charge rows) stored as NULL
+            columns[column] = values.astype(object).where(values.notna(), None).tolist()
+
+        columns['partition'] = [None if partition is None else int(partition)] * len(frame)
+        placeholders = ', '.join('?' * len(columns))
+        with self.connection:
+            self.connection.executemany(
+                f"INSERT INTO results ({', '.join(columns)}) VALUES ({placeholders})",
+                zip(*columns.values())
+            )
+            if partition is not None:
+                self.connection.execute("INSERT INTO loaded VALUES (?, ?, ?)", (source, int(partition), len(frame)))
+
+    def create_indexes(self):
+        # after loading: building an index once is much faster than keeping it sorted row by row
+        with self.connection:
+            for name, columns in STORE_INDEXES.items():
+                self.connection.execute(f"CREATE INDEX IF NOT EXISTS results_{name} ON results ({', '.join(columns)})")
+            self.connection.execute("ANALYZE")
+
+    def where_clause(self, criteria):
+        # value (equal), list (any of) or (low, high) tuple (inclusive range) per column, None is NULL
+        conditions, params = [], []
+        for column, criterion in criteria.items():
+            column = column.replace(' ', '_')
+            if column not in STORE_COLUMNS:
+                raise ValueError(f"Unknown result column: {column}")
+
+            def key(value):
+                return round(float(value), KEY_DECIMALS) if column in KEY_COLUMNS and value is not None else value
+
+            if criterion is None:
+                conditions.append(f"{column} IS NULL")
+            elif isinstance(criterion, tuple):
+                low, high = criterion
+                conditions.append(f"{column} BETWEEN ? AND ?")
+                params += [key(low), key(high)]
+            elif isinstance(criterion, (list, set, np.ndarray, pd.Index)):
+                criterion = list(criterion)
+                conditions.append(f"{column} IN ({', '.join('?' * len(criterion))})")
+                params += [key(value) for value in criterion]
+            else:
+                conditions.append(f"{column} = ?")
+                params.append(key(criterion))
+        return (" WHERE " + " AND ".join(conditions)) if conditions else "", params
+
+    def query(self, chunk_size=None, **criteria):
+        # rows matching every criterion (e.g. company="ANH", year="2027-28", model1_efficiency=0.98,
+        # company_return=(0.09, 0.11)) as MODEL3_COLUMNS, or an iterator of frames with chunk_size
+        where, params = self.where_clause(criteria)
+        sql = f"SELECT {', '.join(STORE_COLUMNS)} FROM results{where} ORDER BY rowid"
+        result = pd.read_sql_query(sql, self.connection, params=params, chunksize=chunk_size)
+        if chunk_size is None:
+            return result.rename(columns={'item_number': 'item number'})
+        return (frame.rename(columns={'item_number': 'item number'}) for frame in result)
+
+    def count(self, **criteria):
+        where, params = self.where_clause(criteria)
+        return self.connection.execute(f"SELECT COUNT(*) FROM results{where}", params).fetchone()[0]
+
+    def explain(self, **criteria):
+        # sqlite's plan for a query, to check that it searches an index rather than scanning
+        where, params = self.where_clause(criteria)
+        plan = self.connection.execute(f"EXPLAIN QUERY PLAN SELECT * FROM results{where}", params).fetchall()
+        return [row[-1] for row in plan]
+
+
+def sink_source(sink):
+    # the run a sink's partitions belong to: its fingerprint, or its directory when it has none
+    return sink.manifest.get('fingerprint') or os.path.abspath(sink.path)
+
+
+def open_sink(sink_path):
+    # an existing ResultSink in whatever format and for whatever run its manifest records
+    manifest_path = os.path.join(sink_path, '_manifest.json')
+    if not os.path.exists(manifest_path):
+        raise ValueError(f"No model 3 results at {sink_path}")
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    return ResultSink(sink_path, file_format=manifest['format'], fingerprint=manifest.get('fingerprint'))
+
+
+def build_result_store(sink_path, store_path, rebuild=False):
+    # load a ResultSink (full or compact rows) into a ResultStore one partition at a time, partitions
+    # already loaded from the same run are skipped so an interrupted build can be rerun and partitions
+    # the sink has since removed (an incremental run's changed companies) are dropped, a store
+    # holding another run is refused unless rebuild
+    sink = open_sink(sink_path)
+    source = sink_source(sink)
+    compact_scenarios = None
+    if 'scenarios' in sink.manifest['tables']:
+        compact_scenarios = sink.read_table('scenarios')
+
+    store = ResultStore(store_path)
+    if rebuild:
+        store.clear()
+    try:
+        store.check_source(source)
+    except ValueError:
+        store.close()
+        raise
+    loaded = store.loaded(source)
+    if loaded - sink.completed():
+        store.remove(source, loaded - sink.completed())
+    for key in sorted(sink.completed() - loaded):
+        frame = sink.read([key])
+        if 'scenario' in frame:
+            frame = expand_results(frame, compact_scenarios, MODEL3_COLUMNS)
+        store.append(frame, source=source, partition=key)
+    store.create_indexes()
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query an indexed store of model 3 results")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build = commands.add_parser('build', help="load a model 3 result sink into a store")
+    build.add_argument('sink', help="ResultSink directory (run.output)")
+    build.add_argument('store', help="sqlite file to create or extend")
+    build.add_argument('--rebuild', action='store_true', help="replace a store holding another run's rows")
+
+    query = commands.add_parser('query', help="print the rows matching every given value")
+    query.add_argument('store')
+    query.add_argument('--company')
+    query.add_argument('--item-number')
+    query.add_argument('--year')
+    for column in KEY_COLUMNS:
+        query.add_argument('--' + column.replace('_', '-'), type=float, nargs='+', metavar='VALUE',
+                           help="one value, or two for an inclusive range (line limits as in the results, limit - 1)")
+    args = parser.parse_args()
+    for column in KEY_COLUMNS:
+        if args.command == 'query' and getattr(args, column) is not None and len(getattr(args, column)) > 2:
+            parser.error(f"--{column.replace('_', '-')} takes one value or a range of two")
+
+    if args.command == 'build':
+        start = time.perf_counter()
+        with build_result_store(args.sink, args.store, args.rebuild) as store:
+            print(f"{store.count()} rows in {args.store} ({time.perf_counter() - start:.1f}s)")
+        return
+
+    criteria = {}
+    for column in ['company', 'item_number', 'year'] + KEY_COLUMNS:
+        value = getattr(args, column)
+        if value is not None:
+            criteria[column] = value if not isinstance(value, list) else (tuple(value) if len(value) == 2 else value[0])
+    with ResultStore(args.store) as store:
+        start = time.perf_counter()
+        result = store.query(**criteria)
+        print(result.to_string(index=False))
+        print(f"{len(result)} rows ({(time.perf_counter() - start) * 1000:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+################################################################################
+#                   Author: Joshua Thompson
+#   O__  ----       Email:  joshua.thompson@ofwat.gov.uk
+#  c/ /'_ ---
+# (*) \(*) --
+# ======================== Script  Information =================================
+# PURPOSE: stage timers, counters and progress reporting for model runs
+#
+# PROJECT INFORMATION:
+#   Name: run instrumentation
+#
+# HISTORY:----
+#   Date		        Remarks
+#	-----------	   ---------------------------------------------------------------
+#	 18/10/2026    Created script                                   JThompson (JT)
+#	 18/10/2026    record() for stages timed in workers             JThompson (JT)
+#===============================  Environment Setup  ===========================
+#==========================================================================================
+
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # not available on windows
+    resource = None
+
+
+def max_rss_mb():
+    # peak resident memory of this process so far (linux reports kB, macos bytes)
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / 2**20 if sys.platform == 'darwin' else max_rss / 2**10
+
+
+class RunReport:
+    # machine readable record of a run: stage timings, counters and progress events
+
+    def __init__(self, name, sample_memory=False):
+        self.name = name
+        self.sample_memory = sample_memory
+        self.started = time.time()
+        self.stages = {}
+        self.counters = {}
+
+    @contextmanager
+    def stage(self, name):
+        # time spent in a stage accumulates over every entry
+        stage = self.stages.setdefault(name, {'seconds': 0.0, 'calls': 0})
+        tracing = self.sample_memory and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            yield stage
+        finally:
+            stage['seconds'] += time.perf_counter() - start
+            stage['calls'] += 1
+            if tracing:
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                stage['peak_traced_mb'] = max(stage.get('peak_traced_mb', 0.0), peak / 2**20)
+            stage['max_rss_mb'] = max_rss_mb()
+
+    def record(self, name, seconds):
+        # a stage timed elsewhere (e.g. in a worker), added like one entry of stage()
+        stage = self.stages.setdefault(name, {'seconds': 0.0, 'calls': 0})
+        stage['seconds'] += seconds
+        stage['calls'] += 1
+
+    def timed_iter(self, iterable, name):
+        # time each step of an iterator (e.g. a generator doing the work lazily) as a stage
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def progress(self, total, label, interval=5.0, stream=sys.stdout):
+        return ProgressReporter(self, total, label, interval, stream)
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'started': self.started,
+            'seconds': time.time() - self.started,
+            'stages': self.stages,
+            'counters': self.counters,
+            'max_rss_mb': max_rss_mb(),
+        }
+
+    def write(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+
+class ProgressReporter:
+    # one json line per interval with done/total, rate and eta in place of a print per iteration
+
+    def __init__(self, report, total, label, interval=5.0, stream=sys.stdout):
+        self.report = report
+        self.total = total
+        self.label = label
+        self.interval = interval
+        self.stream = stream
+        self.done = 0
+        self.started = time.perf_counter()
+        self.last_emit = None
+
+    def update(self, n=1, **counters):
+        # counters (e.g. scenarios=, rows=) are added to the run report
+        self.done += n
+        for name, value in counters.items():
+            self.report.count(name, value)
+        now = time.perf_counter()
+        if self.last_emit is None or now - self.last_emit >= self.interval or self.done >= self.total:
+            self.emit(now)
+
+    def emit(self, now):
+        self.last_emit = now
+        elapsed = now - self.started
+        rate = self.done / elapsed if elapsed > 0 else None
+        remaining = (self.total - self.done) / rate if rate else None
+        event = {
+            'progress': self.label,
+            'done': self.done,
+            'total': self.total,
+            'percent': round(100 * self.done / self.total, 1) if self.total else 100.0,
+            'elapsed_s': round(elapsed, 1),
+            'eta_s': round(remaining, 1) if remaining is not None else None,
+            'counters': dict(self.report.counters),
+        }
+        print(json.dumps(event), file=self.stream, flush=True)
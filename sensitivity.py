@@ -0,0 +1,147 @@
+################################################################################
+#                   Author: Joshua Thompson
+#   O__  ----       Email:  joshua.thompson@ofwat.gov.uk
+#  c/ /'_ ---
+# (*) \(*) --
+# ======================== Script  Information =================================
+# PURPOSE: analytic partial derivatives of the model outputs and line cap breakpoints
+#
+# PROJECT INFORMATION:
+#   Name: sensitivity
+#
+# HISTORY:----
+#   Date		        Remarks
+#	-----------	   ---------------------------------------------------------------
+#	 18/10/2026    Created script                                   JThompson (JT)
+#===============================  Environment Setup  ===========================
+#==========================================================================================
+
+import pandas as pd
+import numpy as np
+import warnings
+
+
+from cost_limit_model import COST_LINES, cost_line_tables
+from fiscal_years import inflation_factor
+from model3_batch import MODEL3_PREFIXES, item_prefix_codes, model3_template
+from model3_function import smoothing_factors
+
+# the models are piecewise linear: a line item is scaled by its APR/BPT household cost ratio while
+# div > limit_lineincrease * 100 and left alone above that, everything downstream is linear in
+# efficiency and company_return. derivatives at a breakpoint are taken from above (cap not binding)
+
+
+def line_sensitivity(tables, efficiency, limit_lineincrease):
+    # cost_limit_tables block rows (limited then customer) at one grid point with their value, partials
+    # in this line's efficiency and limit_lineincrease, and the limit below which the cap binds
+    accepted_costs = tables['accepted_costs']
+    value = accepted_costs['value'].to_numpy(dtype=float)
+    result_APR = accepted_costs['result_APR'].to_numpy(dtype=float)
+    result_BPT = accepted_costs['result_BPT'].to_numpy(dtype=float)
+    div = accepted_costs['div'].to_numpy(dtype=float)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = value * result_APR / result_BPT
+    capped = (div > limit_lineincrease * 100) & ~np.isnan(slope)
+    calculated = np.where(capped, value * ((result_APR * limit_lineincrease) / result_BPT), value)
+    d_calculated = np.where(capped, slope, 0.0)
+
+    lines = tables['block'].copy()
+    lines['value'] = np.concatenate([calculated, calculated * efficiency])
+    lines['d_efficiency'] = np.concatenate([np.zeros(len(calculated)), calculated])
+    lines['d_limit_lineincrease'] = np.concatenate([d_calculated, d_calculated * efficiency])
+    lines['limit_breakpoint'] = np.tile(div / 100, 2)
+    lines['capped'] = np.tile(capped, 2)
+    return lines
+
+
+def cap_breakpoints(lines):
+    # finite line cap breakpoints by line, company and line item (one ratio covers every year), in limit order
+    frames = []
+    for name, line in lines.items():
+        limited = line.iloc[:len(line) // 2]
+        limited = limited[np.isfinite(limited['limit_breakpoint'])]
+        frames.append(limited[['company', 'item number', 'limit_breakpoint', 'capped']].assign(model=name))
+    breakpoints = pd.concat(frames, ignore_index=True).drop_duplicates()
+    return breakpoints.sort_values(['model', 'company', 'limit_breakpoint'], kind='stable').reset_index(drop=True)
+
+
+def model3_sensitivity(lines, smoothing_dic, company_return, prefixes=MODEL3_PREFIXES):
+    # model 3 rows at one point with partials in each line's efficiency and limit and in company_return
+    line_columns = [f'd_{name}_{variable}' for name in lines for variable in ('efficiency', 'limit_lineincrease')]
+    frames = []
+    for name, line in lines.items():
+        frame = line[['company', 'item number', 'year', 'value']].copy()
+        for column in line_columns:
+            frame[column] = 0.0
+        frame[f'd_{name}_efficiency'] = line['d_efficiency'].to_numpy()
+        frame[f'd_{name}_limit_lineincrease'] = line['d_limit_lineincrease'].to_numpy()
+        frames.append(frame)
+    rows = pd.concat(frames, ignore_index=True)
+    rows['prefix'] = item_prefix_codes(rows['item number'], prefixes)
+    sums = rows[rows['prefix'] >= 0].groupby(['prefix', 'company', 'year'], observed=True)[['value'] + line_columns].sum()
+
+    # (quantity, prefix, company, year), NaN where model 3 would have no pivot value
+    companies = pd.Index(sums.index.get_level_values('company').unique()).sort_values()
+    years = pd.Index(sums.index.get_level_values('year').unique()).sort_values()
+    dense = np.full((1 + len(line_columns), len(prefixes), len(companies), len(years)), np.nan)
+    dense[
+        :,
+        sums.index.get_level_values('prefix'),
+        companies.get_indexer(sums.index.get_level_values('company')),
+        years.get_indexer(sums.index.get_level_values('year')),
+    ] = sums.to_numpy().T
+
+    # company return costs and charges to customers, first entry the value then its partials
+    limited, customer = dense[:, 0] + dense[:, 1], dense[:, 2] + dense[:, 3]
+    company_return_costs = limited * company_return
+    charge_to_customers = customer + company_return_costs
+    d_company_return = np.where(np.isnan(charge_to_customers[0]), np.nan, limited[0])
+
+    # average amp charges and smoothing (nanmean over years with a charge)
+    _, factors = smoothing_factors(smoothing_dic)
+    quantities = np.concatenate([charge_to_customers, d_company_return[None]])
+    with np.errstate(invalid='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        average_charge = np.nanmean(quantities, axis=-1)
+    smoothed = average_charge[:, None, :] * factors[None, :, None]
+
+    values = np.concatenate([
+        smoothed.reshape(len(quantities), -1),
+        np.concatenate([company_return_costs, limited[None, 0]]).reshape(len(quantities), -1),
+        np.concatenate([charge_to_customers, d_company_return[None]]).reshape(len(quantities), -1),
+    ], axis=1)
+
+    # keep the rows model 3 would produce
+    present = ~np.isnan(dense[0]).all(axis=0)
+    company_present = present.any(axis=-1)
+    keep = np.concatenate([np.tile(company_present, len(factors)), present.reshape(-1), present.reshape(-1)])
+
+    result = model3_template(companies, years, smoothing_dic)[keep].reset_index(drop=True)
+    for column, column_values in zip(['value'] + line_columns + ['d_company_return'], values):
+        result[column] = column_values[keep]
+    return result
+
+
+def sensitivity(
+    data,
+    point,
+    smoothing_dic,
+    inflation_year,
+    deflation,
+    year_exclude,
+    cost_lines=COST_LINES):
+    # data is {line name: input frame}, point holds <line>_efficiency and <line>_limit_lineincrease
+    # (grid values, as in limit_lineincrease_seq rather than the limit - 1 in results) and company_return.
+    # returns {'lines': block rows with partials, 'breakpoints': cap breakpoints, 'model3': model 3 rows with partials}
+    inflation_value = inflation_factor(deflation, inflation_year)
+    lines = {}
+    for name, cost_line in cost_lines.items():
+        tables = cost_line_tables(data[name], {name: cost_line}, inflation_value, year_exclude)[name]
+        lines[name] = line_sensitivity(tables, point[f'{name}_efficiency'], point[f'{name}_limit_lineincrease'])
+
+    return {
+        'lines': pd.concat([line.assign(model=name) for name, line in lines.items()], ignore_index=True),
+        'breakpoints': cap_breakpoints(lines),
+        'model3': model3_sensitivity(lines, smoothing_dic, point['company_return']),
+    }